@@ -4,20 +4,20 @@ Get the battery level and charging status.
 
 from dataclasses import dataclass
 
-from colmi_r02_client.packet import make_packet
+from colmi_r02_client.packet import Packet, make_packet
 
 CMD_BATTERY = 3
 
 BATTERY_PACKET = make_packet(CMD_BATTERY)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class BatteryInfo:
     battery_level: int
     charging: bool
 
 
-def parse_battery(packet: bytearray) -> BatteryInfo:
+def parse_battery(packet: Packet) -> BatteryInfo:
     r"""
     example: bytearray(b'\x03@\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00C')
     """
@@ -0,0 +1,257 @@
+"""
+Offline benchmarks for the hot paths: building packets, parsing, timestamps, database syncs, pretty printing and a full
+`get_full_data` against a `colmi_r02_client.simulator.SimulatedRing`.
+
+Results can be saved as a JSON baseline and later runs compared against it, failing if anything got slower than the
+allowed threshold. Run it with `colmi_r02_util bench`.
+"""
+
+from array import array
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass
+from functools import partial
+from datetime import datetime, timedelta, timezone
+import json
+from pathlib import Path
+import platform
+import time
+import timeit
+from typing import Any, cast
+
+from bleak import BleakClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import battery, db, hr, hr_settings, packet, pretty_print, real_time, steps, synthetic
+from colmi_r02_client.client import Client
+from colmi_r02_client.decoder import new_command_handlers
+from colmi_r02_client.simulator import SimulatedRing, heart_rate_log_packets, sport_detail_packets
+
+DEFAULT_THRESHOLD = 1.25
+"""Fail if a benchmark takes more than this multiple of its baseline"""
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True, slots=True)
+class BenchResult:
+    name: str
+    seconds: float
+    """Best time for a single iteration"""
+    iterations: int
+
+
+def _heart_rate_log(day: datetime) -> hr.HeartRateLog:
+    readings = array("B", [60 + (i % 40) if i % 3 else 0 for i in range(288)])
+    return hr.HeartRateLog(heart_rates=readings, timestamp=day, size=24, index=295, range=5)
+
+
+def _sport_details(day: datetime) -> list[steps.SportDetail]:
+    return [
+        steps.SportDetail(
+            year=day.year,
+            month=day.month,
+            day=day.day,
+            time_index=i,
+            calories=i * 100,
+            steps=i * 10,
+            distance=i * 7,
+        )
+        for i in range(0, 96, 2)
+    ]
+
+
+def _parse_all(handler: Callable[[packet.Packet], Any], packets: list[bytearray]) -> Callable[[], None]:
+    def run() -> None:
+        for p in packets:
+            handler(p)
+
+    return run
+
+
+def _parser_benchmarks() -> dict[str, Callable[[], None]]:
+    handlers = new_command_handlers()
+    packets = {
+        battery.CMD_BATTERY: [battery.BATTERY_PACKET],
+        real_time.CMD_START_REAL_TIME: [packet.make_packet(real_time.CMD_START_REAL_TIME, bytearray([1, 0, 70]))],
+        real_time.CMD_STOP_REAL_TIME: [real_time.get_stop_packet(real_time.RealTimeReading.HEART_RATE)],
+        steps.CMD_GET_STEP_SOMEDAY: sport_detail_packets(_sport_details(START)),
+        hr.CMD_READ_HEART_RATE: heart_rate_log_packets(_heart_rate_log(START)),
+        1: [packet.make_packet(1)],
+        hr_settings.CMD_HEART_RATE_LOG_SETTINGS: [
+            packet.make_packet(hr_settings.CMD_HEART_RATE_LOG_SETTINGS, bytearray([1, 1, 5]))
+        ],
+    }
+    assert packets.keys() == handlers.keys(), "Every command handler needs a benchmark"
+    return {f"parse_{command}": _parse_all(handler, packets[command]) for command, handler in handlers.items()}
+
+
+@contextmanager
+def _in_memory_session() -> Iterator[Session]:
+    """An in memory database that is thrown away, engine and all, when done"""
+    session = db.get_db_session()
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    try:
+        with session:
+            yield session
+    finally:
+        engine.dispose()
+
+
+def _full_sync(days: int) -> AbstractContextManager[Callable[[], None]]:
+    data = synthetic.generate(seed=days, years=days / 365)[0]
+
+    def run() -> None:
+        with _in_memory_session() as session:
+            db.full_sync(session, data)
+
+    return nullcontext(run)
+
+
+@contextmanager
+def _query(days: int, query: Callable[..., Any]) -> Iterator[Callable[[], None]]:
+    data = synthetic.generate(seed=days, years=days / 365)[0]
+    with _in_memory_session() as session:
+        db.full_sync(session, data)
+
+        def run() -> None:
+            query(
+                session, data.address, datetime(2000, 1, 1, tzinfo=timezone.utc), datetime(2100, 1, 1, tzinfo=timezone.utc)
+            )
+
+        yield run
+
+
+def _print_dataclasses() -> AbstractContextManager[Callable[[], str]]:
+    details = [d for _ in range(200) for d in _sport_details(START)]
+    return nullcontext(lambda: pretty_print.print_dataclasses(details))
+
+
+def _get_full_data(days: int) -> Callable[[], Awaitable[None]]:
+    # the client works out which day to ask for steps from the current date, so end the data today
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [end - timedelta(days=i) for i in reversed(range(days))]
+    ring = SimulatedRing(
+        heart_rates={d.date(): _heart_rate_log(d) for d in dates},
+        sport_details={d.date(): _sport_details(d) for d in dates},
+        today=end.date(),
+    )
+
+    async def run() -> None:
+        async with Client("bench", bleak_client=cast(BleakClient, ring)) as client:
+            await client.get_full_data(dates[0], dates[-1])
+
+    return run
+
+
+def _ready(fn: Callable[[], Any]) -> AbstractContextManager[Callable[[], Any]]:
+    """For benchmarks with nothing to clean up"""
+    return nullcontext(fn)
+
+
+def _sync_benchmarks() -> dict[str, Callable[[], AbstractContextManager[Callable[[], Any]]]]:
+    """
+    Benchmark name to a function doing its setup and returning a context manager giving what to time, which cleans up
+    after the timing when it exits
+    """
+    log = _heart_rate_log(START)
+    raw = bytearray(range(14))
+    benchmarks: dict[str, Callable[[], AbstractContextManager[Callable[[], Any]]]] = {
+        "make_packet": partial(_ready, lambda: packet.make_packet(67, raw)),
+        "checksum": partial(_ready, lambda: packet.checksum(raw)),
+        "heart_rates_with_times": partial(_ready, log.heart_rates_with_times),
+        "heart_rate_readings": partial(_ready, lambda: list(log.readings())),
+        "print_dataclasses_10k": _print_dataclasses,
+    }
+    for name, parse in _parser_benchmarks().items():
+        benchmarks[name] = partial(_ready, parse)
+    for days in (1, 30, 365):
+        benchmarks[f"full_sync_{days}_days"] = partial(_full_sync, days)
+    queries: list[tuple[str, Callable[..., Any]]] = [
+        ("heart_rate_columns", db.get_heart_rate_columns),
+        ("aggregate_heart_rates", db.aggregate_heart_rates),
+        ("aggregate_heart_rates_10m", partial(db.aggregate_heart_rates, bucket_seconds=600)),
+        ("sport_detail_columns", db.get_sport_detail_columns),
+    ]
+    for name, query in queries:
+        benchmarks[f"{name}_1095_days"] = partial(_query, 1095, query)
+    return benchmarks
+
+
+def _async_benchmarks() -> dict[str, Callable[[], Callable[[], Awaitable[None]]]]:
+    return {"get_full_data_30_days": lambda: _get_full_data(30)}
+
+
+def _matches(name: str, only: list[str] | None) -> bool:
+    return not only or any(o in name for o in only)
+
+
+async def run(only: list[str] | None = None, repeat: int = 5, min_time: float = 0.2) -> list[BenchResult]:
+    """Run every benchmark whose name contains one of only (or all of them) and return the best time of each"""
+    results = []
+    for name, setup in _sync_benchmarks().items():
+        if not _matches(name, only):
+            continue
+        with setup() as fn:
+            timer = timeit.Timer(fn)
+            number = 1
+            while True:
+                elapsed = timer.timeit(number)
+                if elapsed >= min_time / repeat or number >= 1_000_000:
+                    break
+                number *= 10
+            best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results.append(BenchResult(name, best, number * repeat))
+
+    for name, async_setup in _async_benchmarks().items():
+        if not _matches(name, only):
+            continue
+        afn = async_setup()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await afn()
+            times.append(time.perf_counter() - start)
+        results.append(BenchResult(name, min(times), repeat))
+
+    return results
+
+
+def save_baseline(path: Path, results: list[BenchResult]) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": {r.name: r.seconds for r in results},
+            },
+            indent=2,
+        )
+    )
+
+
+def load_baseline(path: Path) -> dict[str, float]:
+    baseline: dict[str, float] = json.loads(path.read_text())["results"]
+    return baseline
+
+
+def regressions(results: list[BenchResult], baseline: dict[str, float], threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Describe every result that is more than threshold times slower than its baseline"""
+    slower = []
+    for r in results:
+        if r.name in baseline and r.seconds > baseline[r.name] * threshold:
+            ratio = r.seconds / baseline[r.name]
+            slower.append(f"{r.name} took {r.seconds:.3g}s, baseline is {baseline[r.name]:.3g}s ({ratio:.2f}x)")
+    return slower
+
+
+def to_rows(results: list[BenchResult], baseline: dict[str, float] | None = None) -> list[dict[str, Any]]:
+    rows = []
+    for r in results:
+        row: dict[str, Any] = {"name": r.name, "seconds": f"{r.seconds:.3g}", "iterations": r.iterations}
+        if baseline is not None:
+            row["vs baseline"] = f"{r.seconds / baseline[r.name]:.2f}x" if r.name in baseline else "-"
+        rows.append(row)
+    return rows
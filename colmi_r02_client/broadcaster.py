@@ -0,0 +1,135 @@
+"""
+Share real time readings from the one process connected to the ring with any number of local subscribers.
+
+`Broadcaster.publish` is a listener for `colmi_r02_client.recorder.RealTimeRecorder`, which owns the connection and the
+real time stream. Subscribers connect over
+
+- a Unix socket (`serve_unix`), receiving one JSON object per line, or
+- Server-Sent Events on the loopback interface (`serve_sse`), for anything that speaks HTTP, e.g. `curl -N` or a
+  browser's `EventSource`.
+
+Each reading looks like `{"kind": "heart_rate", "timestamp": 1735689600000, "value": 62}`, with the timestamp in epoch
+milliseconds.
+
+Publishing never waits on a subscriber. Each one has a queue of at most buffer_size readings, and a subscriber that
+lets its queue fill up is disconnected, so a slow or stuck consumer can't hold up the ring or the other subscribers.
+"""
+
+import asyncio
+from dataclasses import dataclass
+import json
+import logging
+from pathlib import Path
+
+from colmi_r02_client.real_time import RealTimeReading
+
+DEFAULT_BUFFER_SIZE = 256
+SSE_HOST = "127.0.0.1"
+
+logger = logging.getLogger(__name__)
+
+_SSE_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+)
+_NOT_FOUND_RESPONSE = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+@dataclass(slots=True)
+class BroadcastStats:
+    published: int = 0
+    subscribed: int = 0
+    """Subscribers that ever connected"""
+    dropped: int = 0
+    """Subscribers disconnected for falling behind"""
+
+    def summary(self) -> str:
+        return f"Published {self.published} readings to {self.subscribed} subscribers, dropped {self.dropped} for lagging"
+
+
+class _Subscriber:
+    __slots__ = ("name", "queue", "writer")
+
+    def __init__(self, name: str, writer: asyncio.StreamWriter, buffer_size: int):
+        self.name = name
+        self.writer = writer
+        # None tells the subscriber to stop
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=buffer_size)
+
+
+class Broadcaster:
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        assert buffer_size >= 1, "buffer_size must be at least 1"
+        self.buffer_size = buffer_size
+        self.stats = BroadcastStats()
+        self._subscribers: set[_Subscriber] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, kind: RealTimeReading, timestamp: int, value: int) -> None:
+        """Send a reading to every subscriber, dropping the ones whose buffer is full. Never waits"""
+        message = json.dumps({"kind": kind.name.lower(), "timestamp": timestamp, "value": value}).encode()
+        self.stats.published += 1
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: _Subscriber) -> None:
+        logger.warning(f"Dropping subscriber {subscriber.name}, it fell {self.buffer_size} readings behind")
+        self.stats.dropped += 1
+        self._stop(subscriber)
+        # it might be stuck waiting for the subscriber to read, don't wait for that to finish
+        subscriber.writer.transport.abort()
+
+    async def serve_unix(self, path: Path) -> asyncio.Server:
+        """Start serving readings as lines of JSON on a Unix socket at path"""
+        return await asyncio.start_unix_server(self._handle_unix, path)
+
+    async def serve_sse(self, port: int, host: str = SSE_HOST) -> asyncio.Server:
+        """Start serving readings as Server-Sent Events at http://host:port/, port 0 picks a free port"""
+        return await asyncio.start_server(self._handle_sse, host, port)
+
+    async def _handle_unix(self, _reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await self._stream(writer, b"", b"\n")
+
+    async def _handle_sse(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass  # headers, nothing in them matters
+        parts = request.split()
+        if len(parts) < 2 or parts[0] != b"GET" or parts[1] not in (b"/", b"/readings"):
+            writer.write(_NOT_FOUND_RESPONSE)
+            await writer.drain()
+            writer.close()
+            return
+        writer.write(_SSE_RESPONSE)
+        await self._stream(writer, b"data: ", b"\n\n")
+
+    async def _stream(self, writer: asyncio.StreamWriter, prefix: bytes, suffix: bytes) -> None:
+        subscriber = _Subscriber(str(writer.get_extra_info("peername") or "unix socket"), writer, self.buffer_size)
+        self._subscribers.add(subscriber)
+        self.stats.subscribed += 1
+        logger.info(f"Subscriber {subscriber.name} connected, {len(self._subscribers)} now")
+        try:
+            while (message := await subscriber.queue.get()) is not None:
+                writer.write(prefix + message + suffix)
+                await writer.drain()
+        except ConnectionError:
+            logger.info(f"Subscriber {subscriber.name} went away")
+        finally:
+            self._subscribers.discard(subscriber)
+            writer.close()
+
+    def _stop(self, subscriber: _Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def close(self) -> None:
+        """Disconnect every subscriber"""
+        for subscriber in list(self._subscribers):
+            self._stop(subscriber)
@@ -0,0 +1,62 @@
+"""
+Publish/subscribe for packets from the ring, used by `colmi_r02_client.client.Client` for everything it does with a
+notification: tracing, validation, metrics, recording captures, parsing and anything added by users of the client.
+
+Subscribers are called with a read only memoryview of the packet, so nothing is copied no matter how many there are.
+Views are only valid during the call, anything kept for later has to be copied with `bytes`.
+
+Subscribers for every packet are called first, in the order they subscribed, then the ones for the packet's command.
+Publishing a packet costs one dict lookup on top of calling the subscribers, so a command nobody subscribed to costs
+next to nothing, and adding a consumer is a `subscribe` call rather than a change to the notification callback.
+"""
+
+from collections.abc import Callable
+
+PacketHandler = Callable[[memoryview], None]
+
+
+class PacketBus:
+    def __init__(self, unhandled: PacketHandler | None = None):
+        """unhandled is called with packets for commands that have no subscribers"""
+        self.unhandled = unhandled
+        # tuples, replaced rather than changed, so subscribing while publishing is safe
+        self._every: tuple[PacketHandler, ...] = ()
+        self._commands: dict[int, tuple[PacketHandler, ...]] = {}
+
+    def subscribe(self, handler: PacketHandler, *commands: int) -> Callable[[], None]:
+        """
+        Call handler with packets for commands, or every packet if no commands are given. Returns a function that
+        unsubscribes it again.
+        """
+        if not commands:
+            self._every = (*self._every, handler)
+        for command in commands:
+            self._commands[command] = (*self._commands.get(command, ()), handler)
+        return lambda: self.unsubscribe(handler, *commands)
+
+    def unsubscribe(self, handler: PacketHandler, *commands: int) -> None:
+        if not commands:
+            self._every = tuple(h for h in self._every if h != handler)
+        for command in commands:
+            remaining = tuple(h for h in self._commands.get(command, ()) if h != handler)
+            if remaining:
+                self._commands[command] = remaining
+            else:
+                self._commands.pop(command, None)
+
+    def subscribed(self, command: int) -> bool:
+        """True if anything besides the subscribers to every packet will see packets for command"""
+        return command in self._commands
+
+    def publish(self, packet: bytes | bytearray | memoryview) -> None:
+        """Hand packet to its subscribers, exceptions from them are raised here"""
+        view = memoryview(packet).toreadonly()
+        for handler in self._every:
+            handler(view)
+        # after the subscribers to every packet, which can reject empty packets
+        handlers = self._commands.get(view[0])
+        if handlers is not None:
+            for handler in handlers:
+                handler(view)
+        elif self.unhandled is not None:
+            self.unhandled(view)
@@ -0,0 +1,269 @@
+"""
+Copy ring data between databases with changesets, e.g. from the machines at several sites to one central database.
+
+A changeset holds every sync made in the source database after a cursor (the last sync_id already exported) and every
+row those syncs wrote, keyed by ring address and timestamp so ids don't need to match between databases. Each sync
+carries its provenance, the name of the database it was first made in and its sync_id there, which is kept when a
+merged sync is exported again so changesets can be passed along more than one hop.
+
+Merging is idempotent: syncs are matched on their provenance, heart rates that are already stored are left alone and
+sport details keep the values from the most recent sync, so applying a changeset twice, or overlapping changesets in
+any order, gives the same result.
+
+Changesets use the columnar format from `colmi_r02_client.export`: a "changeset" block with the source and cursor
+range, then blocks of syncs, heart rates, packed heart rate days and sport details for each ring.
+"""
+
+from array import array
+from collections import defaultdict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import logging
+from typing import Any, BinaryIO
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import db, export, packed
+
+CHANGESET_SUFFIX = ".changeset"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ChangesetStats:
+    source: str
+    since: int
+    until: int
+    """Cursor to pass as since for the next changeset"""
+    rows: int
+
+
+@dataclass(slots=True)
+class MergeStats:
+    syncs: int = 0
+    heart_rates: int = 0
+    heart_rate_days: int = 0
+    sport_details: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"Merged {self.syncs} new syncs, {self.heart_rates} heart rates, {self.heart_rate_days} packed heart rate "
+            f"days and {self.sport_details} sport details"
+        )
+
+
+_QUERIES = {
+    "syncs": (
+        "SELECT sync_id, timestamp, comment, coalesce(source, ?), coalesce(source_sync_id, sync_id) FROM syncs "
+        "WHERE ring_id = ? AND sync_id > ? AND sync_id <= ? ORDER BY sync_id"
+    ),
+    "heart_rates": (
+        "SELECT timestamp, reading, sync_id FROM heart_rates "
+        "WHERE ring_id = ? AND sync_id > ? AND sync_id <= ? ORDER BY timestamp"
+    ),
+    "heart_rate_days": (
+        "SELECT day, interval, sync_id, readings, mask, encoding FROM heart_rate_days "
+        "WHERE ring_id = ? AND sync_id > ? AND sync_id <= ? ORDER BY day"
+    ),
+    "sport_details": (
+        "SELECT timestamp, calories, steps, distance, sync_id FROM sport_details "
+        "WHERE ring_id = ? AND sync_id > ? AND sync_id <= ? ORDER BY timestamp"
+    ),
+}
+
+
+def _to_columns(table: str, rows: Any) -> export.Columns:
+    if table == "syncs":
+        sync_ids, timestamps, comments, sources, source_sync_ids = zip(*rows, strict=True)
+        return {
+            "sync_id": array("q", sync_ids),
+            "timestamp": array("q", timestamps),
+            "comment": list(comments),
+            "source": list(sources),
+            "source_sync_id": array("q", source_sync_ids),
+        }
+    if table == "heart_rates":
+        timestamps, readings, sync_ids = zip(*rows, strict=True)
+        return {"timestamp": array("q", timestamps), "reading": array("B", readings), "sync_id": array("q", sync_ids)}
+    if table == "heart_rate_days":
+        # decoded, so the merge can combine them with whatever the other database has for the day
+        day_starts, intervals, day_sync_ids = array("q"), array("q"), array("q")
+        slots, all_readings = array("H"), array("B")
+        for day, interval, sync_id, blob, mask, encoding in rows:
+            day_readings = packed.decode(blob, mask, encoding)
+            day_starts.append(day)
+            intervals.append(interval)
+            day_sync_ids.append(sync_id)
+            slots.append(len(day_readings))
+            all_readings.extend(day_readings)
+        return {"day": day_starts, "interval": intervals, "sync_id": day_sync_ids, "slots": slots, "readings": all_readings}
+    timestamps, calories, steps, distances, sync_ids = zip(*rows, strict=True)
+    return {
+        "timestamp": array("q", timestamps),
+        "calories": array("L", calories),
+        "steps": array("L", steps),
+        "distance": array("L", distances),
+        "sync_id": array("q", sync_ids),
+    }
+
+
+def write_changeset(
+    session: Session, out: BinaryIO, source: str, since: int = 0, chunk_size: int = db.QUERY_CHUNK_SIZE
+) -> ChangesetStats:
+    """Write everything synced after the sync with id since to out, with source naming this database"""
+    until = max(session.scalars(select(func.max(db.Sync.sync_id))).one() or 0, since)
+    out.write(export.COLUMNAR_MAGIC)
+    export.write_columnar_block(
+        out, "changeset", "", {"source": [source], "since": array("q", [since]), "until": array("q", [until])}
+    )
+
+    rows = 0
+    connection = session.connection().execution_options(yield_per=chunk_size)
+    for ring_id, address in session.execute(select(db.Ring.ring_id, db.Ring.address).order_by(db.Ring.ring_id)):
+        for table, sql in _QUERIES.items():
+            params = (source, ring_id, since, until) if table == "syncs" else (ring_id, since, until)
+            for partition in connection.exec_driver_sql(sql, params).partitions():
+                rows += export.write_columnar_block(out, table, address, _to_columns(table, partition))
+    return ChangesetStats(source, since, until, rows)
+
+
+def _local_syncs(
+    session: Session, ring: db.Ring, columns: export.Columns, local_source: str | None, stats: MergeStats
+) -> Iterator[tuple[int, int]]:
+    """(changeset sync_id, local sync_id) for every sync in a block, adding the ones that aren't here yet"""
+    for sync_id, timestamp, comment, source, source_sync_id in zip(*columns.values(), strict=True):
+        if source == local_source and _is_own_sync(session, ring, source_sync_id, timestamp):
+            # this database's own sync coming back around
+            yield sync_id, source_sync_id
+            continue
+        local = session.scalars(
+            select(db.Sync.sync_id).where(db.Sync.source == source).where(db.Sync.source_sync_id == source_sync_id)
+        ).one_or_none()
+        if local is None:
+            sync = db.Sync(
+                ring=ring,
+                timestamp=datetime.fromtimestamp(timestamp, timezone.utc),
+                comment=comment,
+                source=source,
+                source_sync_id=source_sync_id,
+            )
+            session.add(sync)
+            session.flush()
+            local = sync.sync_id
+            stats.syncs += 1
+        yield sync_id, local
+
+
+def _is_own_sync(session: Session, ring: db.Ring, sync_id: int, timestamp: int) -> bool:
+    """
+    True if sync_id is a sync made here, checked rather than assumed from the source name so other databases on the same
+    host exporting under the default name are still merged
+    """
+    own = session.scalars(
+        select(db.Sync.sync_id)
+        .where(db.Sync.sync_id == sync_id)
+        .where(db.Sync.ring_id == ring.ring_id)
+        .where(db.Sync.source.is_(None))
+        .where(db.Sync.timestamp == datetime.fromtimestamp(timestamp, timezone.utc))
+    ).one_or_none()
+    return own is not None
+
+
+def _find_or_add_ring(session: Session, address: str) -> db.Ring:
+    """Like `db.create_or_find_ring` without committing, so the whole merge is one transaction"""
+    ring = session.scalars(select(db.Ring).where(db.Ring.address == address)).one_or_none()
+    if ring is None:
+        ring = db.Ring(address=address)
+        session.add(ring)
+        session.flush()
+    return ring
+
+
+def merge_changeset(session: Session, f: BinaryIO, local_source: str | None = None) -> MergeStats:
+    """
+    Apply a changeset to the database, in one transaction. local_source is the name this database exports changesets
+    under, so its own syncs are recognised if they come back.
+    """
+    blocks = export.read_columnar(f)
+    try:
+        header = next(blocks, None)
+    except ValueError:
+        header = None
+    if header is None or header.table != "changeset":
+        raise ValueError("Not a changeset")
+    logger.info(f"Merging changeset from {header.columns['source'][0]}, syncs {header.columns['since'][0]} on")
+
+    stats = MergeStats()
+    local_sync_ids: dict[tuple[str, int], int] = {}
+    touched: dict[int, list[int]] = defaultdict(list)
+    rings: dict[str, db.Ring] = {}
+    connection = session.connection()
+    for block in blocks:
+        ring = rings.get(block.address) or _find_or_add_ring(session, block.address)
+        rings[block.address] = ring
+        columns = block.columns
+        if block.table == "syncs":
+            for sync_id, local in _local_syncs(session, ring, columns, local_source, stats):
+                local_sync_ids[(block.address, sync_id)] = local
+            continue
+
+        sync_ids = [local_sync_ids[(block.address, s)] for s in columns["sync_id"]]
+        if block.table == "heart_rates":
+            # readings this database already has in packed days stay there
+            in_days = db.packed_heart_rates(session, ring.ring_id, min(columns["timestamp"]), max(columns["timestamp"]))
+            stats.heart_rates += connection.exec_driver_sql(
+                "INSERT INTO heart_rates (timestamp, reading, sync_id, ring_id) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (ring_id, timestamp) DO NOTHING",
+                [
+                    (t, r, s, ring.ring_id)
+                    for t, r, s in zip(columns["timestamp"], columns["reading"], sync_ids, strict=True)
+                    if t not in in_days
+                ],
+            ).rowcount
+            touched[ring.ring_id].extend((min(columns["timestamp"]), max(columns["timestamp"])))
+        elif block.table == "heart_rate_days":
+            days_by_sync = defaultdict(list)
+            offset = 0
+            for day, interval, slots, sync_id in zip(
+                columns["day"], columns["interval"], columns["slots"], sync_ids, strict=True
+            ):
+                days_by_sync[sync_id].append((day, interval, array("B", columns["readings"][offset : offset + slots])))
+                offset += slots
+            for sync_id, days in days_by_sync.items():
+                stats.heart_rate_days += db.write_heart_rate_days(session, ring.ring_id, sync_id, days)
+            touched[ring.ring_id].extend((min(columns["day"]), max(columns["day"]) + 86400 - 1))
+        elif block.table == "sport_details":
+            # only replace values written by an older sync, so the order changesets are merged in doesn't matter,
+            # and only when something changed, so merging a changeset again doesn't count as merging anything
+            stats.sport_details += connection.exec_driver_sql(
+                "INSERT INTO sport_details (timestamp, calories, steps, distance, sync_id, ring_id) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (ring_id, timestamp) DO UPDATE SET calories = excluded.calories, steps = excluded.steps, "
+                "distance = excluded.distance, sync_id = excluded.sync_id "
+                "WHERE (SELECT timestamp FROM syncs WHERE sync_id = excluded.sync_id) "
+                ">= (SELECT timestamp FROM syncs WHERE sync_id = sport_details.sync_id) "
+                "AND (sync_id, calories, steps, distance) "
+                "IS NOT (excluded.sync_id, excluded.calories, excluded.steps, excluded.distance)",
+                [
+                    (t, c, st, d, s, ring.ring_id)
+                    for t, c, st, d, s in zip(
+                        columns["timestamp"],
+                        columns["calories"],
+                        columns["steps"],
+                        columns["distance"],
+                        sync_ids,
+                        strict=True,
+                    )
+                ],
+            ).rowcount
+            touched[ring.ring_id].extend((min(columns["timestamp"]), max(columns["timestamp"])))
+        else:
+            raise ValueError(f"Unknown changeset table {block.table}")
+
+    for ring_id, timestamps in touched.items():
+        db.refresh_rollups(session, ring_id, min(timestamps), max(timestamps))
+    session.commit()
+    return stats
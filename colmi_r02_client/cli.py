@@ -2,25 +2,59 @@
 A python client for connecting to the Colmi R02 Smart ring
 """
 
+import contextlib
 import csv
 import dataclasses
 from datetime import datetime, timezone, timedelta
-from io import StringIO
 from pathlib import Path
 import logging
+import socket
 import time
+from typing import cast
 
 import asyncclick as click
-from bleak import BleakScanner
+from bleak import BleakClient, BleakScanner
+from sqlalchemy import select, type_coerce
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TypeEngine
 
 from colmi_r02_client.client import Client
-from colmi_r02_client import steps, pretty_print, db, date_utils, hr, real_time
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.profiling import Profiler
+from colmi_r02_client.tracing import Tracer
+from colmi_r02_client.writer import DatabaseWriter
+from colmi_r02_client import (
+    broadcaster,
+    changesets,
+    export,
+    retention,
+    shards,
+    steps,
+    pretty_print,
+    db,
+    date_utils,
+    hr,
+    real_time,
+    recorder,
+    replay,
+    synthetic,
+    importer,
+    bench as benchmarks,
+)
 
 logging.basicConfig(level=logging.WARNING, format="%(name)s: %(message)s")
 
 logger = logging.getLogger(__name__)
 
 
+class _EchoWriter:
+    """File like object for csv writers that writes with click.echo, so the output goes wherever click's does"""
+
+    def write(self, s: str) -> int:
+        click.echo(s, nl=False)
+        return len(s)
+
+
 @click.group()
 @click.option("--debug/--no-debug", default=False)
 @click.option(
@@ -30,11 +64,69 @@ logger = logging.getLogger(__name__)
 )
 @click.option("--address", required=False, help="Bluetooth address")
 @click.option("--name", required=False, help="Bluetooth name of the device, slower but will work on macOS")
+@click.option(
+    "--metrics",
+    "metrics_path",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Write metrics to this file when done, as JSON if it ends in .json and Prometheus text format otherwise",
+)
+@click.option(
+    "--trace-dir",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    required=False,
+    help="Dump the last packets received here on errors and timeouts. Defaults to the captures dir with --record",
+)
+@click.option(
+    "--trace-spans",
+    "spans_path",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Write timing spans for connecting, requests and db writes to this file as Chrome trace event JSON",
+)
+@click.option("--profile/--no-profile", default=False, help="Run the command under cProfile and print the hottest functions")
+@click.option("--profile-memory", is_flag=True, default=False, help="With --profile, also record the top allocations")
+@click.option(
+    "--replay",
+    "replay_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Answer requests from this capture instead of a ring, pass the address or name of the ring it came from",
+)
+@click.option(
+    "--replay-timing",
+    type=click.Choice(["fast", "original"]),
+    default="fast",
+    show_default=True,
+    help="With --replay, send responses as fast as possible or with the gaps they were recorded with",
+)
 @click.pass_context
-async def cli_client(context: click.Context, debug: bool, record: bool, address: str | None, name: str | None) -> None:
+async def cli_client(
+    context: click.Context,
+    debug: bool,
+    record: bool,
+    address: str | None,
+    name: str | None,
+    metrics_path: Path | None,
+    trace_dir: Path | None,
+    spans_path: Path | None,
+    profile: bool,
+    profile_memory: bool,
+    replay_path: Path | None,
+    replay_timing: str,
+) -> None:
+    if profile:
+        _start_profiling(context, profile_memory)
+
     if (address is None and name is None) or (address is not None and name is not None):
         context.fail("You must pass either the address option(preferred) or the name option, but not both")
 
+    ring = None
+    if replay_path is not None:
+        ring = replay.ReplayRing.from_capture(
+            replay_path, original_timing=replay_timing == "original", address=address or name
+        )
+
     if debug:
         logging.getLogger().setLevel(logging.DEBUG)
         logging.getLogger("bleak").setLevel(logging.INFO)
@@ -46,17 +138,35 @@ async def cli_client(context: click.Context, debug: bool, record: bool, address:
         captures.mkdir(exist_ok=True)
         record_to = captures / Path(f"colmi_response_capture_{now}.bin")
         logger.info(f"Recording responses to {record_to}")
+        if trace_dir is None:
+            trace_dir = captures
 
-    if name is not None:
+    if name is not None and ring is None:
         devices = await BleakScanner.discover()
         found = next((x for x in devices if x.name == name), None)
         if found is None:
             context.fail("No device found with given name")
         address = found.address
 
+    address = address or name
     assert address
 
-    client = Client(address, record_to=record_to)
+    metrics = Metrics(enabled=metrics_path is not None)
+    if metrics_path is not None:
+        context.call_on_close(lambda: metrics.write(metrics_path))
+
+    tracer = Tracer(enabled=spans_path is not None)
+    if spans_path is not None:
+        context.call_on_close(lambda: tracer.write(spans_path))
+
+    client = Client(
+        address,
+        record_to=record_to,
+        metrics=metrics,
+        trace_dir=trace_dir,
+        tracer=tracer,
+        bleak_client=cast(BleakClient, ring) if ring is not None else None,
+    )
 
     context.obj = client
 
@@ -86,9 +196,9 @@ async def get_heart_rate_log(client: Client, target: datetime) -> None:
         log = await client.get_heart_rate_log(target)
         print("Data:", log)
         if isinstance(log, hr.HeartRateLog):
-            for reading, ts in log.heart_rates_with_times():
-                if reading != 0:
-                    print(f"{ts.strftime('%H:%M')}, {reading}")
+            for epoch, reading in log.readings():
+                ts = datetime.fromtimestamp(epoch, timezone.utc)
+                print(f"{ts.strftime('%H:%M')}, {reading}")
 
 
 @cli_client.command()
@@ -157,6 +267,123 @@ async def get_real_time(client: Client, reading: str) -> None:
             click.echo(f"Error, no {reading.replace('-', ' ')} detected. Is the ring being worn?")
 
 
+@cli_client.command()
+@click.pass_obj
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(writable=True, path_type=Path),
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option("--duration", type=click.FloatRange(min=0, min_open=True), help="Seconds to record for, default until stopped")
+@click.option(
+    "--spo2-every",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds between SpO2 spot readings, default heart rate only",
+)
+@click.option(
+    "--block-seconds",
+    type=click.IntRange(min=1),
+    default=recorder.DEFAULT_BLOCK_SECONDS,
+    show_default=True,
+    help="Longest time a block of readings covers before it is written",
+)
+@click.option(
+    "--block-readings",
+    type=click.IntRange(min=1),
+    default=recorder.DEFAULT_BLOCK_READINGS,
+    show_default=True,
+    help="Most readings in a block before it is written",
+)
+async def record_real_time(
+    client: Client,
+    db_path: Path | None,
+    duration: float | None,
+    spo2_every: float | None,
+    block_seconds: int,
+    block_readings: int,
+) -> None:
+    """Record real time heart rate (and SpO2) to a sqlite database until stopped, reconnecting when the ring is lost"""
+
+    if db_path is None:
+        db_path = Path.cwd()
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+    click.echo(f"Writing to {db_path}, press Ctrl-C to stop")
+
+    async with DatabaseWriter(db_path, metrics=client.metrics, tracer=client.tracer) as writer:
+        recording = recorder.RealTimeRecorder(
+            client, writer, spo2_every=spo2_every, block_seconds=block_seconds, block_readings=block_readings
+        )
+        stats = await recording.run(duration)
+    click.echo(stats.summary())
+
+
+@cli_client.command()
+@click.pass_obj
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Unix socket to serve readings on, as lines of JSON",
+)
+@click.option(
+    "--port", type=click.IntRange(min=0, max=65535), help=f"Port to serve Server-Sent Events on at {broadcaster.SSE_HOST}"
+)
+@click.option(
+    "--buffer-size",
+    type=click.IntRange(min=1),
+    default=broadcaster.DEFAULT_BUFFER_SIZE,
+    show_default=True,
+    help="Readings a subscriber can fall behind by before it is disconnected",
+)
+@click.option("--duration", type=click.FloatRange(min=0, min_open=True), help="Seconds to run for, default until stopped")
+@click.option(
+    "--spo2-every",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds between SpO2 spot readings, default heart rate only",
+)
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(writable=True, path_type=Path),
+    help="Also record the readings to this database, like record-real-time",
+)
+async def broadcast_real_time(
+    client: Client,
+    socket_path: Path | None,
+    port: int | None,
+    buffer_size: int,
+    duration: float | None,
+    spo2_every: float | None,
+    db_path: Path | None,
+) -> None:
+    """Share real time readings with other programs over a Unix socket or Server-Sent Events"""
+
+    if socket_path is None and port is None:
+        raise click.UsageError("Give a --socket, a --port or both to serve readings on")
+
+    hub = broadcaster.Broadcaster(buffer_size)
+    async with contextlib.AsyncExitStack() as stack:
+        if socket_path is not None:
+            server = await stack.enter_async_context(await hub.serve_unix(socket_path))
+            click.echo(f"Serving lines of JSON on {socket_path}")
+        if port is not None:
+            server = await stack.enter_async_context(await hub.serve_sse(port))
+            click.echo(f"Serving events on http://{broadcaster.SSE_HOST}:{server.sockets[0].getsockname()[1]}/")
+        writer = None
+        if db_path is not None:
+            if db_path.is_dir():
+                db_path /= Path("ring_data.sqlite")
+            writer = await stack.enter_async_context(DatabaseWriter(db_path, metrics=client.metrics, tracer=client.tracer))
+        stack.callback(hub.close)
+
+        recording = recorder.RealTimeRecorder(client, writer, spo2_every=spo2_every, listeners=[hub.publish])
+        stats = await recording.run(duration)
+    click.echo(stats.summary())
+    click.echo(hub.stats.summary())
+
+
 @cli_client.command()
 @click.pass_obj
 @click.option(
@@ -180,12 +407,11 @@ async def get_steps(client: Client, when: datetime | None = None, as_csv: bool =
         if not as_csv:
             click.echo(pretty_print.print_dataclasses(result))
         else:
-            out = StringIO()
-            writer = csv.DictWriter(out, fieldnames=[f.name for f in dataclasses.fields(steps.SportDetail)])
+            # written a row at a time rather than built up in memory first
+            writer = csv.DictWriter(_EchoWriter(), fieldnames=[f.name for f in dataclasses.fields(steps.SportDetail)])
             writer.writeheader()
             for r in result:
                 writer.writerow(dataclasses.asdict(r))
-            click.echo(out.getvalue())
 
 
 @cli_client.command()
@@ -241,7 +467,27 @@ async def raw(client: Client, command: int, subdata: str | None, replies: int) -
     required=False,
     help="The date you want to start grabbing data to",
 )
-async def sync(client: Client, db_path: Path | None, start: datetime | None, end: datetime | None) -> None:
+@click.option(
+    "--heart-rate-storage",
+    type=click.Choice(db.HEART_RATE_STORAGE),
+    default=db.HEART_RATE_ROWS,
+    show_default=True,
+    help="Store heart rates as a row per reading, or as one compact row per day",
+)
+@click.option(
+    "--sharded",
+    is_flag=True,
+    default=False,
+    help="Treat --db as a directory with a database per ring, see util fleet-summary",
+)
+async def sync(
+    client: Client,
+    db_path: Path | None,
+    start: datetime | None,
+    end: datetime | None,
+    heart_rate_storage: str,
+    sharded: bool,
+) -> None:
     """
     Sync all data from the ring to a sqlite database
 
@@ -251,11 +497,15 @@ async def sync(client: Client, db_path: Path | None, start: datetime | None, end
 
     if db_path is None:
         db_path = Path.cwd()
-    if db_path.is_dir():
-        db_path /= Path("ring_data.sqlite")
+    if sharded:
+        db_path.mkdir(parents=True, exist_ok=True)
+        click.echo(f"Writing to {db.shard_path(db_path, client.address)}")
+    else:
+        if db_path.is_dir():
+            db_path /= Path("ring_data.sqlite")
+        click.echo(f"Writing to {db_path}")
 
-    click.echo(f"Writing to {db_path}")
-    with db.get_db_session(db_path) as session:
+    with db.get_db_session(db_path, address=client.address) as session:
         if start is None:
             start = db.get_last_sync(session, client.address)
         else:
@@ -273,14 +523,21 @@ async def sync(client: Client, db_path: Path | None, start: datetime | None, end
 
         async with client:
             fd = await client.get_full_data(start, end)
-            db.full_sync(session, fd)
+            db.full_sync(session, fd, client.metrics, client.tracer, heart_rate_storage=heart_rate_storage)
             when = datetime.now(tz=timezone.utc)
             click.echo("Ignore unexpect packet")
-            await client.set_time(when)
+            with client.tracer.span("set_time"):
+                await client.set_time(when)
 
     click.echo("Done")
 
 
+def _start_profiling(context: click.Context, memory: bool) -> None:
+    profiler = Profiler(context.invoked_subcommand or context.info_name or "command", memory=memory)
+    profiler.start()
+    context.call_on_close(lambda: click.echo(profiler.stop(), err=True))
+
+
 DEVICE_NAME_PREFIXES = [
     "R01",
     "R02",
@@ -306,9 +563,15 @@ DEVICE_NAME_PREFIXES = [
 
 
 @click.group()
-async def util():
+@click.option("--profile/--no-profile", default=False, help="Run the command under cProfile and print the hottest functions")
+@click.option("--profile-memory", is_flag=True, default=False, help="With --profile, also record the top allocations")
+@click.pass_context
+async def util(context: click.Context, profile: bool, profile_memory: bool) -> None:
     """Generic utilities for the R02 that don't need an address."""
 
+    if profile:
+        _start_profiling(context, profile_memory)
+
 
 @util.command()
 @click.option("--all", is_flag=True, help="Print all devices, no name filtering", default=False)
@@ -328,3 +591,368 @@ async def scan(all: bool) -> None:
                 click.echo(f"{name:>20}  |  {d.address}")
     else:
         click.echo("No devices found. Try moving the ring closer to computer")
+
+
+@util.command()
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    required=False,
+    help="JSON baseline to compare against",
+)
+@click.option("--save", is_flag=True, default=False, help="Write the results to --baseline instead of comparing")
+@click.option(
+    "--threshold",
+    type=click.FloatRange(min=1.0),
+    default=benchmarks.DEFAULT_THRESHOLD,
+    show_default=True,
+    help="Fail if anything is this many times slower than the baseline",
+)
+@click.option("--only", multiple=True, help="Only run benchmarks whose name contains this, can be repeated")
+@click.option(
+    "--repeat", type=click.IntRange(min=1), default=5, show_default=True, help="Runs per benchmark, the best is kept"
+)
+async def bench(baseline: Path | None, save: bool, threshold: float, only: tuple[str, ...], repeat: int) -> None:
+    """Run the offline benchmarks, optionally saving or checking a baseline."""
+
+    if save and baseline is None:
+        raise click.UsageError("--save needs --baseline")
+
+    results = await benchmarks.run(list(only), repeat=repeat)
+
+    if baseline is None or save:
+        click.echo(pretty_print.print_dicts(benchmarks.to_rows(results)))
+        if baseline is not None:
+            benchmarks.save_baseline(baseline, results)
+            click.echo(f"Saved baseline to {baseline}")
+        return
+
+    previous = benchmarks.load_baseline(baseline)
+    click.echo(pretty_print.print_dicts(benchmarks.to_rows(results, previous)))
+    slower = benchmarks.regressions(results, previous, threshold)
+    if slower:
+        raise click.ClickException("Slower than baseline:\n" + "\n".join(slower))
+
+
+@util.command()
+@click.option(
+    "--out",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=Path("captures") / "synthetic",
+    show_default=True,
+    help="Directory to write one capture file per ring to",
+)
+@click.option("--rings", type=click.IntRange(min=1), default=1, show_default=True)
+@click.option("--years", type=click.FloatRange(min=0, min_open=True), default=1.0, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+async def synthesize(out: Path, rings: int, years: float, seed: int) -> None:
+    """Write capture files of generated data for load testing."""
+
+    fleet = synthetic.generate(seed=seed, rings=rings, years=years)
+    for path in synthetic.write_captures(out, fleet, seed=seed):
+        click.echo(f"Wrote {path}")
+
+
+@util.command("replay")
+@click.argument("capture", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--address", required=True, help="Bluetooth address of the ring the capture came from")
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(writable=True, path_type=Path),
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(),
+    required=False,
+    help="The day the capture was synced up to, defaults to today",
+)
+@click.option("--timing", type=click.Choice(["fast", "original"]), default="fast", show_default=True)
+@click.pass_context
+async def replay_sync(
+    context: click.Context, capture: Path, address: str, db_path: Path | None, end: datetime | None, timing: str
+) -> None:
+    """Re-run sync from a capture of one, without a ring."""
+
+    ring = replay.ReplayRing.from_capture(capture, original_timing=timing == "original", address=address)
+    days = ring.remaining(hr.CMD_READ_HEART_RATE)
+    if days == 0:
+        raise click.ClickException(f"No heart rate logs in {capture}")
+
+    if end is None:
+        end = date_utils.now().replace(tzinfo=None)
+    start = end - timedelta(days=days - 1)
+    context.obj = Client(ring.address, bleak_client=cast(BleakClient, ring))
+    started = time.perf_counter()
+    await context.invoke(sync, db_path=db_path, start=start, end=end)
+    click.echo(f"Replayed {days} days in {time.perf_counter() - started:.3f}s")
+
+
+@util.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path))
+@click.option("--address", required=True, help="Bluetooth address of the ring the captures came from")
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(writable=True, path_type=Path),
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option("--jobs", type=click.IntRange(min=1), default=None, help="Processes to decode with, defaults to one per CPU")
+@click.option("--batch-size", type=click.IntRange(min=1), default=50, show_default=True, help="Captures per transaction")
+async def import_captures(
+    paths: tuple[Path, ...], address: str, db_path: Path | None, jobs: int | None, batch_size: int
+) -> None:
+    """Import capture files, or directories of them, into a sqlite database."""
+
+    if db_path is None:
+        db_path = Path.cwd()
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+
+    click.echo(f"Writing to {db_path}")
+    with db.get_db_session(db_path) as session:
+        stats = importer.import_captures(session, address, paths, jobs=jobs, batch_size=batch_size)
+    click.echo(stats.summary())
+
+
+@util.command()
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(exists=True, path_type=Path),
+    required=True,
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option("--address", required=False, help="Only rebuild for this ring")
+async def rebuild_rollups(db_path: Path, address: str | None) -> None:
+    """Recompute the hourly heart rate and daily steps tables from all the stored data."""
+
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+
+    with db.get_db_session(db_path) as session:
+        start = time.perf_counter()
+        db.rebuild_rollups(session, address)
+    click.echo(f"Rebuilt rollups in {time.perf_counter() - start:.2f}s")
+
+
+@util.command()
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(exists=True, path_type=Path),
+    required=True,
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+async def migrate_db(db_path: Path) -> None:
+    """Migrate a database from an older version, e.g. to store timestamps as integers, reporting size and query time."""
+
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+
+    with db.get_db_session(db_path, migrate=False) as session:
+        if db.schema_version(session) >= db.SCHEMA_VERSION:
+            click.echo(f"{db_path} is already up to date")
+            return
+        size_before = db_path.stat().st_size
+        text_timestamps = db.needs_epoch_migration(session)
+        query_before = _time_heart_rate_scan(
+            session, db.DateTimeInUTC(timezone=True) if text_timestamps else db.EpochInUTC()
+        )
+        db.migrate_schema(session)
+        size_after = db_path.stat().st_size
+        query_after = _time_heart_rate_scan(session, db.EpochInUTC())
+
+    click.echo(f"Size: {size_before / 1e6:.2f} MB -> {size_after / 1e6:.2f} MB")
+    click.echo(f"Reading all heart rates: {query_before:.3f}s -> {query_after:.3f}s")
+
+
+def _time_heart_rate_scan(session: Session, timestamp_type: TypeEngine[datetime]) -> float:
+    start = time.perf_counter()
+    session.execute(select(type_coerce(db.HeartRate.timestamp, timestamp_type), db.HeartRate.reading)).all()
+    return time.perf_counter() - start
+
+
+@util.command("export")
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(exists=True, path_type=Path),
+    required=True,
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option(
+    "--out",
+    "out_dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Directory to write a file per table to, defaults to the current directory",
+)
+@click.option(
+    "--table", "tables", type=click.Choice(export.TABLES), multiple=True, help="Tables to export, defaults to all of them"
+)
+@click.option("--format", "fmt", type=click.Choice(list(export.FORMATS)), default="csv", show_default=True)
+@click.option("--address", "addresses", multiple=True, help="Rings to export, defaults to all of them")
+@click.option("--start", type=click.DateTime(), required=False, help="Export data from this time on")
+@click.option("--end", type=click.DateTime(), required=False, help="Export data from before this time")
+async def export_db(
+    db_path: Path,
+    out_dir: Path | None,
+    tables: tuple[str, ...],
+    fmt: str,
+    addresses: tuple[str, ...],
+    start: datetime | None,
+    end: datetime | None,
+) -> None:
+    """Export heart rates, sport details and syncs from a database, streaming so any size of export works."""
+
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+    if out_dir is None:
+        out_dir = Path.cwd()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with db.get_db_session(db_path) as session:
+        for table in tables or export.TABLES:
+            path = out_dir / f"{table}{export.FORMATS[fmt]}"
+            with path.open("wb") as f:
+                rows = export.export_table(
+                    session,
+                    table,
+                    fmt,
+                    f,
+                    addresses=addresses or None,
+                    start=date_utils.naive_to_aware(start) if start is not None else None,
+                    end=date_utils.naive_to_aware(end) if end is not None else None,
+                )
+            click.echo(f"Wrote {rows} rows to {path}")
+
+
+@util.command()
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(exists=True, path_type=Path),
+    required=True,
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option(
+    "--raw-days",
+    type=click.IntRange(min=1),
+    default=retention.DEFAULT_RAW_DAYS,
+    show_default=True,
+    help="Days of raw readings to keep, older data is only kept as hourly and daily rollups",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=retention.DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Rows deleted per transaction",
+)
+@click.option("--vacuum-pages", type=click.IntRange(min=1), default=None, help="Free at most this many pages")
+async def maintain(db_path: Path, raw_days: int, batch_size: int, vacuum_pages: int | None) -> None:
+    """Prune raw readings past the retention period, then vacuum and analyze the database."""
+
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+
+    size_before = db_path.stat().st_size
+    with db.get_db_session(db_path) as session:
+        stats = retention.maintain(session, retention.RetentionPolicy(raw_days, batch_size), vacuum_pages=vacuum_pages)
+    click.echo(stats.summary())
+    click.echo(f"Size: {size_before / 1e6:.2f} MB -> {db_path.stat().st_size / 1e6:.2f} MB")
+
+
+@util.command()
+@click.option(
+    "--shards",
+    "shard_dir",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    required=True,
+    help="Directory with a database per ring, written by sync --sharded",
+)
+@click.option("--start", type=click.DateTime(), required=True, help="Summarize data from this day on")
+@click.option("--end", type=click.DateTime(), required=True, help="Summarize data from before this day")
+@click.option("--jobs", type=click.IntRange(min=1), default=None, help="Shards to query at once")
+async def fleet_summary(shard_dir: Path, start: datetime, end: datetime, jobs: int | None) -> None:
+    """Heart rate and step totals for every ring in a sharded layout, querying the shards in parallel."""
+
+    start = date_utils.naive_to_aware(start)
+    end = date_utils.naive_to_aware(end)
+
+    def summarize(session: Session, address: str) -> tuple[int, float, int]:
+        heart_rates = db.aggregate_heart_rates(session, address, start, end, bucket_seconds=86400)
+        sport_details = db.aggregate_sport_details(session, address, start, end)
+        readings = sum(heart_rates.counts)
+        average = sum(a * c for a, c in zip(heart_rates.averages, heart_rates.counts, strict=True)) / max(readings, 1)
+        return readings, average, sum(sport_details.steps)
+
+    started = time.perf_counter()
+    results = shards.fan_out(shard_dir, summarize, jobs)
+    writer = csv.writer(_EchoWriter())
+    writer.writerow(["address", "heart_rate_readings", "average_heart_rate", "steps"])
+    for address, (readings, average, total_steps) in sorted(results.items()):
+        writer.writerow([address, readings, f"{average:.1f}", total_steps])
+    click.echo(f"Summarized {len(results)} rings in {time.perf_counter() - started:.2f}s", err=True)
+
+
+@util.command()
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(exists=True, path_type=Path),
+    required=True,
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option("--out", type=click.Path(dir_okay=False, writable=True, path_type=Path), required=True)
+@click.option("--source", help="Name for this database in the changeset, defaults to the host name")
+@click.option("--since", type=click.IntRange(min=0), default=None, help="Export syncs after this sync_id")
+@click.option(
+    "--cursor",
+    "cursor_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="File keeping the last exported sync_id, read for --since and updated afterwards",
+)
+async def changeset_export(
+    db_path: Path, out: Path, source: str | None, since: int | None, cursor_path: Path | None
+) -> None:
+    """Export everything synced since the last changeset, to merge into another database with changeset-merge."""
+
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+    if since is None:
+        since = int(cursor_path.read_text()) if cursor_path is not None and cursor_path.exists() else 0
+
+    with db.get_db_session(db_path) as session, out.open("wb") as f:
+        stats = changesets.write_changeset(session, f, source or socket.gethostname(), since)
+    if cursor_path is not None:
+        cursor_path.write_text(f"{stats.until}\n")
+    click.echo(f"Wrote {stats.rows} rows from syncs {stats.since + 1} to {stats.until} to {out}")
+
+
+@util.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "--db",
+    "db_path",
+    type=click.Path(writable=True, path_type=Path),
+    help="Path to a directory or file to use as the database. If dir, then filename will be ring_data.sqlite",
+)
+@click.option(
+    "--source",
+    help="Name this database exports changesets under, so its own syncs are recognised, defaults to the host name",
+)
+async def changeset_merge(paths: tuple[Path, ...], db_path: Path | None, source: str | None) -> None:
+    """Merge changesets into a database, merging the same changeset more than once is harmless."""
+
+    if db_path is None:
+        db_path = Path.cwd()
+    if db_path.is_dir():
+        db_path /= Path("ring_data.sqlite")
+
+    with db.get_db_session(db_path) as session:
+        for path in paths:
+            with path.open("rb") as f:
+                stats = changesets.merge_changeset(session, f, source or socket.gethostname())
+            click.echo(f"{path}: {stats.summary()}")
@@ -1,16 +1,35 @@
 import asyncio
-from collections.abc import Callable
+from collections.abc import AsyncGenerator
 from datetime import datetime, timezone
 from dataclasses import dataclass
 import logging
 from pathlib import Path
+import struct
+import time
 from types import TracebackType
 from typing import Any
 
 from bleak import BleakClient
 from bleak.backends.characteristic import BleakGATTCharacteristic
-
-from colmi_r02_client import battery, date_utils, steps, set_time, blink_twice, hr, hr_settings, packet, reboot, real_time
+from bleak.exc import BleakError
+
+from colmi_r02_client import (
+    battery,
+    date_utils,
+    decoder,
+    steps,
+    set_time,
+    blink_twice,
+    hr,
+    hr_settings,
+    packet,
+    reboot,
+    real_time,
+)
+from colmi_r02_client.bus import PacketBus
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.trace import PacketTrace
+from colmi_r02_client.tracing import Tracer
 
 UART_SERVICE_UUID = "6E40FFF0-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_RX_CHAR_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
@@ -20,12 +39,12 @@ DEVICE_INFO_UUID = "0000180A-0000-1000-8000-00805F9B34FB"
 DEVICE_HW_UUID = "00002A27-0000-1000-8000-00805F9B34FB"
 DEVICE_FW_UUID = "00002A26-0000-1000-8000-00805F9B34FB"
 
-logger = logging.getLogger(__name__)
-
+REAL_TIME_KEEP_ALIVE = 10.0
+"""Seconds between asking the ring to carry on streaming real time readings"""
+REAL_TIME_MAX_WAIT = 30.0
+"""Seconds without a real time reading before the connection is considered lost"""
 
-def empty_parse(_packet: bytearray) -> None:
-    """Used for commands that we expect a response, but there's nothing in the response"""
-    return None
+logger = logging.getLogger(__name__)
 
 
 def log_packet(packet: bytearray) -> None:
@@ -40,32 +59,50 @@ class FullData:
     sport_details: list[list[steps.SportDetail] | steps.NoData]
 
 
-COMMAND_HANDLERS: dict[int, Callable[[bytearray], Any]] = {
-    battery.CMD_BATTERY: battery.parse_battery,
-    real_time.CMD_START_REAL_TIME: real_time.parse_real_time_reading,
-    real_time.CMD_STOP_REAL_TIME: empty_parse,
-    steps.CMD_GET_STEP_SOMEDAY: steps.SportDetailParser().parse,
-    hr.CMD_READ_HEART_RATE: hr.HeartRateLogParser().parse,
-    set_time.CMD_SET_TIME: empty_parse,
-    hr_settings.CMD_HEART_RATE_LOG_SETTINGS: hr_settings.parse_heart_rate_log_settings,
-}
-"""
-TODO put these somewhere nice
+class Client:
+    def __init__(
+        self,
+        address: str,
+        record_to: Path | None = None,
+        metrics: Metrics | None = None,
+        trace_dir: Path | None = None,
+        tracer: Tracer | None = None,
+        bleak_client: BleakClient | None = None,
+    ):
+        """
+        record_to is a file that every received packet is appended to. When each one arrived is written alongside it, so
+        it can be replayed with the original timing, see `colmi_r02_client.replay`.
 
-These are commands that we expect to have a response returned for
-they must accept a packet as bytearray and then return a value to be put
-in the queue for that command type
-NOTE: if the value returned is None, it is not added to the queue, this is to support
-multi packet messages where the parser has state
-"""
+        trace_dir is where the last received packets are dumped when something goes wrong, see
+        `colmi_r02_client.trace`. If it's None they are kept in memory only.
 
+        tracer records spans for connecting and each request made by get_full_data, see `colmi_r02_client.tracing`.
 
-class Client:
-    def __init__(self, address: str, record_to: Path | None = None):
+        bleak_client replaces the real bluetooth connection, for example with a
+        `colmi_r02_client.simulator.SimulatedRing`.
+
+        Every packet received is published on bus, see `colmi_r02_client.bus`. Subscribe to it to see packets for a
+        command as they arrive. Metrics and recording only subscribe when they are turned on here, so they cost nothing
+        otherwise.
+        """
         self.address = address
-        self.bleak_client = BleakClient(self.address)
-        self.queues: dict[int, asyncio.Queue] = {cmd: asyncio.Queue() for cmd in COMMAND_HANDLERS}
+        self.bleak_client = bleak_client if bleak_client is not None else BleakClient(self.address)
+        # the multi packet parsers keep state between packets, so every client gets its own
+        self.decoder = decoder.PacketDecoder(decoder.new_command_handlers())
+        self.queues: dict[int, asyncio.Queue] = {cmd: asyncio.Queue() for cmd in self.decoder.handlers}
         self.record_to = record_to
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.trace = PacketTrace()
+        self.trace_dir = trace_dir
+        self.tracer = tracer if tracer is not None else Tracer()
+
+        self.bus = PacketBus(unhandled=self._unexpected_packet)
+        self.bus.subscribe(self._trace_packet)
+        if self.metrics.enabled:
+            self.bus.subscribe(self._count_packet)
+        if self.record_to is not None:
+            self.bus.subscribe(self._record_packet)
+        self.bus.subscribe(self._parse_packet, *self.decoder.handlers)
 
     async def __aenter__(self) -> "Client":
         logger.info(f"Connecting to {self.address}")
@@ -85,15 +122,19 @@ class Client:
         await self.disconnect()
 
     async def connect(self):
-        await self.bleak_client.connect()
+        with self.tracer.span("connect", address=self.address):
+            # bleak does service discovery as part of connecting
+            with self.tracer.span("ble_connect"):
+                await self.bleak_client.connect()
 
-        nrf_uart_service = self.bleak_client.services.get_service(UART_SERVICE_UUID)
-        assert nrf_uart_service
-        rx_char = nrf_uart_service.get_characteristic(UART_RX_CHAR_UUID)
-        assert rx_char
-        self.rx_char = rx_char
+            nrf_uart_service = self.bleak_client.services.get_service(UART_SERVICE_UUID)
+            assert nrf_uart_service
+            rx_char = nrf_uart_service.get_characteristic(UART_RX_CHAR_UUID)
+            assert rx_char
+            self.rx_char = rx_char
 
-        await self.bleak_client.start_notify(UART_TX_CHAR_UUID, self._handle_tx)
+            with self.tracer.span("start_notify"):
+                await self.bleak_client.start_notify(UART_TX_CHAR_UUID, self._handle_tx)
 
     async def disconnect(self):
         await self.bleak_client.disconnect()
@@ -101,33 +142,85 @@ class Client:
     def _handle_tx(self, _: BleakGATTCharacteristic, packet: bytearray) -> None:
         """Bleak callback that handles new packets from the ring."""
 
-        logger.info(f"Received packet {packet}")
-
-        assert len(packet) == 16, f"Packet is the wrong length {packet}"
-        packet_type = packet[0]
-        assert packet_type < 127, f"Packet has error bit set {packet}"
-
-        if packet_type in COMMAND_HANDLERS:
-            result = COMMAND_HANDLERS[packet_type](packet)
-            if result is not None:
-                self.queues[packet_type].put_nowait(result)
-            else:
-                logger.debug(f"No result returned from parser for {packet_type}")
+        try:
+            self.bus.publish(packet)
+        except Exception:
+            self._dump_trace("error")
+            raise
+
+    def _trace_packet(self, packet: memoryview) -> None:
+        """Keep every packet for dumping later, and reject malformed ones before anything else sees them"""
+        if not self.trace.record(packet):
+            logger.warning("Bad checksum on packet %s", bytes(packet))
+            if self.metrics.enabled:
+                self.metrics.inc("corrupt_packets_total", command=packet[0] if packet else -1)
+
+        assert len(packet) == 16, f"Packet is the wrong length {bytes(packet)!r}"
+        assert packet[0] < 127, f"Packet has error bit set {bytes(packet)!r}"
+
+    def _count_packet(self, packet: memoryview) -> None:
+        self.metrics.inc("packets_received_total", command=packet[0])
+
+    def _parse_packet(self, packet: memoryview) -> None:
+        metrics = self.metrics
+        if metrics.enabled:
+            start = time.perf_counter()
+            message = self.decoder.decode_packet(packet)
+            metrics.observe("parse_seconds", time.perf_counter() - start, command=packet[0])
         else:
-            logger.warning(f"Did not expect this packet: {packet}")
-
-        if self.record_to is not None:
-            with self.record_to.open("ab") as f:
-                f.write(packet)
-                f.write(b"\n")
+            message = self.decoder.decode_packet(packet)
+        if message is not None:
+            queue = self.queues[message.command]
+            queue.put_nowait(message.value)
+            if metrics.enabled:
+                metrics.set("queue_depth", queue.qsize(), command=message.command)
+        else:
+            logger.debug("No result returned from parser for %s", packet[0])
+
+    def _unexpected_packet(self, packet: memoryview) -> None:
+        logger.warning(f"Did not expect this packet: {bytes(packet)!r}")
+        if self.metrics.enabled:
+            self.metrics.inc("unexpected_packets_total", command=packet[0])
+
+    def _record_packet(self, packet: memoryview) -> None:
+        assert self.record_to is not None
+        with self.record_to.open("ab") as f:
+            f.write(packet)
+            f.write(decoder.CAPTURE_SEPARATOR)
+        with decoder.capture_times_path(self.record_to).open("ab") as f:
+            f.write(struct.pack("<d", time.time()))
+
+    def _dump_trace(self, reason: str) -> None:
+        if self.trace_dir is not None:
+            self.trace.dump(self.trace_dir, reason)
+
+    async def _wait_for_response(self, command: int, max_wait: float | None = 2) -> Any:
+        """Wait for the next parsed response to command, recording the round trip time if metrics are enabled"""
+        if not self.metrics.enabled:
+            try:
+                return await asyncio.wait_for(self.queues[command].get(), timeout=max_wait)
+            except TimeoutError:
+                self._dump_trace(f"timeout_{command}")
+                raise
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.queues[command].get(), timeout=max_wait)
+        except TimeoutError:
+            self.metrics.inc("timeouts_total", command=command)
+            self._dump_trace(f"timeout_{command}")
+            raise
+        self.metrics.observe("request_seconds", time.perf_counter() - start, command=command)
+        self.metrics.set("queue_depth", self.queues[command].qsize(), command=command)
+        return result
 
     async def send_packet(self, packet: bytearray) -> None:
-        logger.debug(f"Sending packet: {packet}")
+        logger.debug("Sending packet: %s", packet)
         await self.bleak_client.write_gatt_char(self.rx_char, packet, response=False)
 
     async def get_battery(self) -> battery.BatteryInfo:
         await self.send_packet(battery.BATTERY_PACKET)
-        result = await self.queues[battery.CMD_BATTERY].get()
+        result = await self._wait_for_response(battery.CMD_BATTERY, max_wait=None)
         assert isinstance(result, battery.BatteryInfo)
         return result
 
@@ -142,9 +235,8 @@ class Client:
         tries = 0
         while len(valid_readings) < 6 and tries < 20:
             try:
-                data: real_time.Reading | real_time.ReadingError = await asyncio.wait_for(
-                    self.queues[real_time.CMD_START_REAL_TIME].get(),
-                    timeout=2,
+                data: real_time.Reading | real_time.ReadingError = await self._wait_for_response(
+                    real_time.CMD_START_REAL_TIME
                 )
                 if isinstance(data, real_time.ReadingError):
                     error = True
@@ -162,6 +254,33 @@ class Client:
     async def get_realtime_reading(self, reading_type: real_time.RealTimeReading) -> list[int] | None:
         return await self._poll_real_time_reading(reading_type)
 
+    async def stream_real_time(
+        self,
+        reading_type: real_time.RealTimeReading,
+        keep_alive: float = REAL_TIME_KEEP_ALIVE,
+        max_wait: float = REAL_TIME_MAX_WAIT,
+    ) -> AsyncGenerator[real_time.Reading | real_time.ReadingError, None]:
+        """
+        Every real time reading the ring sends after starting reading_type, for as long as the caller keeps going.
+
+        The ring is asked to carry on every keep_alive seconds. TimeoutError is raised when nothing arrives for max_wait
+        seconds, e.g. because the ring went out of range. The reading is stopped when the generator is closed, so use it
+        with `contextlib.aclosing`.
+        """
+        await self.send_packet(real_time.get_start_packet(reading_type))
+        last_keep_alive = time.monotonic()
+        try:
+            while True:
+                yield await self._wait_for_response(real_time.CMD_START_REAL_TIME, max_wait=max_wait)
+                if time.monotonic() - last_keep_alive >= keep_alive:
+                    await self.send_packet(real_time.get_continue_packet(reading_type))
+                    last_keep_alive = time.monotonic()
+        finally:
+            try:
+                await self.send_packet(real_time.get_stop_packet(reading_type))
+            except BleakError as e:
+                logger.warning(f"Couldn't stop real time {reading_type.name}: {e}")
+
     async def set_time(self, ts: datetime) -> None:
         await self.send_packet(set_time.set_time_packet(ts))
 
@@ -186,32 +305,53 @@ class Client:
 
         return data
 
-    async def get_heart_rate_log(self, target: datetime | None = None) -> hr.HeartRateLog | hr.NoData:
+    async def _get_multi_packet(self, request: bytearray, retries: int) -> Any:
+        """
+        Send request and wait for the multi packet response, sending it again if it times out or packets go missing.
+
+        Only the one request is repeated, so a single dropped notification costs one extra round trip.
+        """
+        command = request[0]
+        attempt = 0
+        while True:
+            await self.send_packet(request)
+            try:
+                result = await self._wait_for_response(command)
+            except TimeoutError:
+                if attempt >= retries:
+                    raise
+                logger.warning(f"Timed out waiting for response to command {command}, retrying")
+            else:
+                if not isinstance(result, packet.IncompleteTransfer):
+                    return result
+                if attempt >= retries:
+                    self._dump_trace(f"incomplete_{command}")
+                    raise packet.TransferError(result)
+                logger.warning(f"Lost {result.lost} packet(s) in response to command {command}, retrying")
+            attempt += 1
+
+    async def get_heart_rate_log(self, target: datetime | None = None, retries: int = 1) -> hr.HeartRateLog | hr.NoData:
         if target is None:
             target = date_utils.start_of_day(date_utils.now())
-        await self.send_packet(hr.read_heart_rate_packet(target))
-        return await asyncio.wait_for(
-            self.queues[hr.CMD_READ_HEART_RATE].get(),
-            timeout=2,
-        )
+        result = await self._get_multi_packet(hr.read_heart_rate_packet(target), retries)
+        assert isinstance(result, hr.HeartRateLog | hr.NoData)
+        return result
 
     async def get_heart_rate_log_settings(self) -> hr_settings.HeartRateLogSettings:
         await self.send_packet(hr_settings.READ_HEART_RATE_LOG_SETTINGS_PACKET)
-        return await asyncio.wait_for(
-            self.queues[hr_settings.CMD_HEART_RATE_LOG_SETTINGS].get(),
-            timeout=2,
-        )
+        result = await self._wait_for_response(hr_settings.CMD_HEART_RATE_LOG_SETTINGS)
+        assert isinstance(result, hr_settings.HeartRateLogSettings)
+        return result
 
     async def set_heart_rate_log_settings(self, enabled: bool, interval: int) -> None:
         await self.send_packet(hr_settings.hr_log_settings_packet(hr_settings.HeartRateLogSettings(enabled, interval)))
 
         # clear response from queue as it's unused and wrong
-        await asyncio.wait_for(
-            self.queues[hr_settings.CMD_HEART_RATE_LOG_SETTINGS].get(),
-            timeout=2,
-        )
+        await self._wait_for_response(hr_settings.CMD_HEART_RATE_LOG_SETTINGS)
 
-    async def get_steps(self, target: datetime, today: datetime | None = None) -> list[steps.SportDetail] | steps.NoData:
+    async def get_steps(
+        self, target: datetime, today: datetime | None = None, retries: int = 1
+    ) -> list[steps.SportDetail] | steps.NoData:
         if today is None:
             today = datetime.now(timezone.utc)
 
@@ -222,11 +362,9 @@ class Client:
         days = (today.date() - target.date()).days
         logger.debug(f"Looking back {days} days")
 
-        await self.send_packet(steps.read_steps_packet(days))
-        return await asyncio.wait_for(
-            self.queues[steps.CMD_GET_STEP_SOMEDAY].get(),
-            timeout=2,
-        )
+        result = await self._get_multi_packet(steps.read_steps_packet(days), retries)
+        assert isinstance(result, list | steps.NoData)
+        return result
 
     async def reboot(self) -> None:
         await self.send_packet(reboot.REBOOT_PACKET)
@@ -237,10 +375,7 @@ class Client:
 
         results = []
         while replies > 0:
-            data: bytearray = await asyncio.wait_for(
-                self.queues[command].get(),
-                timeout=2,
-            )
+            data: bytearray = await self._wait_for_response(command)
             results.append(data)
             replies -= 1
 
@@ -252,8 +387,11 @@ class Client:
         """
         heart_rate_logs = []
         sport_detail_logs = []
-        for d in date_utils.dates_between(start, end):
-            heart_rate_logs.append(await self.get_heart_rate_log(d))
-            sport_detail_logs.append(await self.get_steps(d))
+        with self.tracer.span("get_full_data", start=start, end=end):
+            for d in date_utils.dates_between(start, end):
+                with self.tracer.span("get_heart_rate_log", day=d.date()):
+                    heart_rate_logs.append(await self.get_heart_rate_log(d))
+                with self.tracer.span("get_steps", day=d.date()):
+                    sport_detail_logs.append(await self.get_steps(d))
 
         return FullData(self.address, heart_rates=heart_rate_logs, sport_details=sport_detail_logs)
@@ -0,0 +1,242 @@
+"""
+Columnar version of `colmi_r02_client.client.FullData`.
+
+Instead of a list of per day objects, every metric is stored as flat parallel arrays of unix timestamps (in seconds)
+and values, plus a mask recording which of the requested days actually had data. The row generators can be handed
+directly to `executemany` or a `csv.writer` without building any intermediate objects.
+
+The same layout is used for results read back from the database, see `colmi_r02_client.db.get_heart_rate_columns`.
+
+All timestamps are UTC.
+"""
+
+from array import array
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+import importlib
+from typing import Any
+
+from colmi_r02_client import hr, steps
+from colmi_r02_client.client import FullData
+
+
+def _epoch(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+@dataclass
+class ColumnarFullData:
+    address: str
+
+    heart_rate_days: bytearray = field(default_factory=bytearray)
+    """One byte per requested day, 1 if there was a heart rate log for that day and 0 for `hr.NoData`"""
+    heart_rate_log_timestamps: "array[int]" = field(default_factory=lambda: array("q"))
+    """`hr.HeartRateLog.timestamp` for each log"""
+    heart_rate_log_sizes: "array[int]" = field(default_factory=lambda: array("H"))
+    heart_rate_log_indexes: "array[int]" = field(default_factory=lambda: array("H"))
+    heart_rate_log_ranges: "array[int]" = field(default_factory=lambda: array("H"))
+    heart_rate_log_lengths: "array[int]" = field(default_factory=lambda: array("H"))
+    """Length of `hr.HeartRateLog.heart_rates` for each log, usually 288"""
+    heart_rate_timestamps: "array[int]" = field(default_factory=lambda: array("q"))
+    heart_rate_values: "array[int]" = field(default_factory=lambda: array("B"))
+    """
+    Every slot of every log that falls within its day, 0 meaning no reading.
+
+    With intervals longer than 5 minutes the trailing slots past midnight are always empty, so they are not stored and
+    are padded back with 0 by `to_full_data`.
+    """
+
+    sport_detail_days: bytearray = field(default_factory=bytearray)
+    """One byte per requested day, 1 if there were sport details for that day and 0 for `steps.NoData`"""
+    sport_detail_lengths: "array[int]" = field(default_factory=lambda: array("H"))
+    """Number of sport details for each day with data"""
+    sport_detail_timestamps: "array[int]" = field(default_factory=lambda: array("q"))
+    sport_detail_calories: "array[int]" = field(default_factory=lambda: array("L"))
+    sport_detail_steps: "array[int]" = field(default_factory=lambda: array("L"))
+    sport_detail_distances: "array[int]" = field(default_factory=lambda: array("L"))
+
+    def add_heart_rate_log(self, log: hr.HeartRateLog | hr.NoData) -> None:
+        if isinstance(log, hr.NoData):
+            self.heart_rate_days.append(0)
+            return
+
+        self.heart_rate_days.append(1)
+        self.heart_rate_log_timestamps.append(_epoch(log.timestamp))
+        self.heart_rate_log_sizes.append(log.size)
+        self.heart_rate_log_indexes.append(log.index)
+        self.heart_rate_log_ranges.append(log.range)
+        self.heart_rate_log_lengths.append(len(log.heart_rates))
+        timestamps = log.epoch_timestamps()
+        self.heart_rate_timestamps.extend(timestamps)
+        self.heart_rate_values.extend(log.heart_rates[: len(timestamps)])
+
+    def add_sport_details(self, details: list[steps.SportDetail] | steps.NoData) -> None:
+        if isinstance(details, steps.NoData):
+            self.sport_detail_days.append(0)
+            return
+
+        self.sport_detail_days.append(1)
+        self.sport_detail_lengths.append(len(details))
+        for detail in details:
+            self.sport_detail_timestamps.append(detail.epoch)
+            self.sport_detail_calories.append(detail.calories)
+            self.sport_detail_steps.append(detail.steps)
+            self.sport_detail_distances.append(detail.distance)
+
+    @classmethod
+    def from_full_data(cls, data: FullData) -> "ColumnarFullData":
+        result = cls(address=data.address)
+        for log in data.heart_rates:
+            result.add_heart_rate_log(log)
+        for details in data.sport_details:
+            result.add_sport_details(details)
+        return result
+
+    def to_full_data(self) -> FullData:
+        return FullData(
+            address=self.address,
+            heart_rates=list(self.heart_rate_logs()),
+            sport_details=list(self.sport_detail_logs()),
+        )
+
+    def heart_rate_logs(self) -> Iterator[hr.HeartRateLog | hr.NoData]:
+        """Rebuild the per day heart rate logs, in the same order they were added"""
+        log_i = 0
+        offset = 0
+        for present in self.heart_rate_days:
+            if not present:
+                yield hr.NoData()
+                continue
+            length = self.heart_rate_log_lengths[log_i]
+            stored = min(length, hr.MINUTES_PER_DAY // self.heart_rate_log_ranges[log_i])
+            heart_rates = self.heart_rate_values[offset : offset + stored]
+            heart_rates.extend(bytes(length - stored))
+            yield hr.HeartRateLog(
+                heart_rates=heart_rates,
+                timestamp=datetime.fromtimestamp(self.heart_rate_log_timestamps[log_i], timezone.utc),
+                size=self.heart_rate_log_sizes[log_i],
+                index=self.heart_rate_log_indexes[log_i],
+                range=self.heart_rate_log_ranges[log_i],
+            )
+            log_i += 1
+            offset += stored
+
+    def sport_detail_logs(self) -> Iterator[list[steps.SportDetail] | steps.NoData]:
+        """Rebuild the per day sport details, in the same order they were added"""
+        day_i = 0
+        offset = 0
+        for present in self.sport_detail_days:
+            if not present:
+                yield steps.NoData()
+                continue
+            details = []
+            for i in range(offset, offset + self.sport_detail_lengths[day_i]):
+                ts = datetime.fromtimestamp(self.sport_detail_timestamps[i], timezone.utc)
+                details.append(
+                    steps.SportDetail(
+                        year=ts.year,
+                        month=ts.month,
+                        day=ts.day,
+                        time_index=ts.hour * 4 + ts.minute // 15,
+                        calories=self.sport_detail_calories[i],
+                        steps=self.sport_detail_steps[i],
+                        distance=self.sport_detail_distances[i],
+                    )
+                )
+            yield details
+            offset += self.sport_detail_lengths[day_i]
+            day_i += 1
+
+    def heart_rate_rows(self) -> Iterator[tuple[int, int]]:
+        """(timestamp, reading) for every slot with a reading"""
+        for ts, reading in zip(self.heart_rate_timestamps, self.heart_rate_values, strict=True):
+            if reading != 0:
+                yield ts, reading
+
+    def sport_detail_rows(self) -> Iterator[tuple[int, int, int, int]]:
+        """(timestamp, calories, steps, distance) for every sport detail"""
+        return zip(
+            self.sport_detail_timestamps,
+            self.sport_detail_calories,
+            self.sport_detail_steps,
+            self.sport_detail_distances,
+            strict=True,
+        )
+
+
+@dataclass(slots=True)
+class _Columns:
+    """Parallel arrays, one per field, filled from database rows"""
+
+    def add_rows(self, rows: Sequence[tuple[Any, ...]]) -> None:
+        """Append rows, each being one value per column in field order"""
+        if not rows:
+            return
+        for column, values in zip(fields(self), zip(*rows, strict=True), strict=True):
+            getattr(self, column.name).extend(values)
+
+    def extend(self, other: "_Columns") -> None:
+        for column in fields(self):
+            getattr(self, column.name).extend(getattr(other, column.name))
+
+    def __len__(self) -> int:
+        return len(getattr(self, fields(self)[0].name))
+
+    def to_numpy(self) -> dict[str, Any]:
+        """
+        Each column as a numpy array sharing memory with the python array, numpy is only needed when this is called.
+        """
+        try:
+            numpy = importlib.import_module("numpy")
+        except ImportError as e:
+            raise ImportError("to_numpy needs numpy installed, try pip install numpy") from e
+        return {
+            column.name: numpy.frombuffer(getattr(self, column.name), dtype=getattr(self, column.name).typecode)
+            for column in fields(self)
+        }
+
+
+@dataclass(slots=True)
+class HeartRateColumns(_Columns):
+    timestamps: "array[int]" = field(default_factory=lambda: array("q"))
+    readings: "array[int]" = field(default_factory=lambda: array("B"))
+
+
+@dataclass(slots=True)
+class RealTimeColumns(_Columns):
+    """Readings streamed from the ring, timestamps are in milliseconds as there can be more than one a second"""
+
+    timestamps: "array[int]" = field(default_factory=lambda: array("q"))
+    readings: "array[int]" = field(default_factory=lambda: array("B"))
+
+
+@dataclass(slots=True)
+class SportDetailColumns(_Columns):
+    timestamps: "array[int]" = field(default_factory=lambda: array("q"))
+    calories: "array[int]" = field(default_factory=lambda: array("L"))
+    steps: "array[int]" = field(default_factory=lambda: array("L"))
+    distances: "array[int]" = field(default_factory=lambda: array("L"))
+
+
+@dataclass(slots=True)
+class HeartRateBuckets(_Columns):
+    """Heart rates summarized per bucket, only buckets with readings are included"""
+
+    starts: "array[int]" = field(default_factory=lambda: array("q"))
+    mins: "array[int]" = field(default_factory=lambda: array("B"))
+    maxes: "array[int]" = field(default_factory=lambda: array("B"))
+    averages: "array[float]" = field(default_factory=lambda: array("d"))
+    counts: "array[int]" = field(default_factory=lambda: array("L"))
+
+
+@dataclass(slots=True)
+class SportDetailBuckets(_Columns):
+    """Sport details summed per bucket, only buckets with sport details are included"""
+
+    starts: "array[int]" = field(default_factory=lambda: array("q"))
+    calories: "array[int]" = field(default_factory=lambda: array("L"))
+    steps: "array[int]" = field(default_factory=lambda: array("L"))
+    distances: "array[int]" = field(default_factory=lambda: array("L"))
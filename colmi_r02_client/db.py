@@ -1,15 +1,31 @@
+from array import array
 from datetime import datetime, timezone
+from collections.abc import Iterable, Iterator, Sequence
+import heapq
+from itertools import islice
 from pathlib import Path
 import logging
+import re
+import time
 from typing import Any
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session, relationship
-from sqlalchemy import select, UniqueConstraint, ForeignKey, create_engine, event, func, types
+from sqlalchemy import Index, Integer, select, UniqueConstraint, ForeignKey, create_engine, event, func, type_coerce, types
 from sqlalchemy.engine import Engine, Dialect
 
-from colmi_r02_client import hr, steps
+from colmi_r02_client import hr, packed
 from colmi_r02_client.client import FullData
+from colmi_r02_client.columnar import (
+    ColumnarFullData,
+    HeartRateBuckets,
+    HeartRateColumns,
+    RealTimeColumns,
+    SportDetailBuckets,
+    SportDetailColumns,
+)
 from colmi_r02_client.date_utils import start_of_day, end_of_day
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.tracing import Tracer
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +71,40 @@ class DateTimeInUTC(types.TypeDecorator):
         return value.astimezone(timezone.utc)
 
 
+class EpochInUTC(types.TypeDecorator):
+    """
+    TypeDecorator for sqlalchemy that stores timezone aware datetimes as whole unix epoch seconds, and returns them as
+    datetimes in utc.
+
+    Integers are smaller than `DateTimeInUTC`'s text, compare as numbers and can be written and read with raw sql
+    without any conversion.
+    """
+
+    impl = types.Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: Any | None, _dialect: Dialect) -> int | None:
+        if value is None:
+            return None
+
+        if not isinstance(value, datetime):
+            raise ValueError(f"Trying to store {value} that's not a datetime")
+
+        if value.tzinfo is None:
+            raise ValueError(f"Trying to store {value} with no timezone")
+
+        return int(value.timestamp())
+
+    def process_result_value(self, value: Any | None, _dialect: Dialect) -> datetime | None:
+        if value is None:
+            return None
+
+        if not isinstance(value, int):
+            raise ValueError(f"Trying to convert {value} that's not an epoch to a datetime")
+
+        return datetime.fromtimestamp(value, timezone.utc)
+
+
 class Ring(Base):
     __tablename__ = "rings"
     __table_args__ = (UniqueConstraint("address"),)
@@ -65,12 +115,20 @@ class Ring(Base):
     syncs: Mapped[list["Sync"]] = relationship(back_populates="ring")
 
 
+_SYNC_SOURCE_INDEX = "ix_syncs_source"
+
+
 class Sync(Base):
     __tablename__ = "syncs"
+    __table_args__ = (Index(_SYNC_SOURCE_INDEX, "source", "source_sync_id", unique=True),)
     sync_id: Mapped[int] = mapped_column(primary_key=True)
     ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
-    timestamp = mapped_column(DateTimeInUTC(timezone=True), nullable=False)
+    timestamp = mapped_column(EpochInUTC(), nullable=False)
     comment: Mapped[str | None]
+    source: Mapped[str | None]
+    """For syncs merged from a changeset, the database they were made in"""
+    source_sync_id: Mapped[int | None]
+    """For syncs merged from a changeset, their sync_id in the source database"""
     ring: Mapped["Ring"] = relationship(back_populates="syncs")
     heart_rates: Mapped[list["HeartRate"]] = relationship(back_populates="sync")
     sport_details: Mapped[list["SportDetail"]] = relationship(back_populates="sync")
@@ -81,7 +139,7 @@ class HeartRate(Base):
     __table_args__ = (UniqueConstraint("ring_id", "timestamp"),)
     heart_rate_id: Mapped[int] = mapped_column(primary_key=True)
     reading: Mapped[int]
-    timestamp = mapped_column(DateTimeInUTC(timezone=True), nullable=False)
+    timestamp = mapped_column(EpochInUTC(), nullable=False)
     ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
     ring: Mapped["Ring"] = relationship(back_populates="heart_rates")
     sync_id = mapped_column(ForeignKey("syncs.sync_id"), nullable=False)
@@ -95,29 +153,125 @@ class SportDetail(Base):
     calories: Mapped[int]
     steps: Mapped[int]
     distance: Mapped[int]
-    timestamp = mapped_column(DateTimeInUTC(timezone=True), nullable=False)
+    timestamp = mapped_column(EpochInUTC(), nullable=False)
     ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
     ring: Mapped["Ring"] = relationship(back_populates="sport_details")
     sync_id = mapped_column(ForeignKey("syncs.sync_id"), nullable=False)
     sync: Mapped["Sync"] = relationship(back_populates="sport_details")
 
 
+class HeartRateHourly(Base):
+    """Heart rate readings summarized per hour, kept up to date by full_sync"""
+
+    __tablename__ = "heart_rate_hourly"
+    __table_args__ = (UniqueConstraint("ring_id", "hour"),)
+    heart_rate_hourly_id: Mapped[int] = mapped_column(primary_key=True)
+    hour = mapped_column(EpochInUTC(), nullable=False)
+    min_reading: Mapped[int]
+    max_reading: Mapped[int]
+    total_reading: Mapped[int]
+    readings: Mapped[int]
+    ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
+
+    @property
+    def avg_reading(self) -> float:
+        return self.total_reading / self.readings
+
+
+class SportDetailDaily(Base):
+    """Sport details summed per day, kept up to date by full_sync"""
+
+    __tablename__ = "sport_detail_daily"
+    __table_args__ = (UniqueConstraint("ring_id", "day"),)
+    sport_detail_daily_id: Mapped[int] = mapped_column(primary_key=True)
+    day = mapped_column(EpochInUTC(), nullable=False)
+    calories: Mapped[int]
+    steps: Mapped[int]
+    distance: Mapped[int]
+    ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
+
+
+class HeartRateDay(Base):
+    """
+    A whole day of heart rates for a ring in one row, see `colmi_r02_client.packed` for the format. Written instead of
+    `HeartRate` rows when syncing with the "days" heart rate storage.
+    """
+
+    __tablename__ = "heart_rate_days"
+    __table_args__ = (UniqueConstraint("ring_id", "day"),)
+    heart_rate_day_id: Mapped[int] = mapped_column(primary_key=True)
+    day = mapped_column(EpochInUTC(), nullable=False)
+    interval: Mapped[int]
+    """Seconds between slots"""
+    readings: Mapped[bytes]
+    mask: Mapped[bytes]
+    encoding: Mapped[int]
+    ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
+    sync_id = mapped_column(ForeignKey("syncs.sync_id"), nullable=False)
+
+
+class RealTimeBlock(Base):
+    """
+    A block of readings of one kind streamed from the ring by `colmi_r02_client.recorder`, see
+    `colmi_r02_client.packed.encode_series` for the format. Offsets are milliseconds from start.
+    """
+
+    __tablename__ = "real_time_blocks"
+    __table_args__ = (Index("ix_real_time_blocks_start", "ring_id", "kind", "start"),)
+    real_time_block_id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[int]
+    """A `colmi_r02_client.real_time.RealTimeReading`"""
+    start = mapped_column(EpochInUTC(), nullable=False)
+    """The second of the first reading"""
+    end = mapped_column(EpochInUTC(), nullable=False)
+    """The second of the last reading"""
+    count: Mapped[int]
+    readings: Mapped[bytes]
+    ring_id = mapped_column(ForeignKey("rings.ring_id"), nullable=False)
+
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection: Any, _connection_record: Any) -> None:
-    """Enable actual foreign key checks in sqlite on every connection to the database"""
+    """
+    Enable actual foreign key checks in sqlite on every connection to the database, and incremental vacuum for new
+    databases (existing ones get it from `vacuum_database`). Setting auto_vacuum writes to the file, so it is left
+    alone for existing databases, which can then be opened read only.
+    """
 
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    if cursor.execute("PRAGMA page_count").fetchone()[0] == 0:
+        cursor.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
     cursor.close()
 
 
-def get_db_session(path: Path | None = None) -> Session:
+SHARD_PREFIX = "ring_"
+SHARD_SUFFIX = ".sqlite"
+
+
+def shard_path(directory: Path, address: str) -> Path:
+    """The database file for one ring in a sharded layout, a directory holding a database per ring"""
+    return directory / f"{SHARD_PREFIX}{re.sub(r'[^0-9A-Za-z]', '', address).lower()}{SHARD_SUFFIX}"
+
+
+def get_db_session(path: Path | None = None, migrate: bool = True, address: str | None = None) -> Session:
     """
-    Return a live db session with all tables created.
+    Return a live db session with all tables created, and older databases migrated unless migrate is False.
+
+    If path is a directory it is treated as a sharded layout and the session is for the database of the ring with
+    address, see `colmi_r02_client.shards`.
 
     TODO: probably not default to in memory... that's just useful for testing
     """
 
+    if path is not None and path.is_dir():
+        if address is None:
+            raise ValueError(f"{path} is a directory of shards, an address is needed to pick one")
+        path = shard_path(path, address)
+
     url = "sqlite:///"
     if path is not None:
         url = url + str(path)
@@ -126,7 +280,108 @@ def get_db_session(path: Path | None = None) -> Session:
         url = url + ":memory:"
     engine = create_engine(url, echo=False)
     Base.metadata.create_all(engine)
-    return Session(engine)
+    session = Session(engine)
+    if migrate and schema_version(session) < SCHEMA_VERSION:
+        logger.info(f"Migrating {path} to schema version {SCHEMA_VERSION}")
+        migrate_schema(session)
+    return session
+
+
+SCHEMA_VERSION = 3
+"""
+Stored in sqlite's user_version.
+
+0. timestamps stored as text by `DateTimeInUTC`
+1. timestamps stored as integer epoch seconds by `EpochInUTC`
+2. syncs record which database and sync they were merged from, see `colmi_r02_client.changesets`
+3. rollups built for data synced before they existed, aggregate queries over whole hours and days read them
+"""
+
+_TIMESTAMP_COLUMNS = [
+    ("syncs", "timestamp"),
+    ("heart_rates", "timestamp"),
+    ("sport_details", "timestamp"),
+    ("heart_rate_hourly", "hour"),
+    ("sport_detail_daily", "day"),
+]
+
+
+def schema_version(session: Session) -> int:
+    return int(session.connection().exec_driver_sql("PRAGMA user_version").scalar_one())
+
+
+def _set_schema_version(session: Session, version: int) -> None:
+    session.connection().exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+    session.commit()
+
+
+def migrate_schema(session: Session) -> None:
+    """Bring a database from any older schema version up to SCHEMA_VERSION, new databases just get the version set"""
+    version = schema_version(session)
+    if needs_epoch_migration(session):
+        logger.info("Converting timestamps to integer epochs, this can take a while")
+        migrate_to_epoch(session)
+    _add_sync_source(session)
+    if version < 3:
+        logger.info("Building rollups for data synced before they existed")
+        rebuild_rollups(session)
+    _set_schema_version(session, SCHEMA_VERSION)
+
+
+def _add_sync_source(session: Session) -> None:
+    connection = session.connection()
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(syncs)")}
+    if "source" not in columns:
+        connection.exec_driver_sql("ALTER TABLE syncs ADD COLUMN source VARCHAR")
+    if "source_sync_id" not in columns:
+        connection.exec_driver_sql("ALTER TABLE syncs ADD COLUMN source_sync_id INTEGER")
+    connection.exec_driver_sql(f"CREATE UNIQUE INDEX IF NOT EXISTS {_SYNC_SOURCE_INDEX} ON syncs (source, source_sync_id)")
+    session.commit()
+
+
+def needs_epoch_migration(session: Session) -> bool:
+    """True if any timestamps are still stored as text"""
+    connection = session.connection()
+    return any(
+        connection.exec_driver_sql(f"SELECT 1 FROM {table} WHERE typeof({column}) = 'text' LIMIT 1").first() is not None
+        for table, column in _TIMESTAMP_COLUMNS
+    )
+
+
+def migrate_to_epoch(session: Session, vacuum: bool = True) -> int:
+    """
+    Convert timestamps stored as text by older versions to integer epoch seconds, in place and in one transaction.
+
+    The columns keep their declared DATETIME type in old databases, which doesn't matter to sqlite: integers are stored
+    as integers whatever the column says. Returns the number of values converted.
+    """
+    converted = 0
+    connection = session.connection()
+    for table, column in _TIMESTAMP_COLUMNS:
+        result = connection.exec_driver_sql(
+            f"UPDATE {table} SET {column} = CAST(strftime('%s', {column}) AS INTEGER) WHERE typeof({column}) = 'text'"
+        )
+        converted += result.rowcount
+    session.commit()
+    if vacuum:
+        # integers take less space than the text they replaced, give it back
+        vacuum_database(session)
+    logger.info(f"Converted {converted} timestamps to epoch seconds")
+    return converted
+
+
+def vacuum_database(session: Session) -> None:
+    """
+    Rebuild the database file without any free pages, outside of the session's transaction. Also turns on incremental
+    vacuum for databases created before it was the default.
+    """
+    session.commit()
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    with engine.connect() as c:
+        c = c.execution_options(isolation_level="AUTOCOMMIT")
+        c.exec_driver_sql(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+        c.exec_driver_sql("VACUUM")
 
 
 def create_or_find_ring(session: Session, address: str) -> Ring:
@@ -140,85 +395,646 @@ def create_or_find_ring(session: Session, address: str) -> Ring:
     return ring
 
 
-def full_sync(session: Session, data: FullData) -> None:
+HEART_RATE_ROWS = "rows"
+HEART_RATE_DAYS = "days"
+HEART_RATE_STORAGE = (HEART_RATE_ROWS, HEART_RATE_DAYS)
+
+
+def full_sync(
+    session: Session,
+    data: FullData | ColumnarFullData,
+    metrics: Metrics | None = None,
+    tracer: Tracer | None = None,
+    timestamp: datetime | None = None,
+    comment: str | None = None,
+    heart_rate_storage: str = HEART_RATE_ROWS,
+    commit: bool = True,
+) -> int:
     """
+    Write data to the database, recording it as a sync at timestamp (now by default). Returns the number of rows
+    written.
+
+    Heart rates are stored as a row per reading, or with HEART_RATE_DAYS as a packed row per day. Queries read both and
+    a reading is only ever stored one way, so the storage can be picked per sync.
+
+    With commit False the caller commits, to write several syncs in one transaction, see
+    `colmi_r02_client.writer.DatabaseWriter`.
+
     TODO:
         - grab battery
     """
 
-    ring = create_or_find_ring(session, data.address)
-    sync = Sync(ring=ring, timestamp=datetime.now(tz=timezone.utc))
-    session.add(sync)
+    assert heart_rate_storage in HEART_RATE_STORAGE, f"heart_rate_storage must be one of {HEART_RATE_STORAGE}"
+    if tracer is None:
+        tracer = Tracer()
 
-    _add_heart_rate(sync, ring, data, session)
-    _add_sport_details(sync, ring, data, session)
-    session.commit()
+    start = time.perf_counter()
+    with tracer.span("full_sync", address=data.address):
+        if isinstance(data, FullData):
+            with tracer.span("to_columns"):
+                data = ColumnarFullData.from_full_data(data)
+
+        with tracer.span("create_sync"):
+            ring = create_or_find_ring(session, data.address)
+            sync = Sync(
+                ring=ring,
+                timestamp=timestamp if timestamp is not None else datetime.now(tz=timezone.utc),
+                comment=comment,
+            )
+            session.add(sync)
+            session.flush()
+
+        with tracer.span("add_heart_rates", days=len(data.heart_rate_days)):
+            if heart_rate_storage == HEART_RATE_DAYS:
+                heart_rate_rows = _add_heart_rate_days(sync, ring, data, session)
+            else:
+                heart_rate_rows = _add_heart_rate(sync, ring, data, session)
+        with tracer.span("add_sport_details", days=len(data.sport_detail_days)):
+            sport_detail_rows = _add_sport_details(sync, ring, data, session)
+        with tracer.span("update_rollups"):
+            _update_rollups(session, ring, data)
+        if commit:
+            with tracer.span("commit"):
+                session.commit()
 
+    if metrics is not None and metrics.enabled:
+        elapsed = time.perf_counter() - start
+        heart_rate_table = HeartRateDay.__tablename__ if heart_rate_storage == HEART_RATE_DAYS else HeartRate.__tablename__
+        metrics.inc("db_rows_written_total", heart_rate_rows, table=heart_rate_table)
+        metrics.inc("db_rows_written_total", sport_detail_rows, table=SportDetail.__tablename__)
+        metrics.observe("db_sync_seconds", elapsed)
+        metrics.set("db_rows_per_second", (heart_rate_rows + sport_detail_rows) / elapsed)
+
+    return heart_rate_rows + sport_detail_rows
 
-def _add_heart_rate(sync: Sync, ring: Ring, data: FullData, session: Session) -> None:
-    logger.info(f"Adding {len(data.heart_rates)} days of heart rates")
-    for log in data.heart_rates:
-        if isinstance(log, hr.NoData):
-            logger.info("No heart rate data for date")
-            continue
 
-        existing = {}
-        for heart_rate in session.scalars(
-            select(HeartRate)
-            .where(HeartRate.timestamp >= start_of_day(log.timestamp))
-            .where(HeartRate.timestamp <= end_of_day(log.timestamp))
-        ):
-            existing[heart_rate.timestamp] = heart_rate.reading
+def _executemany(session: Session, sql: str, rows: Iterable[tuple[Any, ...]]) -> int:
+    """Run sql for every row on the session's connection, without building intermediate objects for each row"""
+    cursor = session.connection().connection.cursor()
+    try:
+        # sqlite3 accepts any iterable of rows, not just sequences
+        cursor.executemany(sql, rows)  # type: ignore[arg-type]
+        return int(cursor.rowcount)
+    finally:
+        cursor.close()
 
-        for reading, timestamp in log.heart_rates_with_times():
-            if reading == 0:
-                continue
 
-            if x := existing.get(timestamp):
+def _epoch_column(column: Any) -> Any:
+    """The stored epoch seconds, without converting them to datetimes"""
+    return type_coerce(column, Integer)
+
+
+def _add_heart_rate(sync: Sync, ring: Ring, data: ColumnarFullData, session: Session) -> int:
+    """Returns the number of rows written"""
+    logger.info(f"Adding {len(data.heart_rate_days)} days of heart rates")
+    if len(data.heart_rate_log_timestamps) == 0:
+        return 0
+
+    start = datetime.fromtimestamp(min(data.heart_rate_log_timestamps), timezone.utc)
+    end = datetime.fromtimestamp(max(data.heart_rate_log_timestamps), timezone.utc)
+    # readings already in packed days count as stored, so they aren't stored twice
+    existing = packed_heart_rates(
+        session, ring.ring_id, int(start_of_day(start).timestamp()), int(end_of_day(end).timestamp())
+    )
+    for epoch, reading in session.execute(
+        select(_epoch_column(HeartRate.timestamp), HeartRate.reading)
+        .where(HeartRate.ring_id == ring.ring_id)
+        .where(HeartRate.timestamp >= start_of_day(start))
+        .where(HeartRate.timestamp <= end_of_day(end))
+    ):
+        existing[epoch] = reading
+
+    def new_rows() -> Iterator[tuple[int, int, int, int]]:
+        for epoch, reading in data.heart_rate_rows():
+            if x := existing.get(epoch):
                 if x != reading:
+                    timestamp = datetime.fromtimestamp(epoch, timezone.utc)
                     logger.warning(f"Inconsistent data detected! {timestamp} is {x} in db but got {reading} from ring")
             else:
-                h = HeartRate(reading=reading, timestamp=timestamp, ring=ring, sync=sync)
-                session.add(h)
-
-
-def _add_sport_details(sync: Sync, ring: Ring, data: FullData, session: Session) -> None:
-    logger.info(f"Adding {len(data.sport_details)} days of sport details")
-    sport_detail_logs: list[steps.SportDetail] = []
-    for slog in data.sport_details:
-        if isinstance(slog, steps.NoData):
-            logger.info("No step data for date")
-        else:
-            sport_detail_logs.extend(slog)
-    if len(sport_detail_logs) == 0:
-        return
-    start = min([sport_detail.timestamp for sport_detail in sport_detail_logs])
-    end = max([sport_detail.timestamp for sport_detail in sport_detail_logs])
-
-    existing_sport_logs = {}
-    for sport_detail_record in session.scalars(
-        select(SportDetail)
-        .where(SportDetail.timestamp >= start_of_day(start))
-        .where(SportDetail.timestamp <= end_of_day(end))
+                yield reading, epoch, ring.ring_id, sync.sync_id
+
+    return _executemany(
+        session,
+        "INSERT INTO heart_rates (reading, timestamp, ring_id, sync_id) VALUES (?, ?, ?, ?)",
+        new_rows(),
+    )
+
+
+def _add_heart_rate_days(sync: Sync, ring: Ring, data: ColumnarFullData, session: Session) -> int:
+    """Write a packed row per day, merging with what's already stored for that day. Returns the number of rows written"""
+    logger.info(f"Adding {len(data.heart_rate_days)} days of heart rates as packed days")
+
+    days = []
+    offset = 0
+    for log_range, length in zip(data.heart_rate_log_ranges, data.heart_rate_log_lengths, strict=True):
+        stored = min(length, hr.MINUTES_PER_DAY // log_range)
+        if stored == 0:
+            continue
+        days.append((data.heart_rate_timestamps[offset], log_range * 60, data.heart_rate_values[offset : offset + stored]))
+        offset += stored
+    return write_heart_rate_days(session, ring.ring_id, sync.sync_id, days)
+
+
+def write_heart_rate_days(
+    session: Session, ring_id: int, sync_id: int, days: Sequence[tuple[int, int, "array[int]"]]
+) -> int:
+    """
+    Write (day start, interval, readings) as packed days, merging with what's already stored for each day. Readings
+    stored as rows for the same slots are moved into the days, so every reading is stored once whichever storage each
+    sync used. Returns the number of rows written.
+    """
+    if not days:
+        return 0
+
+    first, last = min(d[0] for d in days), max(d[0] for d in days)
+    existing = {
+        day: (interval, packed.decode(blob, mask, encoding))
+        for rows in _iter_chunks(
+            session,
+            "SELECT day, interval, readings, mask, encoding FROM heart_rate_days "
+            "WHERE ring_id = ? AND day >= ? AND day <= ?",
+            (ring_id, first, last),
+            QUERY_CHUNK_SIZE,
+        )
+        for day, interval, blob, mask, encoding in rows
+    }
+    stored_rows: dict[int, int] = {}
+    for rows in _iter_chunks(
+        session,
+        "SELECT timestamp, reading FROM heart_rates WHERE ring_id = ? AND timestamp >= ? AND timestamp < ?",
+        (ring_id, first, last + 86400),
+        QUERY_CHUNK_SIZE,
     ):
-        existing_sport_logs[sport_detail_record.timestamp] = sport_detail_record
-
-    for sport_detail in sport_detail_logs:
-        if x := existing_sport_logs.get(sport_detail.timestamp):
-            x.calories = sport_detail.calories
-            x.steps = sport_detail.steps
-            x.distance = sport_detail.distance
-            session.add(x)
-        else:
-            s = SportDetail(
-                calories=sport_detail.calories,
-                steps=sport_detail.steps,
-                distance=sport_detail.distance,
-                timestamp=sport_detail.timestamp,
-                ring=ring,
-                sync=sync,
+        stored_rows.update(rows)
+    moved: list[tuple[int, int]] = []
+
+    def new_rows() -> Iterator[tuple[int, int, bytes, bytes, int, int, int]]:
+        for day, interval, readings in days:
+            if day in existing:
+                readings = _merge_day(day, interval, readings, *existing[day])
+            if stored_rows:
+                slots = range(day, day + 86400, interval)
+                from_rows = array("B", (stored_rows.get(timestamp, 0) for timestamp in slots))
+                if any(from_rows):
+                    readings = _merge_day(day, interval, readings, interval, from_rows)
+                    moved.extend((ring_id, timestamp) for timestamp in slots if timestamp in stored_rows)
+            yield (day, interval, *packed.encode(readings), ring_id, sync_id)
+
+    written = _executemany(
+        session,
+        "INSERT INTO heart_rate_days (day, interval, readings, mask, encoding, ring_id, sync_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (ring_id, day) DO UPDATE SET interval = excluded.interval, readings = excluded.readings, "
+        "mask = excluded.mask, encoding = excluded.encoding, sync_id = excluded.sync_id",
+        new_rows(),
+    )
+    if moved:
+        logger.info(f"Moved {len(moved)} heart rates stored as rows into packed days")
+        _executemany(session, "DELETE FROM heart_rates WHERE ring_id = ? AND timestamp = ?", moved)
+    return written
+
+
+def _merge_day(
+    day: int, interval: int, readings: "array[int]", old_interval: int, old_readings: "array[int]"
+) -> "array[int]":
+    """Stored readings win like they do for rows, new readings fill in the slots that were empty"""
+    if interval != old_interval:
+        logger.warning(f"Heart rate interval changed from {old_interval}s to {interval}s, replacing the stored day")
+        return readings
+    merged = array("B", old_readings)
+    merged.extend(bytes(max(0, len(readings) - len(merged))))
+    for i, reading in enumerate(readings):
+        if not reading:
+            continue
+        if not merged[i]:
+            merged[i] = reading
+        elif merged[i] != reading:
+            timestamp = datetime.fromtimestamp(day + i * interval, timezone.utc)
+            logger.warning(f"Inconsistent data detected! {timestamp} is {merged[i]} in db but got {reading} from ring")
+    return merged
+
+
+def _add_sport_details(sync: Sync, ring: Ring, data: ColumnarFullData, session: Session) -> int:
+    """Returns the number of rows written"""
+    logger.info(f"Adding {len(data.sport_detail_days)} days of sport details")
+    if len(data.sport_detail_timestamps) == 0:
+        return 0
+
+    # the ring keeps updating the current interval, so the latest values win, and the sync that wrote them is recorded
+    return _executemany(
+        session,
+        "INSERT INTO sport_details (timestamp, calories, steps, distance, ring_id, sync_id) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (ring_id, timestamp) DO UPDATE SET calories = excluded.calories, steps = excluded.steps, "
+        "distance = excluded.distance, sync_id = excluded.sync_id",
+        ((*row, ring.ring_id, sync.sync_id) for row in data.sport_detail_rows()),
+    )
+
+
+def _rollup_heart_rates(session: Session, ring_id: int, start: int | None = None, end: int | None = None) -> None:
+    """Recompute the hourly heart rate rollups for ring_id for the hours from start to end (epoch seconds)"""
+    start, end = _whole_buckets(start, end, 3600)
+    _executemany(
+        session,
+        "INSERT INTO heart_rate_hourly (ring_id, hour, min_reading, max_reading, total_reading, readings) "
+        "SELECT ring_id, timestamp / 3600 * 3600 AS hour, min(reading), max(reading), sum(reading), count(*) "
+        "FROM heart_rates WHERE ring_id = ? AND timestamp >= ? AND timestamp < ? GROUP BY hour "
+        "ON CONFLICT (ring_id, hour) DO UPDATE SET min_reading = excluded.min_reading, "
+        "max_reading = excluded.max_reading, total_reading = excluded.total_reading, readings = excluded.readings",
+        [(ring_id, start, end)],
+    )
+    if _has_heart_rate_days(session, ring_id, start, end):
+        # sqlite can't read packed days, so hours with them are summarized here from every reading
+        _executemany(
+            session,
+            "INSERT INTO heart_rate_hourly (ring_id, hour, min_reading, max_reading, total_reading, readings) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (ring_id, hour) DO UPDATE SET min_reading = excluded.min_reading, "
+            "max_reading = excluded.max_reading, total_reading = excluded.total_reading, readings = excluded.readings",
+            (
+                (ring_id, *bucket)
+                for bucket in _heart_rate_buckets(_iter_heart_rates(session, ring_id, start, end, QUERY_CHUNK_SIZE), 3600)
+            ),
+        )
+
+
+def _rollup_sport_details(session: Session, ring_id: int, start: int | None = None, end: int | None = None) -> None:
+    """Recompute the daily sport detail rollups for ring_id for the days from start to end (epoch seconds)"""
+    _executemany(
+        session,
+        "INSERT INTO sport_detail_daily (ring_id, day, calories, steps, distance) "
+        "SELECT ring_id, timestamp / 86400 * 86400 AS day, sum(calories), sum(steps), sum(distance) "
+        "FROM sport_details WHERE ring_id = ? AND timestamp >= ? AND timestamp < ? GROUP BY day "
+        "ON CONFLICT (ring_id, day) DO UPDATE SET calories = excluded.calories, steps = excluded.steps, "
+        "distance = excluded.distance",
+        [(ring_id, *_whole_buckets(start, end, 86400))],
+    )
+
+
+def _whole_buckets(start: int | None, end: int | None, bucket: int) -> tuple[int, int]:
+    """Start of the bucket containing start to the end of the bucket containing end, everything if they are None"""
+    return (
+        start // bucket * bucket if start is not None else -(2**62),
+        (end // bucket + 1) * bucket if end is not None else 2**62,
+    )
+
+
+def _update_rollups(session: Session, ring: Ring, data: ColumnarFullData) -> None:
+    """Recompute the rollup buckets covered by data, buckets are whole so every row in them is read again"""
+    if len(data.heart_rate_timestamps):
+        _rollup_heart_rates(session, ring.ring_id, min(data.heart_rate_timestamps), max(data.heart_rate_timestamps))
+    if len(data.sport_detail_timestamps):
+        _rollup_sport_details(session, ring.ring_id, min(data.sport_detail_timestamps), max(data.sport_detail_timestamps))
+
+
+def refresh_rollups(session: Session, ring_id: int, start: int | None = None, end: int | None = None) -> None:
+    """Recompute the rollups of ring_id from the raw readings between start and end (epoch seconds, None for all)"""
+    _rollup_heart_rates(session, ring_id, start, end)
+    _rollup_sport_details(session, ring_id, start, end)
+    session.commit()
+
+
+def rebuild_rollups(session: Session, address: str | None = None) -> None:
+    """
+    Recompute all the rollups from scratch for one ring, or all of them, e.g. after importing data another way.
+
+    Rollups from before the oldest raw reading are kept, they are all that's left once raw data has been pruned by
+    `colmi_r02_client.retention`.
+    """
+    rings = session.scalars(select(Ring) if address is None else select(Ring).where(Ring.address == address)).all()
+    connection = session.connection()
+    for ring in rings:
+        oldest_heart_rate = connection.exec_driver_sql(
+            "SELECT min(oldest) FROM (SELECT min(timestamp) AS oldest FROM heart_rates WHERE ring_id = ? "
+            "UNION ALL SELECT min(day) FROM heart_rate_days WHERE ring_id = ?)",
+            (ring.ring_id, ring.ring_id),
+        ).scalar_one()
+        oldest_sport_detail = connection.exec_driver_sql(
+            "SELECT min(timestamp) FROM sport_details WHERE ring_id = ?", (ring.ring_id,)
+        ).scalar_one()
+        if oldest_heart_rate is not None:
+            connection.exec_driver_sql(
+                "DELETE FROM heart_rate_hourly WHERE ring_id = ? AND hour >= ?",
+                (ring.ring_id, oldest_heart_rate // 3600 * 3600),
             )
-            session.add(s)
+        if oldest_sport_detail is not None:
+            connection.exec_driver_sql(
+                "DELETE FROM sport_detail_daily WHERE ring_id = ? AND day >= ?",
+                (ring.ring_id, oldest_sport_detail // 86400 * 86400),
+            )
+        _rollup_heart_rates(session, ring.ring_id)
+        _rollup_sport_details(session, ring.ring_id)
+    session.commit()
+
+
+def get_hourly_heart_rates(session: Session, address: str, start: datetime, end: datetime) -> list[HeartRateHourly]:
+    """Hourly heart rate summaries for the hours starting between start and end"""
+    return list(
+        session.scalars(
+            select(HeartRateHourly)
+            .join(Ring, Ring.ring_id == HeartRateHourly.ring_id)
+            .where(Ring.address == address)
+            .where(HeartRateHourly.hour >= start)
+            .where(HeartRateHourly.hour <= end)
+            .order_by(HeartRateHourly.hour)
+        )
+    )
+
+
+def get_daily_sport_details(session: Session, address: str, start: datetime, end: datetime) -> list[SportDetailDaily]:
+    """Daily step, calorie and distance totals for the days starting between start and end"""
+    return list(
+        session.scalars(
+            select(SportDetailDaily)
+            .join(Ring, Ring.ring_id == SportDetailDaily.ring_id)
+            .where(Ring.address == address)
+            .where(SportDetailDaily.day >= start)
+            .where(SportDetailDaily.day <= end)
+            .order_by(SportDetailDaily.day)
+        )
+    )
+
+
+QUERY_CHUNK_SIZE = 50_000
+"""Rows fetched from the cursor at a time by the column queries"""
+
+
+def _ring_id(session: Session, address: str) -> int | None:
+    return session.scalars(select(Ring.ring_id).where(Ring.address == address)).one_or_none()
+
+
+def _iter_chunks(session: Session, sql: str, params: tuple[Any, ...], chunk_size: int) -> Iterator[Sequence[Any]]:
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield rows
+    finally:
+        cursor.close()
+
+
+def _range_params(session: Session, address: str, start: datetime, end: datetime) -> tuple[int, int, int] | None:
+    """Ring id and start and end as they are stored"""
+    if start.tzinfo is None or end.tzinfo is None:
+        raise ValueError("start and end must have a timezone")
+    ring_id = _ring_id(session, address)
+    if ring_id is None:
+        return None
+    return ring_id, int(start.timestamp()), int(end.timestamp())
+
+
+def _has_heart_rate_days(session: Session, ring_id: int, start: int, end: int) -> bool:
+    """True if any packed days overlap start to end"""
+    sql = "SELECT 1 FROM heart_rate_days WHERE ring_id = ? AND day > ? AND day < ? LIMIT 1"
+    return session.connection().exec_driver_sql(sql, (ring_id, start - 86400, end)).first() is not None
+
+
+def packed_heart_rates(session: Session, ring_id: int, start: int, end: int) -> dict[int, int]:
+    """Readings stored in packed days from start up to and including end (epoch seconds), by timestamp"""
+    days = _heart_rate_day_columns(session, ring_id, start, end + 1)
+    return dict(zip(days.timestamps, days.readings, strict=True))
+
+
+def _heart_rate_day_columns(session: Session, ring_id: int, start: int, end: int) -> HeartRateColumns:
+    """Readings from packed days from start up to but not including end"""
+    result = HeartRateColumns()
+    sql = (
+        "SELECT day, interval, readings, mask, encoding FROM heart_rate_days "
+        "WHERE ring_id = ? AND day > ? AND day < ? ORDER BY day"
+    )
+    for rows in _iter_chunks(session, sql, (ring_id, start - 86400, end), QUERY_CHUNK_SIZE):
+        for day, interval, blob, mask, encoding in rows:
+            timestamps, readings = packed.to_columns(day, interval, blob, mask, encoding, start, end)
+            result.timestamps.extend(timestamps)
+            result.readings.extend(readings)
+    return result
+
+
+def _iter_heart_rates(session: Session, ring_id: int, start: int, end: int, chunk_size: int) -> Iterator[HeartRateColumns]:
+    """Heart rates from both row and packed day storage, merged in timestamp order"""
+    days = _heart_rate_day_columns(session, ring_id, start, end)
+    sql = (
+        "SELECT timestamp, reading FROM heart_rates "
+        "WHERE ring_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+    )
+    rows = _iter_chunks(session, sql, (ring_id, start, end), chunk_size)
+    if not len(days):
+        for chunk in rows:
+            columns = HeartRateColumns()
+            columns.add_rows(chunk)
+            yield columns
+        return
+
+    merged = heapq.merge((row for chunk in rows for row in chunk), zip(days.timestamps, days.readings, strict=True))
+    while chunk := list(islice(merged, chunk_size)):
+        columns = HeartRateColumns()
+        columns.add_rows(chunk)
+        yield columns
+
+
+def _heart_rate_buckets(chunks: Iterable[HeartRateColumns], bucket_seconds: int) -> Iterator[tuple[int, int, int, int, int]]:
+    """(start, min, max, total, count) for each bucket with readings, from heart rates in timestamp order"""
+    current = None
+    low = high = total = count = 0
+    for chunk in chunks:
+        for timestamp, reading in zip(chunk.timestamps, chunk.readings, strict=True):
+            bucket = timestamp // bucket_seconds * bucket_seconds
+            if bucket != current:
+                if current is not None:
+                    yield current, low, high, total, count
+                current, low, high, total, count = bucket, reading, reading, 0, 0
+            low = min(low, reading)
+            high = max(high, reading)
+            total += reading
+            count += 1
+    if current is not None:
+        yield current, low, high, total, count
+
+
+def iter_heart_rate_columns(
+    session: Session, address: str, start: datetime, end: datetime, chunk_size: int = QUERY_CHUNK_SIZE
+) -> Iterator[HeartRateColumns]:
+    """
+    Heart rates from start up to but not including end, at most chunk_size at a time, oldest first. Readings stored as
+    rows and as packed days are both included.
+    """
+    params = _range_params(session, address, start, end)
+    if params is None:
+        return
+    yield from _iter_heart_rates(session, *params, chunk_size)
+
+
+def get_heart_rate_columns(session: Session, address: str, start: datetime, end: datetime) -> HeartRateColumns:
+    """Heart rates from start up to but not including end as arrays of epoch seconds and readings"""
+    result = HeartRateColumns()
+    for chunk in iter_heart_rate_columns(session, address, start, end):
+        result.extend(chunk)
+    return result
+
+
+def iter_sport_detail_columns(
+    session: Session, address: str, start: datetime, end: datetime, chunk_size: int = QUERY_CHUNK_SIZE
+) -> Iterator[SportDetailColumns]:
+    """Sport details from start up to but not including end, at most chunk_size at a time, oldest first"""
+    params = _range_params(session, address, start, end)
+    if params is None:
+        return
+    sql = (
+        "SELECT timestamp, calories, steps, distance FROM sport_details "
+        "WHERE ring_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+    )
+    for rows in _iter_chunks(session, sql, params, chunk_size):
+        columns = SportDetailColumns()
+        columns.add_rows(rows)
+        yield columns
+
+
+def add_real_time_block(
+    session: Session,
+    address: str,
+    kind: int,
+    timestamps: Sequence[int],
+    readings: Sequence[int],
+    commit: bool = True,
+) -> int:
+    """Store readings of kind taken at timestamps (epoch milliseconds, oldest first) as one block, returns the count"""
+    assert timestamps, "a block needs at least one reading"
+    ring = create_or_find_ring(session, address)
+    start = timestamps[0] // 1000
+    session.connection().exec_driver_sql(
+        "INSERT INTO real_time_blocks (kind, start, end, count, readings, ring_id) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            kind,
+            start,
+            timestamps[-1] // 1000,
+            len(timestamps),
+            packed.encode_series([t - start * 1000 for t in timestamps], readings),
+            ring.ring_id,
+        ),
+    )
+    if commit:
+        session.commit()
+    return len(timestamps)
+
+
+def iter_real_time_columns(
+    session: Session, address: str, kind: int, start: datetime, end: datetime, chunk_size: int = QUERY_CHUNK_SIZE
+) -> Iterator[RealTimeColumns]:
+    """Real time readings of kind from start up to but not including end, a chunk of blocks at a time, oldest first"""
+    params = _range_params(session, address, start, end)
+    if params is None:
+        return
+    ring_id, start_s, end_s = params
+    start_ms, end_ms = int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+    sql = (
+        "SELECT start, count, readings FROM real_time_blocks "
+        "WHERE ring_id = ? AND kind = ? AND start < ? AND end >= ? ORDER BY start"
+    )
+    for rows in _iter_chunks(session, sql, (ring_id, kind, end_s + 1, start_s), chunk_size):
+        columns = RealTimeColumns()
+        for block_start, count, blob in rows:
+            offsets, readings = packed.decode_series(blob, count)
+            for offset, reading in zip(offsets, readings, strict=True):
+                timestamp = block_start * 1000 + offset
+                if start_ms <= timestamp < end_ms:
+                    columns.timestamps.append(timestamp)
+                    columns.readings.append(reading)
+        yield columns
+
+
+def get_real_time_columns(session: Session, address: str, kind: int, start: datetime, end: datetime) -> RealTimeColumns:
+    result = RealTimeColumns()
+    for chunk in iter_real_time_columns(session, address, kind, start, end):
+        result.extend(chunk)
+    return result
+
+
+def get_sport_detail_columns(session: Session, address: str, start: datetime, end: datetime) -> SportDetailColumns:
+    """Sport details from start up to but not including end as arrays of epoch seconds, calories, steps and distance"""
+    result = SportDetailColumns()
+    for chunk in iter_sport_detail_columns(session, address, start, end):
+        result.extend(chunk)
+    return result
+
+
+def aggregate_heart_rates(
+    session: Session, address: str, start: datetime, end: datetime, bucket_seconds: int = 3600
+) -> HeartRateBuckets:
+    """
+    Min, max, average and count of heart rates from start up to but not including end, in buckets of bucket_seconds
+    aligned to the unix epoch. The aggregation happens in sqlite, so only one row per bucket is returned, unless there
+    are packed days in the range which have to be decoded here.
+
+    Whole hour buckets over whole hours are built from the heart_rate_hourly rollup instead of every reading. Databases
+    synced before the rollups existed get them built when they are migrated to schema version 3.
+    """
+    assert bucket_seconds > 0, "bucket_seconds must be positive"
+    result = HeartRateBuckets()
+    params = _range_params(session, address, start, end)
+    if params is None:
+        return result
+    if _aligned(bucket_seconds, start, end, 3600):
+        sql = (
+            "SELECT hour / ? * ? AS bucket, min(min_reading), max(max_reading), "
+            "CAST(sum(total_reading) AS REAL) / sum(readings), sum(readings) FROM heart_rate_hourly "
+            "WHERE ring_id = ? AND hour >= ? AND hour < ? GROUP BY bucket ORDER BY bucket"
+        )
+    elif _has_heart_rate_days(session, *params):
+        result.add_rows(
+            [
+                (bucket, low, high, total / count, count)
+                for bucket, low, high, total, count in _heart_rate_buckets(
+                    _iter_heart_rates(session, *params, QUERY_CHUNK_SIZE), bucket_seconds
+                )
+            ]
+        )
+        return result
+    else:
+        sql = (
+            "SELECT timestamp / ? * ? AS bucket, min(reading), max(reading), avg(reading), count(*) "
+            "FROM heart_rates WHERE ring_id = ? AND timestamp >= ? AND timestamp < ? GROUP BY bucket ORDER BY bucket"
+        )
+    for rows in _iter_chunks(session, sql, (bucket_seconds, bucket_seconds, *params), QUERY_CHUNK_SIZE):
+        result.add_rows(rows)
+    return result
+
+
+def _aligned(bucket_seconds: int, start: datetime, end: datetime, rollup_seconds: int) -> bool:
+    """True if buckets and the range are made of whole rollup buckets, so the rollup table can answer the query"""
+    return (
+        bucket_seconds % rollup_seconds == 0
+        and int(start.timestamp()) % rollup_seconds == 0
+        and int(end.timestamp()) % rollup_seconds == 0
+    )
+
+
+def aggregate_sport_details(
+    session: Session, address: str, start: datetime, end: datetime, bucket_seconds: int = 86400
+) -> SportDetailBuckets:
+    """
+    Total calories, steps and distance from start up to but not including end, in buckets of bucket_seconds aligned to
+    the unix epoch (so daily buckets are UTC days). The aggregation happens in sqlite.
+
+    Whole day buckets over whole days are built from the sport_detail_daily rollup, see `aggregate_heart_rates`.
+    """
+    assert bucket_seconds > 0, "bucket_seconds must be positive"
+    result = SportDetailBuckets()
+    params = _range_params(session, address, start, end)
+    if params is None:
+        return result
+    if _aligned(bucket_seconds, start, end, 86400):
+        sql = (
+            "SELECT day / ? * ? AS bucket, sum(calories), sum(steps), sum(distance) "
+            "FROM sport_detail_daily WHERE ring_id = ? AND day >= ? AND day < ? GROUP BY bucket ORDER BY bucket"
+        )
+    else:
+        sql = (
+            "SELECT timestamp / ? * ? AS bucket, sum(calories), sum(steps), sum(distance) FROM sport_details "
+            "WHERE ring_id = ? AND timestamp >= ? AND timestamp < ? GROUP BY bucket ORDER BY bucket"
+        )
+    for rows in _iter_chunks(session, sql, (bucket_seconds, bucket_seconds, *params), QUERY_CHUNK_SIZE):
+        result.add_rows(rows)
+    return result
 
 
 def get_last_sync(session: Session, ring_address: str) -> datetime | None:
@@ -0,0 +1,187 @@
+"""
+Turn a stream of bytes from the ring into complete messages.
+
+The same decoder is used for live connections (`colmi_r02_client.client.Client` feeds it one notification at a time),
+capture files written with `--record` and anything else that produces bytes, like a socket. Bytes can arrive in chunks
+of any size, they are framed into 16 byte packets and each packet is passed to the parser for its command. Only
+complete messages (a whole heart rate log, a whole day of steps, a real time reading...) come out the other end.
+
+Packets are handed to the parsers as memoryviews over the chunk that was fed in, so chunks must not be modified after
+they are passed to the decoder.
+"""
+
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+from dataclasses import dataclass
+import logging
+from pathlib import Path
+import struct
+from typing import Any
+
+from colmi_r02_client import battery, hr, hr_settings, real_time, set_time, steps
+from colmi_r02_client.packet import Packet
+
+PACKET_SIZE = 16
+
+CAPTURE_SEPARATOR = b"\n"
+"""Capture files written by the client have a newline after every packet"""
+
+CAPTURE_TIMES_SUFFIX = ".times"
+"""
+The client also writes when each packet arrived next to the capture, as little endian doubles of unix time, in a file
+named like the capture with this appended.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def empty_parse(_packet: Packet) -> None:
+    """Used for commands that we expect a response, but there's nothing in the response"""
+    return None
+
+
+def new_command_handlers() -> dict[int, Callable[[Packet], Any]]:
+    """
+    Parsers for every command we expect a response for.
+
+    Multi packet messages are parsed by stateful parsers, so every call returns new parser instances.
+    """
+    return {
+        battery.CMD_BATTERY: battery.parse_battery,
+        real_time.CMD_START_REAL_TIME: real_time.parse_real_time_reading,
+        real_time.CMD_STOP_REAL_TIME: empty_parse,
+        steps.CMD_GET_STEP_SOMEDAY: steps.SportDetailParser().parse,
+        hr.CMD_READ_HEART_RATE: hr.HeartRateLogParser().parse,
+        set_time.CMD_SET_TIME: empty_parse,
+        hr_settings.CMD_HEART_RATE_LOG_SETTINGS: hr_settings.parse_heart_rate_log_settings,
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class Message:
+    command: int
+    value: Any
+
+
+class PacketDecoder:
+    """
+    Push bytes in with `feed`, get complete messages out.
+
+    separator is skipped after every packet, use `CAPTURE_SEPARATOR` for capture files.
+    """
+
+    def __init__(
+        self,
+        handlers: dict[int, Callable[[Packet], Any]] | None = None,
+        separator: bytes = b"",
+    ):
+        self.handlers = handlers if handlers is not None else new_command_handlers()
+        self.separator = separator
+        self._stride = PACKET_SIZE + len(separator)
+        self._partial = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Number of bytes received that aren't part of a complete packet yet"""
+        return len(self._partial)
+
+    def decode_packet(self, packet: Packet) -> Message | None:
+        """
+        Parse a single 16 byte packet.
+
+        Returns None if the packet was for a command without a handler, or if it is part of a multi packet message that
+        isn't finished yet.
+        """
+        command = packet[0]
+        handler = self.handlers.get(command)
+        if handler is None:
+            logger.warning("Did not expect this packet: %s", bytes(packet))
+            return None
+
+        result = handler(packet)
+        if result is None:
+            return None
+        return Message(command, result)
+
+    def feed(self, chunk: bytes | bytearray | memoryview) -> list[Message]:
+        """Decode as many packets as possible from chunk and return the messages they completed"""
+        messages: list[Message] = []
+        view = memoryview(chunk)
+        offset = 0
+
+        if self._partial:
+            needed = self._stride - len(self._partial)
+            self._partial += view[:needed]
+            offset = needed
+            if len(self._partial) < self._stride:
+                return messages
+            frame, self._partial = self._partial, bytearray()
+            self._decode_frame(memoryview(frame), messages)
+
+        end = len(view) - self._stride
+        while offset <= end:
+            self._decode_frame(view[offset : offset + self._stride], messages)
+            offset += self._stride
+
+        if offset < len(view):
+            self._partial = bytearray(view[offset:])
+
+        return messages
+
+    def _decode_frame(self, frame: memoryview, messages: list[Message]) -> None:
+        if self.separator and frame[PACKET_SIZE:] != self.separator:
+            raise ValueError(f"Expected separator {self.separator!r} after packet {bytes(frame)!r}")
+        message = self.decode_packet(frame[:PACKET_SIZE])
+        if message is not None:
+            messages.append(message)
+
+
+def decode(
+    chunks: Iterable[bytes | bytearray | memoryview],
+    decoder: PacketDecoder | None = None,
+) -> Iterator[Message]:
+    """Pull messages out of any iterable of byte chunks"""
+    if decoder is None:
+        decoder = PacketDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+
+
+async def adecode(
+    chunks: AsyncIterable[bytes | bytearray | memoryview],
+    decoder: PacketDecoder | None = None,
+) -> AsyncIterator[Message]:
+    """Pull messages out of any async iterable of byte chunks"""
+    if decoder is None:
+        decoder = PacketDecoder()
+    async for chunk in chunks:
+        for message in decoder.feed(chunk):
+            yield message
+
+
+def read_capture(path: Path, chunk_size: int = 64 * 1024) -> Iterator[Message]:
+    """Decode a capture file written by `colmi_r02_client.client.Client` with record_to set"""
+    decoder = PacketDecoder(separator=CAPTURE_SEPARATOR)
+    with path.open("rb") as f:
+        yield from decode(iter(lambda: f.read(chunk_size), b""), decoder)
+
+
+def capture_times_path(path: Path) -> Path:
+    return path.with_name(path.name + CAPTURE_TIMES_SUFFIX)
+
+
+def read_capture_packets(path: Path) -> list[bytearray]:
+    """The raw packets in a capture file, without parsing them"""
+    data = path.read_bytes()
+    stride = PACKET_SIZE + len(CAPTURE_SEPARATOR)
+    if len(data) % stride:
+        logger.warning(f"{path} ends with a partial packet, ignoring it")
+    return [bytearray(data[i : i + PACKET_SIZE]) for i in range(0, len(data) - stride + 1, stride)]
+
+
+def read_capture_times(path: Path) -> list[float] | None:
+    """When each packet in the capture at path arrived, or None if the capture has no times"""
+    times_path = capture_times_path(path)
+    if not times_path.exists():
+        return None
+    data = times_path.read_bytes()
+    return list(struct.unpack(f"<{len(data) // 8}d", data[: len(data) - len(data) % 8]))
@@ -0,0 +1,206 @@
+"""
+Stream data out of the database as CSV, NDJSON or a compressed columnar format.
+
+Rows are read a chunk at a time (`yield_per` for syncs, the chunked column queries in `colmi_r02_client.db` for heart
+rates and sport details, which include packed heart rate days) and written as they arrive, so memory use doesn't depend
+on how much is exported.
+
+CSV and NDJSON have one row per reading with ISO 8601 UTC timestamps. The columnar format keeps epoch seconds and is
+made of blocks, one per chunk: a JSON header line describing the columns, followed by the zlib compressed column data.
+See `read_columnar`.
+"""
+
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+import csv
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import io
+import json
+import sys
+from typing import Any, BinaryIO, TextIO
+import zlib
+
+from sqlalchemy import Integer, select, type_coerce
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import db
+
+TABLES = ("heart_rates", "sport_details", "syncs")
+FORMATS = {"csv": ".csv", "ndjson": ".ndjson", "columnar": ".colz"}
+"""Export formats and their file extensions"""
+
+COLUMNAR_MAGIC = b"COLMI-COLUMNAR-1\n"
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+_FAR_FUTURE = datetime(9999, 1, 1, tzinfo=timezone.utc)
+
+Columns = dict[str, Sequence[Any]]
+
+
+@dataclass(frozen=True, slots=True)
+class ColumnarBlock:
+    table: str
+    address: str
+    columns: Columns
+
+
+def iter_columns(
+    session: Session,
+    table: str,
+    addresses: Iterable[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    chunk_size: int = db.QUERY_CHUNK_SIZE,
+) -> Iterator[tuple[str, Columns]]:
+    """(address, columns) for each chunk of table from start up to but not including end, ring by ring"""
+    assert table in TABLES, f"table must be one of {TABLES}"
+    if addresses is None:
+        addresses = session.scalars(select(db.Ring.address).order_by(db.Ring.address)).all()
+    start = start if start is not None else _EPOCH
+    end = end if end is not None else _FAR_FUTURE
+
+    for address in addresses:
+        if table == "heart_rates":
+            for hr_chunk in db.iter_heart_rate_columns(session, address, start, end, chunk_size):
+                yield address, {"timestamp": hr_chunk.timestamps, "reading": hr_chunk.readings}
+        elif table == "sport_details":
+            for sd_chunk in db.iter_sport_detail_columns(session, address, start, end, chunk_size):
+                yield (
+                    address,
+                    {
+                        "timestamp": sd_chunk.timestamps,
+                        "calories": sd_chunk.calories,
+                        "steps": sd_chunk.steps,
+                        "distance": sd_chunk.distances,
+                    },
+                )
+        else:
+            yield from ((address, c) for c in _sync_columns(session, address, start, end, chunk_size))
+
+
+def _sync_columns(session: Session, address: str, start: datetime, end: datetime, chunk_size: int) -> Iterator[Columns]:
+    query = (
+        select(db.Sync.sync_id, type_coerce(db.Sync.timestamp, Integer), db.Sync.comment)
+        .join(db.Ring)
+        .where(db.Ring.address == address)
+        .where(db.Sync.timestamp >= start)
+        .where(db.Sync.timestamp < end)
+        .order_by(db.Sync.timestamp)
+        .execution_options(yield_per=chunk_size)
+    )
+    for partition in session.execute(query).partitions():
+        sync_ids, timestamps, comments = zip(*partition, strict=True)
+        yield {"sync_id": array("q", sync_ids), "timestamp": array("q", timestamps), "comment": list(comments)}
+
+
+def _text_rows(chunks: Iterable[tuple[str, Columns]]) -> Iterator[dict[str, Any]]:
+    for address, columns in chunks:
+        names = list(columns)
+        for values in zip(*columns.values(), strict=True):
+            row = {"address": address, **dict(zip(names, values, strict=True))}
+            row["timestamp"] = datetime.fromtimestamp(row["timestamp"], timezone.utc).isoformat()
+            yield row
+
+
+def write_csv(out: TextIO, chunks: Iterable[tuple[str, Columns]]) -> int:
+    rows = 0
+    writer = None
+    for row in _text_rows(chunks):
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        rows += 1
+    return rows
+
+
+def write_ndjson(out: TextIO, chunks: Iterable[tuple[str, Columns]]) -> int:
+    rows = 0
+    for row in _text_rows(chunks):
+        out.write(json.dumps(row, separators=(",", ":")))
+        out.write("\n")
+        rows += 1
+    return rows
+
+
+def write_columnar(out: BinaryIO, table: str, chunks: Iterable[tuple[str, Columns]]) -> int:
+    rows = 0
+    out.write(COLUMNAR_MAGIC)
+    for address, columns in chunks:
+        rows += write_columnar_block(out, table, address, columns)
+    return rows
+
+
+def write_columnar_block(out: BinaryIO, table: str, address: str, columns: Columns) -> int:
+    """Write one block of a columnar file, after COLUMNAR_MAGIC has been written. Returns the number of rows"""
+    payload = []
+    described = []
+    for name, values in columns.items():
+        kind: str
+        if isinstance(values, array):
+            data, kind = values.tobytes(), values.typecode
+        else:
+            data, kind = json.dumps(list(values)).encode(), "json"
+        payload.append(data)
+        described.append([name, kind, len(data)])
+    compressed = zlib.compress(b"".join(payload))
+    count = len(next(iter(columns.values())))
+    header = {
+        "table": table,
+        "address": address,
+        "rows": count,
+        "byteorder": sys.byteorder,
+        "columns": described,
+        "length": len(compressed),
+    }
+    out.write(json.dumps(header).encode() + b"\n")
+    out.write(compressed)
+    return count
+
+
+def read_columnar(f: BinaryIO) -> Iterator[ColumnarBlock]:
+    """Read back a file written by `write_columnar`, a block at a time"""
+    if f.readline() != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar export")
+    while line := f.readline():
+        header = json.loads(line)
+        payload = zlib.decompress(f.read(header["length"]))
+        columns: Columns = {}
+        offset = 0
+        for name, kind, length in header["columns"]:
+            data = payload[offset : offset + length]
+            offset += length
+            if kind == "json":
+                columns[name] = json.loads(data)
+                continue
+            values = array(kind, data)
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+            columns[name] = values
+        yield ColumnarBlock(header["table"], header["address"], columns)
+
+
+def export_table(
+    session: Session,
+    table: str,
+    fmt: str,
+    out: BinaryIO,
+    addresses: Iterable[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    chunk_size: int = db.QUERY_CHUNK_SIZE,
+) -> int:
+    """Write table to out as fmt, returns the number of rows written"""
+    assert fmt in FORMATS, f"fmt must be one of {list(FORMATS)}"
+    chunks = iter_columns(session, table, addresses, start, end, chunk_size)
+    if fmt == "columnar":
+        return write_columnar(out, table, chunks)
+
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    try:
+        return write_csv(text, chunks) if fmt == "csv" else write_ndjson(text, chunks)
+    finally:
+        text.flush()
+        # leave out open for the caller
+        text.detach()
@@ -1,11 +1,13 @@
 """This is called the DailyHeartRate in Java."""
 
+from array import array
+from collections.abc import Iterator, Sequence
 from datetime import datetime, timezone, timedelta
 from dataclasses import dataclass
 import logging
 import struct
 
-from colmi_r02_client.packet import make_packet
+from colmi_r02_client.packet import IncompleteTransfer, Packet, make_packet
 from colmi_r02_client import date_utils
 
 CMD_READ_HEART_RATE = 21  # 0x15
@@ -20,28 +22,91 @@ def read_heart_rate_packet(target: datetime) -> bytearray:
     return make_packet(CMD_READ_HEART_RATE, data)
 
 
-def _add_times(heart_rates: list[int], ts: datetime) -> list[tuple[int, datetime]]:
-    assert len(heart_rates) == 288, "Need exactly 288 points at 5 minute intervals"
+MINUTES_PER_DAY = 24 * 60
+
+DEFAULT_INTERVAL = 5
+"""Minutes between readings when the ring doesn't give a usable interval"""
+
+
+def _day_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day, tzinfo=ts.tzinfo)
+
+
+def _checked_interval(interval: int) -> int:
+    if interval <= 0:
+        logger.warning(f"Invalid heart rate log interval {interval}, assuming {DEFAULT_INTERVAL} minutes")
+        return DEFAULT_INTERVAL
+    return interval
+
+
+def _add_times(
+    heart_rates: "list[int] | array[int]", ts: datetime, interval: int = DEFAULT_INTERVAL
+) -> list[tuple[int, datetime]]:
+    """
+    Pair each reading with the time it was taken.
+
+    The first reading is at midnight and each subsequent one is `interval` minutes later. Readings past the end of
+    the day are dropped.
+    """
+    interval = _checked_interval(interval)
     result = []
-    m = datetime(ts.year, ts.month, ts.day, tzinfo=ts.tzinfo)
-    five_min = timedelta(minutes=5)
-    for hr in heart_rates:
+    m = _day_start(ts)
+    step = timedelta(minutes=interval)
+    for hr in heart_rates[: MINUTES_PER_DAY // interval]:
         result.append((hr, m))
-        m += five_min
+        m += step
 
     return result
 
 
-@dataclass
+@dataclass(slots=True)
 class HeartRateLog:
-    heart_rates: list[int]
+    heart_rates: "array[int]"
+    """
+    One unsigned byte per reading, starting at midnight and `range` minutes apart. 0 means no reading.
+
+    Lists are accepted and converted on creation.
+    """
     timestamp: datetime
     size: int
     index: int
     range: int
+    """Interval between readings in minutes, `DEFAULT_INTERVAL` if the ring sent 0"""
 
-    def heart_rates_with_times(self):
-        return _add_times(self.heart_rates, self.timestamp)
+    def __post_init__(self) -> None:
+        if not isinstance(self.heart_rates, array):
+            self.heart_rates = array("B", self.heart_rates)
+        self.range = _checked_interval(self.range)
+
+    @property
+    def day_start(self) -> datetime:
+        """Midnight of the day this log is for"""
+        return _day_start(self.timestamp)
+
+    def epoch_timestamps(self) -> Sequence[int]:
+        """
+        Unix timestamps (in seconds) for each reading, without allocating a datetime per reading.
+
+        Naive timestamps are assumed to be in UTC.
+        """
+        day_start = self.day_start
+        if day_start.tzinfo is None:
+            day_start = day_start.replace(tzinfo=timezone.utc)
+        start = int(day_start.timestamp())
+        step = self.range * 60
+        slots = min(len(self.heart_rates), MINUTES_PER_DAY // self.range)
+        return range(start, start + slots * step, step)
+
+    def readings(self) -> Iterator[tuple[int, int]]:
+        """Iterate over (unix timestamp, heart rate) for only the slots with a reading"""
+        heart_rates = self.heart_rates
+        for i, ts in enumerate(self.epoch_timestamps()):
+            reading = heart_rates[i]
+            if reading != 0:
+                yield ts, reading
+
+    def heart_rates_with_times(self) -> list[tuple[int, datetime]]:
+        return _add_times(self.heart_rates, self.timestamp, self.range)
 
 
 class NoData:
@@ -58,7 +123,9 @@ class HeartRateLogParser:
         self.size = 0
         self.index = 0
         self.end = False
-        self.range = 5
+        self.range = DEFAULT_INTERVAL
+        self._expected_sub_type = 0
+        self._discarding = False
 
     def is_today(self) -> bool:
         d = self.timestamp
@@ -66,7 +133,7 @@ class HeartRateLogParser:
             return False
         return date_utils.is_today(d)
 
-    def parse(self, packet: bytearray) -> HeartRateLog | NoData | None:
+    def parse(self, packet: Packet) -> HeartRateLog | NoData | IncompleteTransfer | None:
         r"""
         first byte of packet should always be CMD_READ_HEART_RATE (21)
         second byte is the sub_type
@@ -75,6 +142,9 @@ class HeartRateLogParser:
         byte 2 is the number of expected packets after this.
 
         example: bytearray(b'\x15\x00\x18\x05\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x002')
+
+        sub_types after that should arrive in order. If one is skipped the whole log is abandoned and an
+        IncompleteTransfer is returned, the remaining packets are ignored until the next sub_type 0.
         """
 
         sub_type = packet[1]
@@ -82,24 +152,28 @@ class HeartRateLogParser:
             logger.info("error response from heart rate log request")
             self.reset()
             return NoData()
-        if self.is_today() and sub_type == 23:
-            assert self.timestamp
-            result = HeartRateLog(
-                heart_rates=self.heart_rates,
-                timestamp=self.timestamp,
-                size=self.size,
-                range=self.range,
-                index=self.index,
-            )
-            self.reset()
-            return result
         if sub_type == 0:
-            self.end = False
+            self.reset()
             self.size = packet[2]  # number of expected packets
             self.range = packet[3]
             self._raw_heart_rates = [-1] * (self.size * 13)
+            self._expected_sub_type = 1
+            return None
+        if self._discarding:
             return None
-        elif sub_type == 1:
+        if sub_type != self._expected_sub_type or sub_type >= self.size:
+            lost = max(sub_type - self._expected_sub_type, 1)
+            logger.warning(f"Heart rate log lost {lost} packet(s), expected {self._expected_sub_type} got {sub_type}")
+            self.reset()
+            self._discarding = True
+            return IncompleteTransfer(CMD_READ_HEART_RATE, lost)
+        self._expected_sub_type += 1
+
+        if self.is_today() and sub_type == 23:
+            result = self._make_log()
+            self.reset()
+            return result
+        if sub_type == 1:
             # next 4 bytes are a timestamp
             ts = struct.unpack_from("<l", packet, offset=2)[0]
             self.timestamp = datetime.fromtimestamp(ts, timezone.utc)
@@ -113,19 +187,24 @@ class HeartRateLogParser:
             self._raw_heart_rates[self.index : self.index + 13] = list(packet[2:15])
             self.index += 13
             if sub_type == self.size - 1:
-                assert self.timestamp
-                result = HeartRateLog(
-                    heart_rates=self.heart_rates,
-                    timestamp=self.timestamp,
-                    size=self.size,
-                    range=self.range,
-                    index=self.index,
-                )
+                result = self._make_log()
                 self.reset()
                 return result
             else:
                 return None
 
+    def _make_log(self) -> HeartRateLog:
+        assert self.timestamp
+        # slots that never got a packet are still -1, treat them as "no reading"
+        heart_rates = array("B", (x if x > 0 else 0 for x in self.heart_rates))
+        return HeartRateLog(
+            heart_rates=heart_rates,
+            timestamp=self.timestamp,
+            size=self.size,
+            range=self.range,
+            index=self.index,
+        )
+
     @property
     def heart_rates(self) -> list[int]:
         """
@@ -147,8 +226,8 @@ class HeartRateLogParser:
         # TODO see if we can remove this
         # need a good reason why parsing should depend on the day
         # index might be good enough to indicate how much "valid" data we've gotten
-        if self.is_today():
-            m = date_utils.minutes_so_far(datetime.now(tz=timezone.utc)) // 5
+        if self.is_today() and self.range > 0:
+            m = date_utils.minutes_so_far(datetime.now(tz=timezone.utc)) // self.range
             hr[m:] = [0] * len(hr[m:])
 
         return hr
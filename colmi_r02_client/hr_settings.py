@@ -9,7 +9,7 @@ I don't know what byte 1 in the response is.
 from dataclasses import dataclass
 import logging
 
-from colmi_r02_client.packet import make_packet
+from colmi_r02_client.packet import Packet, make_packet
 
 CMD_HEART_RATE_LOG_SETTINGS = 22  # 0x16
 
@@ -18,14 +18,14 @@ READ_HEART_RATE_LOG_SETTINGS_PACKET = make_packet(CMD_HEART_RATE_LOG_SETTINGS, b
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HeartRateLogSettings:
     enabled: bool
     interval: int
     """Interval in minutes"""
 
 
-def parse_heart_rate_log_settings(packet: bytearray) -> HeartRateLogSettings:
+def parse_heart_rate_log_settings(packet: Packet) -> HeartRateLogSettings:
     r"""
     example: bytearray(b'\x16\x01\x01<\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00T')
     """
@@ -0,0 +1,181 @@
+"""
+Bulk import capture files written with `--record` into the database.
+
+Decoding is CPU bound, so captures are decoded in a pool of processes using the same parsers as the client. The main
+process is the only one writing to the database: it keeps the most complete heart rate log and the latest sport details
+for each day, and writes them in batches with `colmi_r02_client.db.full_sync`, which skips heart rates that are already
+stored and updates sport details in place.
+"""
+
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import islice
+import logging
+import os
+from pathlib import Path
+import re
+import time
+
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import db, hr, steps
+from colmi_r02_client.client import FullData
+from colmi_r02_client.decoder import CAPTURE_SEPARATOR, PACKET_SIZE, read_capture
+
+CAPTURE_GLOB = "*.bin"
+
+_CAPTURE_TIME = re.compile(r"_(\d{9,})$")
+"""The client names captures colmi_response_capture_{unix time}.bin"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class DecodedCapture:
+    path: Path
+    recorded_at: datetime
+    size: int
+    heart_rates: list[hr.HeartRateLog] = field(default_factory=list)
+    sport_details: list[list[steps.SportDetail]] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ImportStats:
+    captures: int = 0
+    packets: int = 0
+    bytes: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"Imported {self.captures} captures ({self.packets} packets, {self.bytes / 1e6:.1f} MB) "
+            f"writing {self.rows} rows in {self.seconds:.2f}s: "
+            f"{self.packets / seconds:.0f} packets/s, {self.rows / seconds:.0f} rows/s"
+        )
+
+
+def find_captures(paths: Iterable[Path]) -> list[Path]:
+    """Expand directories to the captures in them, sorted so newer captures are imported last"""
+    found: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            found.extend(path.glob(CAPTURE_GLOB))
+        else:
+            found.append(path)
+    return sorted(found, key=lambda p: (_recorded_at(p), p.name))
+
+
+def _recorded_at(path: Path) -> datetime:
+    if match := _CAPTURE_TIME.search(path.stem):
+        return datetime.fromtimestamp(int(match.group(1)), timezone.utc)
+    return datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+
+
+def decode_capture(path: Path) -> DecodedCapture:
+    """Complete heart rate logs and days of sport details in a capture, runs in a worker process"""
+    result = DecodedCapture(path, _recorded_at(path), size=path.stat().st_size)
+    for message in read_capture(path):
+        if isinstance(message.value, hr.HeartRateLog):
+            result.heart_rates.append(message.value)
+        elif isinstance(message.value, list) and message.value and isinstance(message.value[0], steps.SportDetail):
+            result.sport_details.append(message.value)
+    return result
+
+
+class _Batch:
+    """Decoded days waiting to be written, one entry per day"""
+
+    def __init__(self) -> None:
+        self.heart_rates: dict[datetime, hr.HeartRateLog] = {}
+        self.sport_details: dict[tuple[int, int, int], list[steps.SportDetail]] = {}
+        self.captures = 0
+        self.recorded_at: datetime | None = None
+
+    def add(self, capture: DecodedCapture) -> None:
+        for log in capture.heart_rates:
+            day = log.day_start
+            previous = self.heart_rates.get(day)
+            # a log synced partway through a day has fewer readings than one from later on
+            if previous is None or _readings(log) >= _readings(previous):
+                self.heart_rates[day] = log
+        for details in capture.sport_details:
+            # later captures have the final totals for the last interval of the day
+            self.sport_details[(details[0].year, details[0].month, details[0].day)] = details
+        self.captures += 1
+        if self.recorded_at is None or capture.recorded_at > self.recorded_at:
+            self.recorded_at = capture.recorded_at
+
+    def to_full_data(self, address: str) -> FullData:
+        return FullData(
+            address,
+            heart_rates=[self.heart_rates[d] for d in sorted(self.heart_rates)],
+            sport_details=[self.sport_details[d] for d in sorted(self.sport_details)],
+        )
+
+
+def _readings(log: hr.HeartRateLog) -> int:
+    return sum(1 for r in log.heart_rates if r)
+
+
+def import_captures(
+    session: Session,
+    address: str,
+    paths: Iterable[Path],
+    jobs: int | None = None,
+    batch_size: int = 50,
+) -> ImportStats:
+    """
+    Decode every capture in paths using jobs processes (1 decodes in this process) and write them to the database as
+    ring address, batch_size captures per transaction.
+    """
+    captures = find_captures(paths)
+    stats = ImportStats()
+    start = time.perf_counter()
+
+    def write(batch: _Batch) -> None:
+        if batch.captures == 0:
+            return
+        stats.rows += db.full_sync(
+            session,
+            batch.to_full_data(address),
+            timestamp=batch.recorded_at,
+            comment=f"imported from {batch.captures} capture(s)",
+        )
+
+    def decoded() -> Iterable[DecodedCapture]:
+        if jobs == 1:
+            yield from map(decode_capture, captures)
+            return
+        workers = jobs or os.cpu_count() or 1
+        remaining = iter(captures)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # at most two captures per worker are in flight so decoded captures don't pile up in memory while the
+            # database catches up, and they come back in order so newer captures still win
+            pending = deque(pool.submit(decode_capture, path) for path in islice(remaining, workers * 2))
+            while pending:
+                capture = pending.popleft().result()
+                pending.extend(pool.submit(decode_capture, path) for path in islice(remaining, 1))
+                yield capture
+
+    batch = _Batch()
+    for capture in decoded():
+        logger.info(
+            f"Decoded {capture.path}: {len(capture.heart_rates)} heart rate logs, "
+            f"{len(capture.sport_details)} days of sport details"
+        )
+        stats.captures += 1
+        stats.packets += capture.size // (PACKET_SIZE + len(CAPTURE_SEPARATOR))
+        stats.bytes += capture.size
+        batch.add(capture)
+        if batch.captures >= batch_size:
+            write(batch)
+            batch = _Batch()
+    write(batch)
+
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -0,0 +1,154 @@
+"""
+Counters, gauges and histograms for seeing where time goes when talking to the ring.
+
+Metrics are disabled by default. When disabled every recording method returns immediately, and the hot paths in
+`colmi_r02_client.client.Client` check `Metrics.enabled` before doing any work at all.
+
+Use `Metrics.snapshot` to read the current values, or `Metrics.write` to save them as JSON or in the Prometheus text
+format (for the node exporter's textfile collector, for example).
+"""
+
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import json
+from pathlib import Path
+import time
+from typing import Any
+
+PREFIX = "colmi_"
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+"""Histogram bucket upper bounds in seconds"""
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass(slots=True)
+class Histogram:
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    counts: list[int] = field(default_factory=list)
+    """Observations per bucket, the last one is for everything larger than the biggest bucket"""
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    if not parts:
+        return ""
+    return "{" + ",".join(parts) + "}"
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.gauges: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        series = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        if key not in series:
+            series[key] = Histogram()
+        series[key].observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: Any) -> Iterator[None]:
+        """Observe how long the body takes in seconds"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict[str, Any]:
+        """All current values as plain dicts and lists, suitable for json"""
+        return {
+            "counters": {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()] for name, series in self.counters.items()
+            },
+            "gauges": {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()] for name, series in self.gauges.items()
+            },
+            "histograms": {
+                name: [
+                    {
+                        "labels": dict(k),
+                        "buckets": list(h.buckets),
+                        "counts": list(h.counts),
+                        "sum": h.sum,
+                        "count": h.count,
+                    }
+                    for k, h in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Current values in the Prometheus text exposition format"""
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.extend(f"{PREFIX}{name}{_format_labels(k)} {v}" for k, v in series.items())
+        for name, series in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.extend(f"{PREFIX}{name}{_format_labels(k)} {v}" for k, v in series.items())
+        for name, h_series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for k, h in h_series.items():
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts, strict=False):
+                    cumulative += count
+                    le = _format_labels(k, f'le="{bound}"')
+                    lines.append(f"{PREFIX}{name}_bucket{le} {cumulative}")
+                le = _format_labels(k, 'le="+Inf"')
+                lines.append(f"{PREFIX}{name}_bucket{le} {h.count}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(k)} {h.sum}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(k)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        """Write to path as JSON if it ends in .json, Prometheus text format otherwise"""
+        if path.suffix == ".json":
+            path.write_text(self.to_json())
+        else:
+            path.write_text(self.to_prometheus())
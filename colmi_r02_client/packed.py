@@ -0,0 +1,112 @@
+"""
+Pack a day of heart rate readings into one small blob, for the "days" heart rate storage in `colmi_r02_client.db`.
+
+A day is up to 288 one byte readings, one per slot, plus a validity mask with one bit per slot (lowest bit first), set
+when the slot has a reading. Readings are either stored as is, or delta encoded and zlib compressed. Before delta
+encoding empty slots are filled with the previous reading, so a gap costs nothing and the mask says what was real.
+
+Real time readings use `encode_series` instead, as they don't come in fixed slots: millisecond offsets and readings,
+both delta encoded, then zlib compressed.
+"""
+
+from array import array
+from collections.abc import Iterator, Sequence
+from itertools import accumulate, compress, pairwise
+import sys
+import zlib
+
+ENCODING_RAW = 0
+ENCODING_DELTA_ZLIB = 1
+
+_MASK_BITS = [bytes((b >> i) & 1 for i in range(8)) for b in range(256)]
+"""Every possible mask byte expanded to one byte per slot"""
+
+
+def mask_of(readings: Sequence[int]) -> bytes:
+    """One bit per reading, set for readings that aren't 0"""
+    mask = bytearray((len(readings) + 7) // 8)
+    for i, reading in enumerate(readings):
+        if reading:
+            mask[i >> 3] |= 1 << (i & 7)
+    return bytes(mask)
+
+
+def valid_slots(mask: bytes, slots: int) -> bytes:
+    """The mask expanded to one byte per slot, 1 where there is a reading, for use with `itertools.compress`"""
+    return b"".join(_MASK_BITS[b] for b in mask)[:slots]
+
+
+def encode(readings: Sequence[int], compress_readings: bool = True) -> tuple[bytes, bytes, int]:
+    """
+    Returns the blob, mask and encoding for a day of readings, 0 meaning no reading.
+
+    Compression is only used if it actually makes the blob smaller.
+    """
+    raw = bytes(readings)
+    mask = mask_of(raw)
+    if not compress_readings:
+        return raw, mask, ENCODING_RAW
+
+    deltas = bytearray(len(raw))
+    previous = 0
+    for i, reading in enumerate(raw):
+        if reading:
+            deltas[i] = (reading - previous) & 0xFF
+            previous = reading
+    compressed = zlib.compress(deltas, 9)
+    if len(compressed) >= len(raw):
+        return raw, mask, ENCODING_RAW
+    return compressed, mask, ENCODING_DELTA_ZLIB
+
+
+def decode(blob: bytes, mask: bytes, encoding: int) -> "array[int]":
+    """Readings for every slot of the day, 0 where there was no reading"""
+    if encoding == ENCODING_RAW:
+        return array("B", blob)
+    if encoding != ENCODING_DELTA_ZLIB:
+        raise ValueError(f"Unknown heart rate encoding {encoding}")
+
+    running: Iterator[int] = accumulate(zlib.decompress(blob), _add_byte)
+    filled = bytes(running)
+    # empty slots decode to the previous reading, put the zeros back
+    return array("B", bytes(r if v else 0 for r, v in zip(filled, valid_slots(mask, len(filled)), strict=True)))
+
+
+def _add_byte(a: int, b: int) -> int:
+    return (a + b) & 0xFF
+
+
+def to_columns(
+    day_start: int, interval: int, blob: bytes, mask: bytes, encoding: int, start: int, end: int
+) -> tuple["array[int]", "array[int]"]:
+    """Epoch seconds and readings for the slots with a reading from start up to but not including end"""
+    readings = decode(blob, mask, encoding)
+    first = max(0, -(-(start - day_start) // interval))
+    last = min(len(readings), -(-(end - day_start) // interval))
+    if first >= last:
+        return array("q"), array("B")
+    valid = valid_slots(mask, len(readings))[first:last]
+    timestamps = range(day_start + first * interval, day_start + last * interval, interval)
+    return array("q", compress(timestamps, valid)), array("B", compress(readings[first:last], valid))
+
+
+def encode_series(offsets: Sequence[int], readings: Sequence[int]) -> bytes:
+    """Increasing millisecond offsets from the start of a block and a one byte reading at each"""
+    assert len(offsets) == len(readings), "offsets and readings must be the same length"
+    # four bytes each, little endian, so blocks can be read back on any machine
+    deltas = array("I", (b - a for a, b in pairwise([0, *offsets])))
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    raw = bytes(readings)
+    reading_deltas = bytes((b - a) & 0xFF for a, b in pairwise(b"\x00" + raw))
+    return zlib.compress(deltas.tobytes() + reading_deltas, 9)
+
+
+def decode_series(blob: bytes, count: int) -> tuple["array[int]", "array[int]"]:
+    """Offsets and readings written by `encode_series`"""
+    data = zlib.decompress(blob)
+    deltas = array("I", data[: count * 4])
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    running: Iterator[int] = accumulate(data[count * 4 :], _add_byte)
+    return array("q", accumulate(deltas)), array("B", running)
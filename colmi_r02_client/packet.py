@@ -1,3 +1,9 @@
+from dataclasses import dataclass
+
+Packet = bytes | bytearray | memoryview
+"""A 16 byte packet as the parsers accept it, the decoder hands them memoryviews over what it was fed"""
+
+
 def make_packet(command: int, sub_data: bytearray | None = None) -> bytearray:
     """
     Make a well formed packet from a command key and optional sub data.
@@ -21,7 +27,7 @@ def make_packet(command: int, sub_data: bytearray | None = None) -> bytearray:
     return packet
 
 
-def checksum(packet: bytearray) -> int:
+def checksum(packet: Packet) -> int:
     """
     Packet checksum
 
@@ -29,3 +35,24 @@ def checksum(packet: bytearray) -> int:
     """
 
     return sum(packet) & 255
+
+
+@dataclass(frozen=True, slots=True)
+class IncompleteTransfer:
+    """
+    Returned by the parsers for multi packet responses when packets went missing.
+
+    The rest of the broken response is ignored, so the request can be sent again straight away.
+    """
+
+    command: int
+    lost: int
+    """How many packets were missed before the transfer was abandoned"""
+
+
+class TransferError(Exception):
+    """A multi packet response was still incomplete after retrying"""
+
+    def __init__(self, incomplete: IncompleteTransfer):
+        super().__init__(f"Lost {incomplete.lost} packet(s) in response to command {incomplete.command}")
+        self.incomplete = incomplete
@@ -0,0 +1,51 @@
+"""
+Run a CLI command under cProfile, and optionally tracemalloc, for the --profile option.
+"""
+
+import cProfile
+import io
+import pstats
+import time
+from pathlib import Path
+import tracemalloc
+
+PROFILE_DIR = Path("captures")
+"""Profiles are written next to packet captures"""
+
+
+class Profiler:
+    def __init__(self, name: str, output_dir: Path = PROFILE_DIR, memory: bool = False, top: int = 15):
+        self.name = name
+        self.output_dir = output_dir
+        self.memory = memory
+        self.top = top
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.memory:
+            tracemalloc.start()
+        self._profile.enable()
+
+    def stop(self) -> str:
+        """Stop profiling, write the results and return a short summary of the hottest functions"""
+        self._profile.disable()
+        self.output_dir.mkdir(exist_ok=True)
+        prefix = self.output_dir / f"profile_{self.name}_{int(time.time())}"
+
+        stats_path = prefix.with_suffix(".pstats")
+        self._profile.dump_stats(stats_path)
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        summary = [f"Profile written to {stats_path}", out.getvalue().strip()]
+
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            top_allocations = snapshot.statistics("lineno")[: self.top]
+            allocations_path = prefix.with_name(prefix.name + "_allocations.txt")
+            allocations_path.write_text("\n".join(str(s) for s in top_allocations) + "\n")
+            summary.append(f"Top allocations written to {allocations_path}")
+            summary.extend(str(s) for s in top_allocations[:5])
+
+        return "\n".join(summary)
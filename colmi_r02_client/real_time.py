@@ -10,7 +10,7 @@ can correct
 from dataclasses import dataclass
 from enum import IntEnum
 
-from colmi_r02_client.packet import make_packet
+from colmi_r02_client.packet import Packet, make_packet
 
 
 class Action(IntEnum):
@@ -57,13 +57,13 @@ CMD_REAL_TIME_HEART_RATE = 30
 CONTINUE_HEART_RATE_PACKET = make_packet(CMD_REAL_TIME_HEART_RATE, bytearray(b"3"))
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Reading:
     kind: RealTimeReading
     value: int
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ReadingError:
     kind: RealTimeReading
     code: int
@@ -81,7 +81,7 @@ def get_stop_packet(reading_type: RealTimeReading) -> bytearray:
     return make_packet(CMD_STOP_REAL_TIME, bytearray([reading_type, 0, 0]))
 
 
-def parse_real_time_reading(packet: bytearray) -> Reading | ReadingError:
+def parse_real_time_reading(packet: Packet) -> Reading | ReadingError:
     assert packet[0] == CMD_START_REAL_TIME
 
     kind = RealTimeReading(packet[1])
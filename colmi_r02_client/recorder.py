@@ -0,0 +1,193 @@
+"""
+Record real time readings from the ring for hours or days, into the real_time_blocks table of the database.
+
+Heart rate is streamed continuously at whatever rate the ring sends it. The ring only measures one thing at a time, so
+SpO2, if asked for, is a spot reading every so often: heart rate is paused until one SpO2 reading arrives or it times
+out.
+
+Readings are collected into a block per kind, which is written through a `colmi_r02_client.writer.DatabaseWriter` once
+it holds block_readings readings or spans block_seconds, whichever comes first, and whenever the connection is lost. At
+most one block per kind is held in memory and the writer's queue is bounded, so memory use doesn't grow with how long
+the recording runs.
+
+Listeners are called with every reading as it arrives, e.g. `colmi_r02_client.broadcaster.Broadcaster.publish` to
+share them with other local programs. Without a writer readings are only passed to the listeners.
+
+When the ring stops sending (out of range, battery flat, ...) the recorder disconnects and keeps trying to reconnect,
+waiting a little longer after each failed attempt.
+"""
+
+import asyncio
+from array import array
+from collections.abc import Callable, Sequence
+from contextlib import aclosing
+from dataclasses import dataclass
+import logging
+import time
+
+from bleak.exc import BleakError
+
+from colmi_r02_client import real_time
+from colmi_r02_client.client import REAL_TIME_MAX_WAIT, Client
+from colmi_r02_client.writer import DatabaseWriter
+
+DEFAULT_BLOCK_SECONDS = 300
+DEFAULT_BLOCK_READINGS = 600
+DEFAULT_SPO2_TIMEOUT = 60.0
+MAX_RECONNECT_DELAY = 60.0
+
+Listener = Callable[[real_time.RealTimeReading, int, int], None]
+"""Called with the kind, timestamp in epoch milliseconds and value of each reading, must not block"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class RecorderStats:
+    readings: int = 0
+    errors: int = 0
+    """Readings the ring reported an error for, usually because it isn't being worn"""
+    blocks: int = 0
+    reconnects: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"Recorded {self.readings} readings in {self.blocks} blocks, {self.errors} errors "
+            f"and {self.reconnects} reconnects"
+        )
+
+
+class _Block:
+    __slots__ = ("readings", "timestamps")
+
+    def __init__(self) -> None:
+        self.timestamps: array[int] = array("q")
+        self.readings: array[int] = array("B")
+
+
+class RealTimeRecorder:
+    def __init__(
+        self,
+        client: Client,
+        writer: DatabaseWriter | None,
+        spo2_every: float | None = None,
+        block_seconds: int = DEFAULT_BLOCK_SECONDS,
+        block_readings: int = DEFAULT_BLOCK_READINGS,
+        max_wait: float = REAL_TIME_MAX_WAIT,
+        spo2_timeout: float = DEFAULT_SPO2_TIMEOUT,
+        reconnect_delay: float = 1.0,
+        clock: Callable[[], float] = time.time,
+        listeners: Sequence[Listener] = (),
+    ):
+        """
+        spo2_every is the seconds between SpO2 spot readings, None for heart rate only. clock gives the time readings
+        are stamped with, in epoch seconds.
+        """
+        assert block_seconds >= 1, "block_seconds must be at least 1"
+        assert block_readings >= 1, "block_readings must be at least 1"
+        self.client = client
+        self.writer = writer
+        self.spo2_every = spo2_every
+        self.block_seconds = block_seconds
+        self.block_readings = block_readings
+        self.max_wait = max_wait
+        self.spo2_timeout = spo2_timeout
+        self.reconnect_delay = reconnect_delay
+        self.clock = clock
+        self.listeners = listeners
+        self.stats = RecorderStats()
+        self._blocks: dict[real_time.RealTimeReading, _Block] = {}
+        self._pending: set[asyncio.Future[int]] = set()
+
+    async def run(self, duration: float | None = None) -> RecorderStats:
+        """Record for duration seconds, or until cancelled, and write out everything recorded before returning"""
+        try:
+            async with asyncio.timeout(duration):
+                await self._record_reconnecting()
+        except TimeoutError:
+            logger.info(f"Recorded for {duration}s")
+        finally:
+            await self._flush_all()
+            if self._pending:
+                await asyncio.wait(self._pending)
+        return self.stats
+
+    async def _record_reconnecting(self) -> None:
+        failures = 0
+        while True:
+            readings = self.stats.readings
+            try:
+                async with self.client:
+                    await self._record()
+            except (TimeoutError, BleakError, OSError) as e:
+                # TimeoutError is the ring going quiet, the timeout of run arrives here as a CancelledError instead
+                await self._flush_all()
+                failures = 1 if self.stats.readings > readings else failures + 1
+                delay = min(MAX_RECONNECT_DELAY, self.reconnect_delay * 2 ** (failures - 1))
+                logger.warning(f"Lost the ring ({e!r}), reconnecting in {delay}s")
+                self.stats.reconnects += 1
+                await asyncio.sleep(delay)
+
+    async def _record(self) -> None:
+        if self.spo2_every is None:
+            await self._stream(real_time.RealTimeReading.HEART_RATE)
+            return
+        while True:
+            await self._stream(real_time.RealTimeReading.HEART_RATE, until=self.clock() + self.spo2_every)
+            try:
+                async with asyncio.timeout(self.spo2_timeout):
+                    await self._stream(real_time.RealTimeReading.SPO2, spot=True)
+            except TimeoutError:
+                logger.info("No SpO2 reading, trying again later")
+
+    async def _stream(self, kind: real_time.RealTimeReading, until: float | None = None, spot: bool = False) -> None:
+        """Record readings while streaming kind, until the clock passes until or, for a spot reading, kind arrives"""
+        async with aclosing(self.client.stream_real_time(kind, max_wait=self.max_wait)) as readings:
+            async for reading in readings:
+                if isinstance(reading, real_time.ReadingError):
+                    self.stats.errors += 1
+                    logger.debug(f"Real time {reading.kind.name} error {reading.code}")
+                elif reading.value:
+                    # other kinds can still be on their way after being stopped, they are real readings too
+                    await self._add(reading.kind, reading.value)
+                    if spot and reading.kind == kind:
+                        return
+                if until is not None and self.clock() >= until:
+                    return
+
+    async def _add(self, kind: real_time.RealTimeReading, value: int) -> None:
+        timestamp = int(self.clock() * 1000)
+        self.stats.readings += 1
+        for listener in self.listeners:
+            listener(kind, timestamp, value)
+        if self.writer is None:
+            return
+
+        block = self._blocks.get(kind)
+        if block is not None and (
+            len(block.readings) >= self.block_readings or timestamp - block.timestamps[0] >= self.block_seconds * 1000
+        ):
+            await self._flush(kind)
+            block = None
+        if block is None:
+            block = self._blocks[kind] = _Block()
+        block.timestamps.append(timestamp)
+        block.readings.append(value)
+
+    async def _flush(self, kind: real_time.RealTimeReading) -> None:
+        assert self.writer is not None
+        block = self._blocks.pop(kind)
+        # waits when the writer is behind, which is the backpressure keeping memory bounded
+        done = await self.writer.submit_real_time_block(self.client.address, kind, block.timestamps, block.readings)
+        self.stats.blocks += 1
+        self._pending.add(done)
+        done.add_done_callback(self._written)
+
+    def _written(self, done: "asyncio.Future[int]") -> None:
+        self._pending.discard(done)
+        if not done.cancelled() and done.exception() is not None:
+            logger.error(f"Writing real time readings failed: {done.exception()!r}")
+
+    async def _flush_all(self) -> None:
+        for kind in list(self._blocks):
+            await self._flush(kind)
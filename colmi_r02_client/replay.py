@@ -0,0 +1,131 @@
+"""
+Run the client against a capture file written with `--record` instead of a ring.
+
+`ReplayRing` stands in for `bleak.BleakClient`. The capture is split into responses using the same parsers as the
+client, so a whole heart rate log or a whole day of steps is one response, and a run of real time readings is one
+response to the request that started it. Whenever the client sends a request the next captured response for that
+command is sent back, whatever the request was for.
+
+By default responses are sent as fast as possible. With original timing the gaps between packets are reproduced from
+the times recorded next to the capture, each response waits as long after the previous packet as it did when recorded.
+"""
+
+import asyncio
+from collections import deque
+from collections.abc import Sequence
+from dataclasses import dataclass
+import logging
+from pathlib import Path
+from typing import Any
+
+from colmi_r02_client import real_time
+from colmi_r02_client.decoder import new_command_handlers, read_capture_packets, read_capture_times
+from colmi_r02_client.simulator import FakeBleakClient
+
+MAX_GAP = 2.0
+"""Longest wait reproduced with original timing, longer gaps are where nothing was being asked of the ring"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Response:
+    command: int
+    packets: list[bytearray]
+    delays: list[float]
+    """Seconds to wait before sending each packet"""
+
+
+def split_responses(packets: Sequence[bytearray], times: Sequence[float] | None = None) -> list[Response]:
+    """Group captured packets into the responses the ring sent, in order"""
+    handlers = new_command_handlers()
+    responses = []
+    current: list[bytearray] = []
+    delays: list[float] = []
+    previous_time = times[0] if times else 0.0
+
+    def finish() -> None:
+        nonlocal current, delays
+        if current:
+            responses.append(Response(current[0][0], current, delays))
+        current, delays = [], []
+
+    for i, p in enumerate(packets):
+        command = p[0]
+        if current and current[0][0] != command:
+            # the ring moved on without finishing, e.g. a transfer that lost its last packet
+            finish()
+        if times is not None:
+            delays.append(min(max(times[i] - previous_time, 0.0), MAX_GAP))
+            previous_time = times[i]
+        else:
+            delays.append(0.0)
+        current.append(p)
+
+        handler = handlers.get(command)
+        # real time readings keep coming until they are stopped, so they end when another command shows up
+        if handler is None or (handler(p) is not None and command != real_time.CMD_START_REAL_TIME):
+            finish()
+    finish()
+    return responses
+
+
+class ReplayRing(FakeBleakClient):
+    """Drop in replacement for `bleak.BleakClient` that answers with the responses from a capture."""
+
+    def __init__(self, responses: list[Response], original_timing: bool = False, address: str = "replay"):
+        super().__init__()
+        self.address = address
+        self.original_timing = original_timing
+        self.responses: dict[int, deque[Response]] = {}
+        for r in responses:
+            self.responses.setdefault(r.command, deque()).append(r)
+        self._sending: asyncio.Task[None] | None = None
+
+    @classmethod
+    def from_capture(cls, path: Path, original_timing: bool = False, address: str | None = None) -> "ReplayRing":
+        """address is the ring the capture came from, the file name stands in for it if it isn't known"""
+        packets = read_capture_packets(path)
+        times = read_capture_times(path) if original_timing else None
+        if original_timing and (times is None or len(times) != len(packets)):
+            logger.warning(f"{path} has no matching packet times, replaying as fast as possible")
+            times = None
+            original_timing = False
+        return cls(split_responses(packets, times), original_timing=original_timing, address=address or path.stem)
+
+    def remaining(self, command: int) -> int:
+        """How many responses to command haven't been sent yet"""
+        return len(self.responses.get(command, ()))
+
+    def respond(self, request: bytearray) -> list[bytearray]:
+        response = self._next_response(request)
+        return response.packets if response is not None else []
+
+    def _next_response(self, request: bytearray) -> Response | None:
+        queue = self.responses.get(request[0])
+        if not queue:
+            logger.info(f"No captured response left for command {request[0]}")
+            return None
+        return queue.popleft()
+
+    async def write_gatt_char(self, _char: Any, data: bytearray, response: bool = False) -> None:
+        if not self.original_timing:
+            await super().write_gatt_char(_char, data, response)
+            return
+
+        self.written.append(data)
+        next_response = self._next_response(data)
+        if next_response is not None:
+            # keep responses in order even if the client sends its next request before this one is done
+            self._sending = asyncio.create_task(self._send(next_response, self._sending))
+
+    async def _send(self, response: Response, previous: "asyncio.Task[None] | None") -> None:
+        if previous is not None:
+            await previous
+        for delay, p in zip(response.delays, response.packets, strict=True):
+            await asyncio.sleep(delay)
+            self.notify(p)
+
+    async def disconnect(self) -> None:
+        if self._sending is not None:
+            await self._sending
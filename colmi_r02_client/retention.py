@@ -0,0 +1,142 @@
+"""
+Keep databases from growing forever by only keeping raw readings for a while.
+
+Older heart rates and sport details are deleted once their hourly and daily rollups are up to date, so
+`colmi_r02_client.db.aggregate_heart_rates` and friends still answer for whole hours and days after the raw data is
+gone. Deletes happen in batches, each in its own transaction, so a sync can still get in between them. Afterwards the
+freed pages are handed back to the file system with an incremental vacuum and the query planner statistics are
+refreshed with `ANALYZE`.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import db
+
+SECONDS_PER_DAY = 86400
+DEFAULT_RAW_DAYS = 90
+DEFAULT_BATCH_SIZE = 10_000
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class RetentionPolicy:
+    raw_days: int = DEFAULT_RAW_DAYS
+    """Days of raw readings to keep, counting back from the start of today in UTC"""
+    batch_size: int = DEFAULT_BATCH_SIZE
+    """Rows deleted per transaction"""
+
+    def __post_init__(self) -> None:
+        assert self.raw_days >= 1, "raw_days must be at least 1"
+        assert self.batch_size >= 1, "batch_size must be at least 1"
+
+    def cutoff(self, now: datetime) -> int:
+        """Epoch seconds of the oldest raw reading to keep, always the start of a UTC day so rollups are whole"""
+        return int(now.timestamp()) // SECONDS_PER_DAY * SECONDS_PER_DAY - self.raw_days * SECONDS_PER_DAY
+
+
+@dataclass(slots=True)
+class MaintenanceStats:
+    heart_rates: int = 0
+    heart_rate_days: int = 0
+    sport_details: int = 0
+    pages_freed: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Deleted {self.heart_rates} heart rates, {self.heart_rate_days} packed heart rate days and "
+            f"{self.sport_details} sport details, freed {self.pages_freed} pages in {self.seconds:.2f}s"
+        )
+
+
+_PRUNE_SQL = {
+    "heart_rates": (
+        "DELETE FROM heart_rates WHERE heart_rate_id IN "
+        "(SELECT heart_rate_id FROM heart_rates WHERE ring_id = ? AND timestamp < ? LIMIT ?)"
+    ),
+    "heart_rate_days": (
+        "DELETE FROM heart_rate_days WHERE heart_rate_day_id IN "
+        f"(SELECT heart_rate_day_id FROM heart_rate_days WHERE ring_id = ? AND day <= ? - {SECONDS_PER_DAY} LIMIT ?)"
+    ),
+    "sport_details": (
+        "DELETE FROM sport_details WHERE sport_detail_id IN "
+        "(SELECT sport_detail_id FROM sport_details WHERE ring_id = ? AND timestamp < ? LIMIT ?)"
+    ),
+}
+
+
+def _prune(session: Session, table: str, ring_id: int, cutoff: int, batch_size: int) -> int:
+    deleted = 0
+    while True:
+        result = session.connection().exec_driver_sql(_PRUNE_SQL[table], (ring_id, cutoff, batch_size))
+        session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+def apply_retention(session: Session, policy: RetentionPolicy, now: datetime | None = None) -> MaintenanceStats:
+    """Delete raw readings older than the policy allows for every ring, after bringing their rollups up to date"""
+    if now is None:
+        now = datetime.now(tz=timezone.utc)
+    cutoff = policy.cutoff(now)
+    stats = MaintenanceStats()
+    start = time.perf_counter()
+
+    for ring_id in session.scalars(select(db.Ring.ring_id)).all():
+        # recompute from what is about to be deleted, in case it was never rolled up, e.g. synced by an old version
+        db.refresh_rollups(session, ring_id, end=cutoff - 1)
+
+        stats.heart_rates += _prune(session, "heart_rates", ring_id, cutoff, policy.batch_size)
+        stats.heart_rate_days += _prune(session, "heart_rate_days", ring_id, cutoff, policy.batch_size)
+        stats.sport_details += _prune(session, "sport_details", ring_id, cutoff, policy.batch_size)
+        logger.info(f"Pruned ring {ring_id} to {datetime.fromtimestamp(cutoff, timezone.utc)}")
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def incremental_vacuum(session: Session, pages: int | None = None) -> int:
+    """
+    Give up to pages free pages (all of them by default) back to the file system, returns how many were freed.
+
+    Databases created before incremental vacuum was turned on are converted with a one off full VACUUM.
+    """
+    connection = session.connection()
+    if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar_one() != db.AUTO_VACUUM_INCREMENTAL:
+        logger.info("Turning on incremental vacuum, this needs one full VACUUM")
+        before = connection.exec_driver_sql("PRAGMA freelist_count").scalar_one()
+        db.vacuum_database(session)
+        return int(before)
+
+    before = connection.exec_driver_sql("PRAGMA freelist_count").scalar_one()
+    session.commit()
+    # each step of the pragma frees one page and execute only steps once, executescript runs it to the end
+    connection = session.connection()
+    connection.connection.executescript(
+        "PRAGMA incremental_vacuum" if pages is None else f"PRAGMA incremental_vacuum({int(pages)})"
+    )
+    after = connection.exec_driver_sql("PRAGMA freelist_count").scalar_one()
+    session.commit()
+    return int(before - after)
+
+
+def maintain(
+    session: Session, policy: RetentionPolicy, now: datetime | None = None, vacuum_pages: int | None = None
+) -> MaintenanceStats:
+    """Apply the retention policy, refresh the statistics sqlite uses to plan queries and vacuum"""
+    stats = apply_retention(session, policy, now)
+    start = time.perf_counter()
+    session.connection().exec_driver_sql("ANALYZE")
+    session.commit()
+    # after ANALYZE, which frees pages of its own when rewriting the old statistics
+    stats.pages_freed = incremental_vacuum(session, vacuum_pages)
+    stats.seconds += time.perf_counter() - start
+    return stats
@@ -0,0 +1,122 @@
+"""
+Fleet wide queries over a sharded layout: a directory with one database per ring, written by `sync --sharded`.
+
+Each ring having its own file means syncs of different rings never wait on each other's writes, and a ring can be
+backed up, moved or deleted on its own. Questions about the whole fleet are answered in one of two ways:
+
+- `fan_out` runs a function against every shard in a pool of threads, each with its own read only session. sqlite
+  releases the GIL while it works, so shards are queried in parallel, and everything in `colmi_r02_client.db` that
+  reads can be used as is.
+- `attached` ATTACHes shards to an in memory database with temporary views over the same table in every shard, for
+  plain SQL across rings. sqlite limits how many databases can be attached at once, so `fleet_query` runs a query
+  against groups of shards and chains the results, which works for anything grouped by ring.
+
+Packed heart rate days can't be read by sqlite, so the views only include heart rates stored as rows.
+"""
+
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from pathlib import Path
+import sqlite3
+from typing import Any, TypeVar
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import db
+
+T = TypeVar("T")
+
+
+def _attach_limit() -> int:
+    with closing(sqlite3.connect(":memory:")) as connection:
+        return connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+
+
+ATTACH_LIMIT = _attach_limit()
+"""Most databases sqlite will attach at once, 10 unless sqlite was compiled with a different limit"""
+
+FLEET_VIEWS = {
+    "fleet_heart_rates": "SELECT r.address, t.timestamp, t.reading FROM {schema}.heart_rates t",
+    "fleet_sport_details": "SELECT r.address, t.timestamp, t.calories, t.steps, t.distance FROM {schema}.sport_details t",
+    "fleet_heart_rate_hourly": (
+        "SELECT r.address, t.hour, t.min_reading, t.max_reading, t.total_reading, t.readings "
+        "FROM {schema}.heart_rate_hourly t"
+    ),
+    "fleet_sport_detail_daily": (
+        "SELECT r.address, t.day, t.calories, t.steps, t.distance FROM {schema}.sport_detail_daily t"
+    ),
+    "fleet_syncs": "SELECT r.address, t.sync_id, t.timestamp, t.comment FROM {schema}.syncs t",
+}
+"""Temporary views created by `attached`, each one a table from every shard with the address of its ring"""
+
+
+def list_shards(directory: Path) -> list[Path]:
+    return sorted(directory.glob(f"{db.SHARD_PREFIX}*{db.SHARD_SUFFIX}"))
+
+
+def _addresses(session: Session) -> list[str]:
+    return list(session.scalars(select(db.Ring.address).order_by(db.Ring.address)))
+
+
+def fan_out(directory: Path, query: Callable[[Session, str], T], jobs: int | None = None) -> dict[str, T]:
+    """Call query(session, address) for every ring in every shard, jobs shards at a time. Returns results by address"""
+
+    def run(path: Path) -> list[tuple[str, T]]:
+        with read_only(path) as session:
+            return [(address, query(session, address)) for address in _addresses(session)]
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return dict(result for results in pool.map(run, list_shards(directory)) for result in results)
+
+
+@contextmanager
+def read_only(path: Path) -> Iterator[Session]:
+    """
+    A session on a shard that can only read, so nothing is created or migrated, closing the connection when done so
+    file handles don't pile up over many shards
+    """
+    uri = f"{path.absolute().as_uri()}?mode=ro"
+    engine = create_engine("sqlite://", creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False))
+    try:
+        with Session(engine) as session:
+            yield session
+    finally:
+        engine.dispose()
+
+
+@contextmanager
+def attached(shards: Sequence[Path]) -> Iterator[Session]:
+    """A session on an in memory database with shards attached and the `FLEET_VIEWS` over all of them"""
+    assert 0 < len(shards) <= ATTACH_LIMIT, f"sqlite can only attach 1 to {ATTACH_LIMIT} databases at once"
+    engine = create_engine("sqlite://")
+    try:
+        with Session(engine) as session:
+            connection = session.connection()
+            for i, path in enumerate(shards):
+                connection.exec_driver_sql(f"ATTACH DATABASE ? AS shard_{i}", (str(path),))
+            for view, sql in FLEET_VIEWS.items():
+                selects = [
+                    sql.format(schema=f"shard_{i}") + f" JOIN shard_{i}.rings r ON r.ring_id = t.ring_id"
+                    for i in range(len(shards))
+                ]
+                connection.exec_driver_sql(f"CREATE TEMP VIEW {view} AS {' UNION ALL '.join(selects)}")
+            yield session
+    finally:
+        engine.dispose()
+
+
+def fleet_query(
+    directory: Path, sql: str, params: Sequence[Any] = (), group_size: int = ATTACH_LIMIT
+) -> Iterator[Sequence[Any]]:
+    """
+    Rows from running sql against the `FLEET_VIEWS` of every group of group_size shards.
+
+    Every ring is in exactly one shard, so queries that group by address give the same rows as they would over one
+    database, just not in one overall order.
+    """
+    shards = list_shards(directory)
+    for start in range(0, len(shards), group_size):
+        with attached(shards[start : start + group_size]) as session:
+            yield from session.connection().exec_driver_sql(sql, tuple(params)).all()
@@ -0,0 +1,170 @@
+"""
+A fake ring that answers requests from `colmi_r02_client.client.Client` without any bluetooth.
+
+It stands in for `bleak.BleakClient`, encoding responses from in memory heart rate logs and sport details using the
+same packet layouts the parsers expect. Useful for benchmarks and for testing anything built on top of the client.
+"""
+
+from collections.abc import Callable
+from datetime import date, datetime, timedelta, timezone
+import struct
+from typing import Any
+
+from colmi_r02_client import battery, hr, hr_settings, real_time, set_time, steps
+from colmi_r02_client.packet import make_packet
+
+HEART_RATE_PACKETS = 24
+"""Number of packets the ring uses for a day of heart rate logs, including the two header packets"""
+
+NO_DATA = 255
+
+
+def _to_bcd(b: int) -> int:
+    return ((b // 10) << 4) | (b % 10)
+
+
+def heart_rate_log_packets(log: hr.HeartRateLog | hr.NoData) -> list[bytearray]:
+    """Encode a heart rate log the way the ring sends it"""
+    if isinstance(log, hr.NoData):
+        return [make_packet(hr.CMD_READ_HEART_RATE, bytearray([NO_DATA]))]
+
+    readings = bytes(log.heart_rates).ljust(9 + (HEART_RATE_PACKETS - 2) * 13, b"\x00")
+    packets = [make_packet(hr.CMD_READ_HEART_RATE, bytearray([0, HEART_RATE_PACKETS, log.range]))]
+    day_start = log.day_start
+    if day_start.tzinfo is None:
+        day_start = day_start.replace(tzinfo=timezone.utc)
+    ts = struct.pack("<l", int(day_start.timestamp()))
+    packets.append(make_packet(hr.CMD_READ_HEART_RATE, bytearray([1]) + ts + readings[:9]))
+    for sub_type in range(2, HEART_RATE_PACKETS):
+        offset = 9 + (sub_type - 2) * 13
+        packets.append(make_packet(hr.CMD_READ_HEART_RATE, bytearray([sub_type]) + readings[offset : offset + 13]))
+    return packets
+
+
+def sport_detail_packets(
+    details: list[steps.SportDetail] | steps.NoData, new_calorie_protocol: bool = True
+) -> list[bytearray]:
+    """
+    Encode a day of sport details the way the ring sends it.
+
+    With the new calorie protocol the ring sends calories divided by 10, so they should be multiples of 10.
+    """
+    if isinstance(details, steps.NoData) or len(details) == 0:
+        return [make_packet(steps.CMD_GET_STEP_SOMEDAY, bytearray([NO_DATA]))]
+
+    packets = [
+        make_packet(steps.CMD_GET_STEP_SOMEDAY, bytearray([240, len(details), 1 if new_calorie_protocol else 0])),
+    ]
+    for i, detail in enumerate(details):
+        calories = detail.calories // 10 if new_calorie_protocol else detail.calories
+        sub_data = bytearray(
+            [
+                _to_bcd(detail.year - 2000),
+                _to_bcd(detail.month),
+                _to_bcd(detail.day),
+                detail.time_index,
+                i,
+                len(details),
+            ]
+        )
+        sub_data += struct.pack("<HHH", calories, detail.steps, detail.distance)
+        packets.append(make_packet(steps.CMD_GET_STEP_SOMEDAY, sub_data))
+    return packets
+
+
+class _Characteristic:
+    def __init__(self, uuid: str):
+        self.uuid = uuid
+
+
+class _Service:
+    def get_characteristic(self, uuid: str) -> _Characteristic:
+        return _Characteristic(uuid)
+
+
+class _Services:
+    def get_service(self, _uuid: str) -> _Service:
+        return _Service()
+
+
+class FakeBleakClient:
+    """
+    The parts of `bleak.BleakClient` that `colmi_r02_client.client.Client` uses, answering requests with `respond`.
+
+    Responses are delivered synchronously from write_gatt_char, so they are already waiting in the client's queues when
+    it starts waiting for them.
+    """
+
+    def __init__(self) -> None:
+        self.services = _Services()
+        self.written: list[bytearray] = []
+        self._callback: Callable[[Any, bytearray], None] | None = None
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def start_notify(self, _uuid: str, callback: Callable[[Any, bytearray], None]) -> None:
+        self._callback = callback
+
+    async def read_gatt_char(self, char: Any) -> bytearray:
+        return bytearray(b"simulated")
+
+    async def write_gatt_char(self, _char: Any, data: bytearray, response: bool = False) -> None:
+        self.written.append(data)
+        for packet in self.respond(data):
+            self.notify(packet)
+
+    def notify(self, packet: bytearray) -> None:
+        assert self._callback is not None, "start_notify hasn't been called"
+        self._callback(None, packet)
+
+    def respond(self, request: bytearray) -> list[bytearray]:
+        """Packets to send back for request, in order. Overridden by subclasses, a ring that never answers by default"""
+        return []
+
+
+class SimulatedRing(FakeBleakClient):
+    """Drop in replacement for `bleak.BleakClient` backed by in memory data."""
+
+    def __init__(
+        self,
+        heart_rates: dict[date, hr.HeartRateLog] | None = None,
+        sport_details: dict[date, list[steps.SportDetail]] | None = None,
+        today: date | None = None,
+        new_calorie_protocol: bool = True,
+        real_time_readings: dict[real_time.RealTimeReading, list[int]] | None = None,
+    ):
+        """
+        real_time_readings are sent all at once when that reading is started, and only once, after which the ring goes
+        quiet as if it was out of range.
+        """
+        super().__init__()
+        self.heart_rates = heart_rates if heart_rates is not None else {}
+        self.sport_details = sport_details if sport_details is not None else {}
+        self.today = today
+        self.new_calorie_protocol = new_calorie_protocol
+        self.real_time_readings = real_time_readings if real_time_readings is not None else {}
+
+    def respond(self, request: bytearray) -> list[bytearray]:
+        command = request[0]
+        if command == battery.CMD_BATTERY:
+            return [make_packet(battery.CMD_BATTERY, bytearray([100, 0]))]
+        if command == hr.CMD_READ_HEART_RATE:
+            day = datetime.fromtimestamp(struct.unpack_from("<L", request, 1)[0], timezone.utc).date()
+            return heart_rate_log_packets(self.heart_rates.get(day, hr.NoData()))
+        if command == steps.CMD_GET_STEP_SOMEDAY:
+            today = self.today if self.today is not None else datetime.now(timezone.utc).date()
+            day = today - timedelta(days=request[1])
+            return sport_detail_packets(self.sport_details.get(day, steps.NoData()), self.new_calorie_protocol)
+        if command == set_time.CMD_SET_TIME:
+            return [make_packet(set_time.CMD_SET_TIME)]
+        if command == real_time.CMD_START_REAL_TIME and request[2] == real_time.Action.START:
+            kind = real_time.RealTimeReading(request[1])
+            readings = self.real_time_readings.pop(kind, [])
+            return [make_packet(real_time.CMD_START_REAL_TIME, bytearray([kind, 0, reading])) for reading in readings]
+        if command == hr_settings.CMD_HEART_RATE_LOG_SETTINGS:
+            return [make_packet(hr_settings.CMD_HEART_RATE_LOG_SETTINGS, bytearray([1, 1, 5]))]
+        return []
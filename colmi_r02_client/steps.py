@@ -1,10 +1,15 @@
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+import logging
 
-from colmi_r02_client.packet import make_packet
+from colmi_r02_client.packet import IncompleteTransfer, Packet, make_packet
 
 CMD_GET_STEP_SOMEDAY = 67  # 0x43
 
+logger = logging.getLogger(__name__)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 
 def read_steps_packet(day_offset: int = 0) -> bytearray:
     """
@@ -22,7 +27,7 @@ def read_steps_packet(day_offset: int = 0) -> bytearray:
     return make_packet(CMD_GET_STEP_SOMEDAY, sub_data)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SportDetail:
     year: int
     month: int
@@ -36,6 +41,7 @@ class SportDetail:
 
     @property
     def timestamp(self) -> datetime:
+        """Start of the 15 minute interval"""
         return datetime(
             year=self.year,
             month=self.month,
@@ -45,6 +51,11 @@ class SportDetail:
             tzinfo=timezone.utc,
         )
 
+    @property
+    def epoch(self) -> int:
+        """Start of the 15 minute interval in seconds since the epoch, cheaper than building timestamp"""
+        return (date(self.year, self.month, self.day).toordinal() - _EPOCH_ORDINAL) * 86400 + self.time_index * 900
+
 
 class NoData:
     """Returned when there's no heart rate data"""
@@ -61,6 +72,10 @@ class SportDetailParser:
     bytearray(b'C#\x08\x13\x18\x02\x058\x04\xe1\x00\x95\x00\x00\x00R')
     bytearray(b'C#\x08\x13\x1c\x03\x05\x05\x02l\x00H\x00\x00\x00`')
     bytearray(b'C#\x08\x13L\x04\x05\xef\x01c\x00D\x00\x00\x00m')
+
+    byte 5 is the index of the detail and byte 6 is how many details there are in total. If an index is skipped the
+    whole day is abandoned and an IncompleteTransfer is returned, the remaining packets are ignored until the next
+    header (byte 1 is 240).
     """
 
     def __init__(self):
@@ -70,8 +85,9 @@ class SportDetailParser:
         self.new_calorie_protocol = False
         self.index = 0
         self.details: list[SportDetail] = []
+        self._discarding = False
 
-    def parse(self, packet: bytearray) -> list[SportDetail] | None | NoData:
+    def parse(self, packet: Packet) -> list[SportDetail] | None | NoData | IncompleteTransfer:
         assert len(packet) == 16
         assert packet[0] == CMD_GET_STEP_SOMEDAY
 
@@ -79,12 +95,25 @@ class SportDetailParser:
             self.reset()
             return NoData()
 
-        if self.index == 0 and packet[1] == 240:
+        if packet[1] == 240:
+            self.reset()
             if packet[3] == 1:
                 self.new_calorie_protocol = True
             self.index += 1
             return None
 
+        if self._discarding:
+            return None
+
+        # index counts the header, details are numbered from 0
+        expected = self.index - 1
+        if self.index == 0 or packet[5] != expected or packet[5] >= packet[6]:
+            lost = max(packet[5] - expected, 1)
+            logger.warning(f"Sport details lost {lost} packet(s), expected {expected} got {packet[5]} of {packet[6]}")
+            self.reset()
+            self._discarding = True
+            return IncompleteTransfer(CMD_GET_STEP_SOMEDAY, lost)
+
         year = bcd_to_decimal(packet[1]) + 2000
         month = bcd_to_decimal(packet[2])
         day = bcd_to_decimal(packet[3])
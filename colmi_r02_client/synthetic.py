@@ -0,0 +1,182 @@
+"""
+Generate realistic looking data for load testing syncs, queries and exports.
+
+Everything is derived from a seed, so the same arguments always produce the same `FullData`, packets and capture
+files. Days follow a rough daily rhythm: a lower heart rate and no steps overnight, walking during the day, the odd
+workout, the ring being taken off for a while and some days with no data at all. The last day of each ring can be cut
+short to look like a sync done partway through today.
+"""
+
+from array import array
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import math
+from pathlib import Path
+import random
+
+from colmi_r02_client import hr, steps
+from colmi_r02_client.client import FullData
+from colmi_r02_client.decoder import CAPTURE_SEPARATOR
+from colmi_r02_client.simulator import heart_rate_log_packets, sport_detail_packets
+
+HEART_RATE_INTERVAL = 5
+SLOTS_PER_DAY = hr.MINUTES_PER_DAY // HEART_RATE_INTERVAL
+SPORT_SLOTS_PER_DAY = 96
+"""Sport details are logged in 15 minute slots"""
+
+
+@dataclass(frozen=True, slots=True)
+class SyntheticRing:
+    """Per ring traits, picked from the seed, so a fleet of rings doesn't all look the same"""
+
+    address: str
+    resting_hr: int
+    daily_steps: int
+    no_data_chance: float
+
+
+def make_ring(rng: random.Random, index: int) -> SyntheticRing:
+    return SyntheticRing(
+        address=f"70:CB:0D:D0:{index // 256:02X}:{index % 256:02X}",
+        resting_hr=rng.randint(50, 75),
+        daily_steps=rng.randint(3_000, 15_000),
+        no_data_chance=rng.uniform(0.01, 0.08),
+    )
+
+
+def _activity(minute: int) -> float:
+    """How active someone is at this time of day, 0 while asleep peaking around 1 at midday"""
+    hour = minute / 60
+    if hour < 7 or hour >= 23:
+        return 0.0
+    return math.sin(math.pi * (hour - 7) / 16)
+
+
+def _maybe_range(rng: random.Random, chance: float, starts: range, length: int) -> range:
+    """With probability chance, length slots starting somewhere in starts, otherwise no slots"""
+    if rng.random() >= chance:
+        return range(0)
+    start = rng.choice(starts)
+    return range(start, start + length)
+
+
+def heart_rate_log(
+    rng: random.Random, ring: SyntheticRing, day: datetime, last_slot: int = SLOTS_PER_DAY
+) -> hr.HeartRateLog | hr.NoData:
+    """One day of 5 minute heart rate readings, slots from last_slot on are left empty"""
+    if rng.random() < ring.no_data_chance:
+        return hr.NoData()
+
+    workout = _maybe_range(rng, 0.3, range(7 * 12, 21 * 12), 12)
+    off = _maybe_range(rng, 0.2, range(SLOTS_PER_DAY), rng.randint(3, 36))
+
+    readings = array("B", bytes(SLOTS_PER_DAY))
+    for slot in range(last_slot):
+        if slot in off:
+            continue
+        bpm = ring.resting_hr + 25 * _activity(slot * HEART_RATE_INTERVAL) + rng.gauss(0, 4)
+        if slot in workout:
+            bpm += rng.uniform(40, 80)
+        readings[slot] = max(35, min(200, round(bpm)))
+
+    return hr.HeartRateLog(heart_rates=readings, timestamp=day, size=24, index=295, range=HEART_RATE_INTERVAL)
+
+
+def sport_details(
+    rng: random.Random, ring: SyntheticRing, day: datetime, last_slot: int = SPORT_SLOTS_PER_DAY
+) -> list[steps.SportDetail] | steps.NoData:
+    """One day of 15 minute step, calorie and distance totals, only including slots where the wearer moved"""
+    if rng.random() < ring.no_data_chance:
+        return steps.NoData()
+
+    scale = ring.daily_steps / 40
+    stride = rng.uniform(0.65, 0.8)
+    details = []
+    for slot in range(last_slot):
+        activity = _activity(slot * 15)
+        if activity == 0 or rng.random() > 0.3 + activity:
+            continue
+        step_count = min(int(rng.expovariate(1 / (scale * activity))), 3_000)
+        if step_count == 0:
+            continue
+        # multiples of 10 so the details survive being sent with the new calorie protocol, which divides by 10
+        calories = min(step_count * rng.randint(3, 5), 6_553) * 10
+        details.append(
+            steps.SportDetail(
+                year=day.year,
+                month=day.month,
+                day=day.day,
+                time_index=slot,
+                calories=calories,
+                steps=step_count,
+                distance=int(step_count * stride),
+            )
+        )
+
+    return details if details else steps.NoData()
+
+
+def generate(
+    seed: int = 0,
+    rings: int = 1,
+    years: float = 1,
+    end: datetime | None = None,
+    partial_last_day: bool = True,
+) -> list[FullData]:
+    """
+    Generate years of data for each of rings, ending on the day of end.
+
+    With partial_last_day the final day stops at the time of day of end, like a sync run partway through today.
+    """
+    if end is None:
+        end = datetime(2024, 12, 31, 18, 30, tzinfo=timezone.utc)
+    end_day = end.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = max(1, round(years * 365))
+    dates = [end_day - timedelta(days=i) for i in reversed(range(days))]
+    minute_of_day = (end - end_day).seconds // 60 if partial_last_day else hr.MINUTES_PER_DAY
+
+    rng = random.Random(seed)
+    results = []
+    for i in range(rings):
+        ring = make_ring(rng, i)
+        heart_rates: list[hr.HeartRateLog | hr.NoData] = []
+        details: list[list[steps.SportDetail] | steps.NoData] = []
+        for d in dates:
+            is_last = d == end_day
+            hr_slots = minute_of_day // HEART_RATE_INTERVAL if is_last else SLOTS_PER_DAY
+            sport_slots = minute_of_day // 15 if is_last else SPORT_SLOTS_PER_DAY
+            heart_rates.append(heart_rate_log(rng, ring, d, hr_slots))
+            details.append(sport_details(rng, ring, d, sport_slots))
+        results.append(FullData(ring.address, heart_rates=heart_rates, sport_details=details))
+    return results
+
+
+def packets(data: FullData, new_calorie_protocol: bool = True) -> Iterator[bytearray]:
+    """The packets the ring would send for data, in the order `Client.get_full_data` asks for them"""
+    for log, day in zip(data.heart_rates, data.sport_details, strict=True):
+        yield from heart_rate_log_packets(log)
+        yield from sport_detail_packets(day, new_calorie_protocol)
+
+
+def write_capture(path: Path, data: FullData, new_calorie_protocol: bool = True) -> int:
+    """Write the packets for data in the same format as `--record`, returns how many were written"""
+    count = 0
+    with path.open("wb") as f:
+        for p in packets(data, new_calorie_protocol):
+            f.write(p)
+            f.write(CAPTURE_SEPARATOR)
+            count += 1
+    return count
+
+
+def write_captures(directory: Path, fleet: list[FullData], seed: int = 0, old_protocol_chance: float = 0.2) -> list[Path]:
+    """Write a capture file per ring into directory, with some rings using the old calorie protocol"""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for data in fleet:
+        path = directory / f"colmi_response_capture_{data.address.replace(':', '')}.bin"
+        write_capture(path, data, new_calorie_protocol=rng.random() >= old_protocol_chance)
+        paths.append(path)
+    return paths
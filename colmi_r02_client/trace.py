@@ -0,0 +1,70 @@
+"""
+Keep the last few packets received from the ring in memory, so there's something to look at when things go wrong.
+
+Recording a packet is a copy into a preallocated buffer and a checksum, there's no formatting or logging. The client
+dumps the buffer to a file when a packet fails an assertion, a parser raises or a request times out.
+"""
+
+from array import array
+from datetime import datetime, timezone
+import logging
+from pathlib import Path
+import time
+
+from colmi_r02_client.packet import checksum
+
+PACKET_SIZE = 16
+
+logger = logging.getLogger(__name__)
+
+
+class PacketTrace:
+    def __init__(self, capacity: int = 256):
+        assert capacity > 0, "Capacity must be positive"
+        self.capacity = capacity
+        self._packets = bytearray(capacity * PACKET_SIZE)
+        self._lengths = bytearray(capacity)
+        self._times = array("d", bytes(8 * capacity))
+        self.recorded = 0
+        """Total number of packets ever recorded"""
+        self.corrupt: dict[int, int] = {}
+        """Number of packets with a bad checksum, per command"""
+
+    def record(self, packet: bytearray | memoryview) -> bool:
+        """Save packet in the buffer, overwriting the oldest one if full. Returns False if the checksum is wrong."""
+        slot = self.recorded % self.capacity
+        length = min(len(packet), PACKET_SIZE)
+        offset = slot * PACKET_SIZE
+        self._packets[offset : offset + length] = packet[:length]
+        self._lengths[slot] = length
+        self._times[slot] = time.time()
+        self.recorded += 1
+
+        if len(packet) != PACKET_SIZE or checksum(packet[:-1]) != packet[-1]:
+            command = packet[0] if length else -1
+            self.corrupt[command] = self.corrupt.get(command, 0) + 1
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return min(self.recorded, self.capacity)
+
+    def packets(self) -> list[tuple[float, bytes]]:
+        """(unix timestamp, packet) for every packet in the buffer, oldest first"""
+        result = []
+        for i in range(self.recorded - len(self), self.recorded):
+            slot = i % self.capacity
+            offset = slot * PACKET_SIZE
+            result.append((self._times[slot], bytes(self._packets[offset : offset + self._lengths[slot]])))
+        return result
+
+    def dump(self, directory: Path, reason: str) -> Path:
+        """Write the buffer to a new text file in directory, one packet per line as time and hex"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"packet_trace_{time.time_ns()}_{reason}.txt"
+        with path.open("w") as f:
+            f.write(f"# {reason}, {self.recorded} packets recorded, corrupt per command: {self.corrupt}\n")
+            for ts, packet in self.packets():
+                f.write(f"{datetime.fromtimestamp(ts, timezone.utc).isoformat()} {packet.hex()}\n")
+        logger.warning(f"Wrote last {len(self)} packets to {path}")
+        return path
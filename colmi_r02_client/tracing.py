@@ -0,0 +1,55 @@
+"""
+Optional spans around the slow parts of a sync: connecting, each request to the ring and each database phase.
+
+Spans are written as Chrome trace event JSON, which can be opened in https://ui.perfetto.dev or chrome://tracing
+without running any collector.
+
+Tracing is disabled by default, and a disabled `Tracer` doesn't record or time anything.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.events: list[dict[str, Any]] = []
+        self._origin = time.perf_counter_ns()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        """Record how long the body takes as a complete ("X") event, args are shown in the trace viewer"""
+        if not self.enabled:
+            yield
+            return
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            self.events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start,
+                    "dur": self._now_us() - start,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": {k: str(v) for k, v in args.items()},
+                }
+            )
+
+    def to_json(self) -> str:
+        return json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"})
+
+    def write(self, path: Path) -> None:
+        path.write_text(self.to_json())
@@ -0,0 +1,326 @@
+"""
+One writer for a database that any number of coroutines can hand data to, instead of each calling
+`colmi_r02_client.db.full_sync` and fighting over sqlite's write lock.
+
+Producers (syncs of different rings, imports, real time recorders) call `DatabaseWriter.write`, or `submit` to carry on
+without waiting for the data to be stored, and `submit_real_time_block` for blocks of real time readings. Everything
+queued up while the previous transaction was being written goes into the next transaction together, so the cost of a
+commit is shared. Writing happens on a thread of its own, which opens the database and is the only one ever using its
+session, so the event loop keeps serving the rings meanwhile. That also matters for in memory databases, which sqlite
+keeps per connection and SQLAlchemy per thread.
+
+The queue is bounded. When it is full the writer can't keep up: `submit` waits for room, logging a warning and counting
+it in `WriterStats.waits` and the `db_writer_backpressure_total` metric, and `submit_nowait` raises `WriterBusy` so the
+producer can decide what to do, e.g. slow down or drop real time readings.
+
+All of this is within one process, other processes should hand their data to it rather than write to the file too.
+"""
+
+import asyncio
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+import logging
+from pathlib import Path
+import time
+from types import TracebackType
+
+from sqlalchemy.orm import Session
+
+from colmi_r02_client import db
+from colmi_r02_client.client import FullData
+from colmi_r02_client.columnar import ColumnarFullData
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.tracing import Tracer
+
+DEFAULT_MAX_QUEUED = 64
+DEFAULT_MAX_BATCH = 32
+
+logger = logging.getLogger(__name__)
+
+
+class WriterBusy(Exception):
+    """The writer's queue is full"""
+
+
+@dataclass(slots=True)
+class _Job:
+    address: str
+    write: Callable[[Session], int]
+    """Writes to the session without committing, returns the number of rows"""
+    done: "asyncio.Future[int]" = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+@dataclass(slots=True)
+class WriterStats:
+    submitted: int = 0
+    written: int = 0
+    failed: int = 0
+    transactions: int = 0
+    rows: int = 0
+    waits: int = 0
+    """Submits that had to wait for room in the queue"""
+    rejected: int = 0
+    """Submits turned away with WriterBusy"""
+    max_queued: int = 0
+    """Most jobs seen waiting at once"""
+
+    def summary(self) -> str:
+        return (
+            f"Made {self.written} writes ({self.rows} rows) in {self.transactions} transactions, {self.failed} failed, "
+            f"{self.waits} waited for room and {self.rejected} were turned away, at most {self.max_queued} queued"
+        )
+
+
+class DatabaseWriter:
+    """
+    Writes to the database at path, in memory if it is None, opened like `colmi_r02_client.db.get_db_session` when
+    started. Use as an async context manager or call `start` and `close`. Closing waits for everything already submitted
+    to be written.
+    """
+
+    def __init__(
+        self,
+        path: Path | None,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        metrics: Metrics | None = None,
+        tracer: Tracer | None = None,
+    ):
+        assert max_queued >= 1, "max_queued must be at least 1"
+        assert max_batch >= 1, "max_batch must be at least 1"
+        self.path = path
+        self.session: Session | None = None
+        """Only for use on the writer thread, e.g. by jobs"""
+        self.max_batch = max_batch
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.stats = WriterStats()
+        self._queue: asyncio.Queue[_Job | None] = asyncio.Queue(maxsize=max_queued)
+        self._task: asyncio.Task[None] | None = None
+        # one thread, so the session is never used by two at once
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="colmi-db-writer")
+
+    async def __aenter__(self) -> "DatabaseWriter":
+        self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        assert self._task is None, "writer already started"
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        if self.session is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.session.close)
+        self._executor.shutdown()
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def _sync_job(
+        self,
+        data: FullData | ColumnarFullData,
+        timestamp: datetime | None,
+        comment: str | None,
+        heart_rate_storage: str,
+    ) -> _Job:
+        assert heart_rate_storage in db.HEART_RATE_STORAGE, f"heart_rate_storage must be one of {db.HEART_RATE_STORAGE}"
+        return _Job(
+            data.address,
+            partial(
+                db.full_sync,
+                data=data,
+                metrics=self.metrics,
+                tracer=self.tracer,
+                timestamp=timestamp,
+                comment=comment,
+                heart_rate_storage=heart_rate_storage,
+                commit=False,
+            ),
+        )
+
+    async def _submit(self, job: _Job) -> "asyncio.Future[int]":
+        assert self._task is not None, "writer isn't running"
+        if self._queue.full():
+            self.stats.waits += 1
+            self.metrics.inc("db_writer_backpressure_total", kind="wait")
+            logger.warning(f"Database writer is behind, {self._queue.qsize()} writes queued, waiting for room")
+            start = time.perf_counter()
+            await self._queue.put(job)
+            self.metrics.observe("db_writer_wait_seconds", time.perf_counter() - start)
+        else:
+            self._queue.put_nowait(job)
+        self._queued()
+        return job.done
+
+    def _submit_nowait(self, job: _Job) -> "asyncio.Future[int]":
+        assert self._task is not None, "writer isn't running"
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            self.metrics.inc("db_writer_backpressure_total", kind="rejected")
+            raise WriterBusy(f"{self._queue.qsize()} writes already queued") from None
+        self._queued()
+        return job.done
+
+    def _queued(self) -> None:
+        self.stats.submitted += 1
+        self.stats.max_queued = max(self.stats.max_queued, self._queue.qsize())
+        self.metrics.set("db_writer_queued", self._queue.qsize())
+
+    async def submit(
+        self,
+        data: FullData | ColumnarFullData,
+        timestamp: datetime | None = None,
+        comment: str | None = None,
+        heart_rate_storage: str = db.HEART_RATE_ROWS,
+    ) -> "asyncio.Future[int]":
+        """
+        Queue data to be written like `colmi_r02_client.db.full_sync`, waiting for room if the queue is full. Returns a
+        future for the number of rows written.
+        """
+        return await self._submit(self._sync_job(data, timestamp, comment, heart_rate_storage))
+
+    def submit_nowait(
+        self,
+        data: FullData | ColumnarFullData,
+        timestamp: datetime | None = None,
+        comment: str | None = None,
+        heart_rate_storage: str = db.HEART_RATE_ROWS,
+    ) -> "asyncio.Future[int]":
+        """Like `submit`, but raises WriterBusy instead of waiting when the queue is full"""
+        return self._submit_nowait(self._sync_job(data, timestamp, comment, heart_rate_storage))
+
+    async def write(
+        self,
+        data: FullData | ColumnarFullData,
+        timestamp: datetime | None = None,
+        comment: str | None = None,
+        heart_rate_storage: str = db.HEART_RATE_ROWS,
+    ) -> int:
+        """Queue data and wait for it to be written, returns the number of rows written"""
+        return await (await self.submit(data, timestamp, comment, heart_rate_storage))
+
+    async def submit_real_time_block(
+        self, address: str, kind: int, timestamps: Sequence[int], readings: Sequence[int]
+    ) -> "asyncio.Future[int]":
+        """Queue a block of real time readings to be written like `colmi_r02_client.db.add_real_time_block`"""
+        return await self._submit(
+            _Job(
+                address,
+                partial(
+                    db.add_real_time_block,
+                    address=address,
+                    kind=kind,
+                    timestamps=timestamps,
+                    readings=readings,
+                    commit=False,
+                ),
+            )
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        failed: Exception | None = None
+        try:
+            self.session = await loop.run_in_executor(self._executor, db.get_db_session, self.path)
+        except Exception as e:
+            logger.exception(f"Opening {self.path} failed, every write will fail")
+            failed = e
+        closing = False
+        while not closing:
+            first = await self._queue.get()
+            jobs: list[_Job] = []
+            if first is None:
+                closing = True
+            else:
+                jobs.append(first)
+            # take whatever else is already waiting, up to max_batch
+            while not closing and len(jobs) < self.max_batch and not self._queue.empty():
+                job = self._queue.get_nowait()
+                if job is None:
+                    closing = True
+                else:
+                    jobs.append(job)
+            self.metrics.set("db_writer_queued", self._queue.qsize())
+            if not jobs:
+                continue
+
+            results: list[int | BaseException]
+            if failed is not None:
+                results = [failed] * len(jobs)
+            else:
+                try:
+                    results = await loop.run_in_executor(self._executor, self._write, jobs)
+                except Exception as e:
+                    # e.g. the ring couldn't be created, fail the whole batch but keep writing
+                    logger.exception(f"Writing {len(jobs)} batches failed")
+                    results = [e] * len(jobs)
+            for job, result in zip(jobs, results, strict=True):
+                if isinstance(result, BaseException):
+                    self.stats.failed += 1
+                    if not job.done.cancelled():
+                        job.done.set_exception(result)
+                else:
+                    self.stats.written += 1
+                    self.stats.rows += result
+                    if not job.done.cancelled():
+                        job.done.set_result(result)
+
+    def _write(self, jobs: list[_Job]) -> list[int | BaseException]:
+        """Write jobs in one transaction, or one at a time if that fails so only the bad ones fail. On the writer thread"""
+        assert self.session is not None
+        start = time.perf_counter()
+        transactions = self.stats.transactions
+        with self.tracer.span("db_writer_batch", writes=len(jobs)):
+            try:
+                for address in {job.address for job in jobs}:
+                    # creating a ring commits, so do that before the transaction
+                    db.create_or_find_ring(self.session, address)
+            except Exception:
+                self.session.rollback()
+                raise
+            if len(jobs) == 1:
+                results = [self._write_one(jobs[0])]
+            else:
+                try:
+                    results = [job.write(self.session) for job in jobs]
+                    self.session.commit()
+                    self.stats.transactions += 1
+                except Exception:
+                    self.session.rollback()
+                    logger.exception(f"Writing {len(jobs)} batches together failed, writing them one at a time")
+                    results = [self._write_one(job) for job in jobs]
+
+        self.metrics.inc("db_writer_transactions_total", self.stats.transactions - transactions)
+        self.metrics.observe("db_writer_batch_seconds", time.perf_counter() - start)
+        self.metrics.set("db_writer_batch_size", len(jobs))
+        return results
+
+    def _write_one(self, job: _Job) -> int | BaseException:
+        assert self.session is not None
+        try:
+            rows = job.write(self.session)
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            return e
+        self.stats.transactions += 1
+        return rows
@@ -8,16 +8,55 @@ CREATE TABLE rings (
 CREATE TABLE syncs (
 	sync_id INTEGER NOT NULL, 
 	comment VARCHAR, 
+	source VARCHAR, 
+	source_sync_id INTEGER, 
 	ring_id INTEGER NOT NULL, 
-	timestamp DATETIME NOT NULL, 
+	timestamp INTEGER NOT NULL, 
 	PRIMARY KEY (sync_id), 
 	FOREIGN KEY(ring_id) REFERENCES rings (ring_id)
 )
 
+CREATE TABLE heart_rate_hourly (
+	heart_rate_hourly_id INTEGER NOT NULL, 
+	min_reading INTEGER NOT NULL, 
+	max_reading INTEGER NOT NULL, 
+	total_reading INTEGER NOT NULL, 
+	readings INTEGER NOT NULL, 
+	hour INTEGER NOT NULL, 
+	ring_id INTEGER NOT NULL, 
+	PRIMARY KEY (heart_rate_hourly_id), 
+	UNIQUE (ring_id, hour), 
+	FOREIGN KEY(ring_id) REFERENCES rings (ring_id)
+)
+
+CREATE TABLE sport_detail_daily (
+	sport_detail_daily_id INTEGER NOT NULL, 
+	calories INTEGER NOT NULL, 
+	steps INTEGER NOT NULL, 
+	distance INTEGER NOT NULL, 
+	day INTEGER NOT NULL, 
+	ring_id INTEGER NOT NULL, 
+	PRIMARY KEY (sport_detail_daily_id), 
+	UNIQUE (ring_id, day), 
+	FOREIGN KEY(ring_id) REFERENCES rings (ring_id)
+)
+
+CREATE TABLE real_time_blocks (
+	real_time_block_id INTEGER NOT NULL, 
+	kind INTEGER NOT NULL, 
+	count INTEGER NOT NULL, 
+	readings BLOB NOT NULL, 
+	start INTEGER NOT NULL, 
+	"end" INTEGER NOT NULL, 
+	ring_id INTEGER NOT NULL, 
+	PRIMARY KEY (real_time_block_id), 
+	FOREIGN KEY(ring_id) REFERENCES rings (ring_id)
+)
+
 CREATE TABLE heart_rates (
 	heart_rate_id INTEGER NOT NULL, 
 	reading INTEGER NOT NULL, 
-	timestamp DATETIME NOT NULL, 
+	timestamp INTEGER NOT NULL, 
 	ring_id INTEGER NOT NULL, 
 	sync_id INTEGER NOT NULL, 
 	PRIMARY KEY (heart_rate_id), 
@@ -31,11 +70,26 @@ CREATE TABLE sport_details (
 	calories INTEGER NOT NULL, 
 	steps INTEGER NOT NULL, 
 	distance INTEGER NOT NULL, 
-	timestamp DATETIME NOT NULL, 
+	timestamp INTEGER NOT NULL, 
 	ring_id INTEGER NOT NULL, 
 	sync_id INTEGER NOT NULL, 
 	PRIMARY KEY (sport_detail_id), 
 	UNIQUE (ring_id, timestamp), 
 	FOREIGN KEY(ring_id) REFERENCES rings (ring_id), 
 	FOREIGN KEY(sync_id) REFERENCES syncs (sync_id)
+)
+
+CREATE TABLE heart_rate_days (
+	heart_rate_day_id INTEGER NOT NULL, 
+	interval INTEGER NOT NULL, 
+	readings BLOB NOT NULL, 
+	mask BLOB NOT NULL, 
+	encoding INTEGER NOT NULL, 
+	day INTEGER NOT NULL, 
+	ring_id INTEGER NOT NULL, 
+	sync_id INTEGER NOT NULL, 
+	PRIMARY KEY (heart_rate_day_id), 
+	UNIQUE (ring_id, day), 
+	FOREIGN KEY(ring_id) REFERENCES rings (ring_id), 
+	FOREIGN KEY(sync_id) REFERENCES syncs (sync_id)
 )
\ No newline at end of file
@@ -0,0 +1,48 @@
+from asyncclick.testing import CliRunner
+
+from colmi_r02_client import bench
+from colmi_r02_client.cli import util
+
+
+def test_regressions():
+    results = [bench.BenchResult("fast", 1.0, 1), bench.BenchResult("slow", 2.0, 1), bench.BenchResult("new", 5.0, 1)]
+    baseline = {"fast": 1.0, "slow": 1.0}
+
+    slower = bench.regressions(results, baseline, threshold=1.5)
+
+    assert len(slower) == 1
+    assert slower[0].startswith("slow took 2s")
+
+
+def test_baseline_round_trip(tmp_path):
+    path = tmp_path / "baseline.json"
+    bench.save_baseline(path, [bench.BenchResult("checksum", 0.5, 10)])
+
+    assert bench.load_baseline(path) == {"checksum": 0.5}
+
+
+async def test_run_only():
+    results = await bench.run(["checksum", "get_full_data"], repeat=1, min_time=0)
+
+    assert [r.name for r in results] == ["checksum", "get_full_data_30_days"]
+    assert all(r.seconds > 0 for r in results)
+
+
+async def test_every_parser_has_a_benchmark():
+    results = await bench.run(["parse_"], repeat=1, min_time=0)
+
+    assert len(results) == 7
+
+
+async def test_bench_command_fails_when_slower(tmp_path):
+    path = tmp_path / "baseline.json"
+    runner = CliRunner()
+
+    result = await runner.invoke(util, ["bench", "--only=checksum", "--repeat=1", f"--baseline={path}", "--save"])
+    assert result.exit_code == 0, result.output
+    assert "checksum" in bench.load_baseline(path)
+
+    bench.save_baseline(path, [bench.BenchResult("checksum", 1e-12, 1)])
+    result = await runner.invoke(util, ["bench", "--only=checksum", "--repeat=1", f"--baseline={path}"])
+    assert result.exit_code == 1
+    assert "Slower than baseline" in result.output
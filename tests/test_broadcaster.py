@@ -0,0 +1,104 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import cast
+
+from bleak import BleakClient
+
+from colmi_r02_client.broadcaster import Broadcaster
+from colmi_r02_client.client import Client
+from colmi_r02_client.real_time import RealTimeReading
+from colmi_r02_client.recorder import RealTimeRecorder
+from colmi_r02_client.simulator import SimulatedRing
+
+
+async def _until(condition) -> None:
+    while not condition():  # noqa: ASYNC110
+        await asyncio.sleep(0.001)
+
+
+async def test_unix_socket_subscribers(tmp_path: Path):
+    hub = Broadcaster()
+    path = tmp_path / "readings.sock"
+    async with await hub.serve_unix(path):
+        first = await asyncio.open_unix_connection(path)
+        second = await asyncio.open_unix_connection(path)
+        await _until(lambda: hub.subscribers == 2)
+
+        hub.publish(RealTimeReading.HEART_RATE, 1000, 60)
+        hub.publish(RealTimeReading.SPO2, 2000, 98)
+
+        for reader, writer in (first, second):
+            assert json.loads(await reader.readline()) == {"kind": "heart_rate", "timestamp": 1000, "value": 60}
+            assert json.loads(await reader.readline()) == {"kind": "spo2", "timestamp": 2000, "value": 98}
+            writer.close()
+        hub.close()
+
+    assert hub.stats.published == 2
+    assert hub.stats.subscribed == 2
+
+
+async def test_server_sent_events():
+    hub = Broadcaster()
+    async with await hub.serve_sse(0) as server:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+        assert await reader.readline() == b"HTTP/1.1 200 OK\r\n"
+        while (await reader.readline()).strip():
+            pass
+        await _until(lambda: hub.subscribers == 1)
+
+        hub.publish(RealTimeReading.HEART_RATE, 1000, 60)
+
+        assert await reader.readline() == b'data: {"kind": "heart_rate", "timestamp": 1000, "value": 60}\n'
+        assert await reader.readline() == b"\n"
+        writer.close()
+        hub.close()
+
+
+async def test_server_sent_events_not_found():
+    hub = Broadcaster()
+    async with await hub.serve_sse(0) as server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(b"GET /nope HTTP/1.1\r\n\r\n")
+        assert (await reader.readline()).startswith(b"HTTP/1.1 404")
+        writer.close()
+
+
+async def test_slow_subscriber_is_dropped(tmp_path: Path):
+    hub = Broadcaster(buffer_size=16)
+    path = tmp_path / "readings.sock"
+    async with await hub.serve_unix(path):
+        _, slow_writer = await asyncio.open_unix_connection(path)
+        fast_reader, fast_writer = await asyncio.open_unix_connection(path)
+        await _until(lambda: hub.subscribers == 2)
+
+        # the slow subscriber never reads, so once the socket buffers are full it falls behind
+        for i in range(20_000):
+            hub.publish(RealTimeReading.HEART_RATE, i, 60)
+            assert json.loads(await fast_reader.readline())["timestamp"] == i
+
+        assert hub.stats.dropped == 1
+        assert hub.subscribers == 1
+        fast_writer.close()
+        slow_writer.close()
+        hub.close()
+
+
+async def test_recorder_publishes_without_a_database(tmp_path: Path):
+    ring = SimulatedRing(real_time_readings={RealTimeReading.HEART_RATE: [60, 0, 61]})
+    client = Client("ring-1", bleak_client=cast(BleakClient, ring))
+    hub = Broadcaster()
+    path = tmp_path / "readings.sock"
+    async with await hub.serve_unix(path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        await _until(lambda: hub.subscribers == 1)
+
+        recorder = RealTimeRecorder(client, None, max_wait=0.02, reconnect_delay=0.01, listeners=[hub.publish])
+        stats = await recorder.run(0.1)
+
+        assert [json.loads(await reader.readline())["value"] for _ in range(2)] == [60, 61]
+        assert stats.blocks == 0
+        writer.close()
+        hub.close()
@@ -0,0 +1,69 @@
+import pytest
+
+from colmi_r02_client.bus import PacketBus
+
+PACKET = bytearray(b"\x03@\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00C")
+
+
+def test_subscribers_by_command():
+    bus = PacketBus()
+    battery: list[bytes] = []
+    other: list[bytes] = []
+    bus.subscribe(lambda p: battery.append(bytes(p)), 3)
+    bus.subscribe(lambda p: other.append(bytes(p)), 105)
+
+    bus.publish(PACKET)
+
+    assert battery == [bytes(PACKET)]
+    assert other == []
+
+
+def test_every_packet_subscribers_first():
+    bus = PacketBus()
+    calls: list[str] = []
+    bus.subscribe(lambda _: calls.append("battery"), 3)
+    bus.subscribe(lambda _: calls.append("every"))
+
+    bus.publish(PACKET)
+
+    assert calls == ["every", "battery"]
+
+
+def test_read_only_views_of_the_packet():
+    bus = PacketBus()
+    views: list[memoryview] = []
+    bus.subscribe(views.append, 3)
+    bus.subscribe(views.append, 3)
+
+    bus.publish(PACKET)
+
+    assert views[0].readonly
+    assert views[0].obj is PACKET
+    with pytest.raises(TypeError):
+        views[0][1] = 0
+
+
+def test_unhandled():
+    unhandled: list[int] = []
+    bus = PacketBus(unhandled=lambda p: unhandled.append(p[0]))
+    bus.subscribe(lambda _: None)
+    bus.subscribe(lambda _: None, 3)
+
+    bus.publish(PACKET)
+    bus.publish(b"}" + bytes(15))
+
+    assert unhandled == [125]
+
+
+def test_unsubscribe():
+    bus = PacketBus()
+    calls: list[int] = []
+    unsubscribe = bus.subscribe(lambda p: calls.append(p[0]), 3, 105)
+
+    bus.publish(PACKET)
+    unsubscribe()
+    bus.publish(PACKET)
+
+    assert calls == [3]
+    assert not bus.subscribed(3)
+    assert not bus.subscribed(105)
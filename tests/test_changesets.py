@@ -0,0 +1,171 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+import io
+from pathlib import Path
+
+from asyncclick.testing import CliRunner
+import pytest
+from sqlalchemy import func, select
+
+from colmi_r02_client import changesets, db, hr, steps
+from colmi_r02_client.cli import util
+from colmi_r02_client.client import FullData
+
+DAY = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _data(address: str, day: datetime, reading: int, step_count: int) -> FullData:
+    return FullData(
+        address,
+        heart_rates=[hr.HeartRateLog(array("B", [reading] * 24 + [0] * 264), day, 24, 295, 5)],
+        sport_details=[[steps.SportDetail(day.year, day.month, day.day, 0, calories=10, steps=step_count, distance=7)]],
+    )
+
+
+def _changeset(session, source: str = "site-a", since: int = 0) -> tuple[bytes, changesets.ChangesetStats]:
+    out = io.BytesIO()
+    stats = changesets.write_changeset(session, out, source, since)
+    return out.getvalue(), stats
+
+
+def _merge(session, changeset: bytes, local_source: str | None = None) -> changesets.MergeStats:
+    return changesets.merge_changeset(session, io.BytesIO(changeset), local_source)
+
+
+def _contents(session):
+    hr_columns = db.get_heart_rate_columns(session, "ring-1", DAY, DAY + timedelta(days=5))
+    sport_columns = db.get_sport_detail_columns(session, "ring-1", DAY, DAY + timedelta(days=5))
+    hourly = db.aggregate_heart_rates(session, "ring-1", DAY, DAY + timedelta(days=5))
+    return hr_columns, sport_columns, hourly
+
+
+def test_round_trip():
+    source = db.get_db_session()
+    db.full_sync(source, _data("ring-1", DAY, 60, 100), timestamp=DAY, comment="first")
+    db.full_sync(source, _data("ring-1", DAY + timedelta(days=1), 70, 200), heart_rate_storage=db.HEART_RATE_DAYS)
+    changeset, stats = _changeset(source)
+    target = db.get_db_session()
+
+    merged = _merge(target, changeset)
+
+    assert stats.until == 2
+    assert merged.syncs == 2
+    assert merged.heart_rates == 24
+    assert merged.heart_rate_days == 1
+    assert _contents(target) == _contents(source)
+    sync = target.scalars(select(db.Sync).order_by(db.Sync.sync_id)).first()
+    assert sync is not None
+    assert (sync.source, sync.source_sync_id, sync.comment, sync.timestamp) == ("site-a", 1, "first", DAY)
+
+
+def test_merge_is_idempotent():
+    source = db.get_db_session()
+    db.full_sync(source, _data("ring-1", DAY, 60, 100))
+    changeset, _ = _changeset(source)
+    target = db.get_db_session()
+    _merge(target, changeset)
+
+    again = _merge(target, changeset)
+
+    assert again == changesets.MergeStats()
+    assert target.scalars(select(func.count(db.Sync.sync_id))).one() == 1
+    assert _contents(target) == _contents(source)
+
+
+def test_incremental_changesets():
+    source = db.get_db_session()
+    db.full_sync(source, _data("ring-1", DAY, 60, 100))
+    first, stats = _changeset(source)
+    db.full_sync(source, _data("ring-1", DAY + timedelta(days=1), 70, 200))
+
+    second, second_stats = _changeset(source, since=stats.until)
+
+    assert (second_stats.since, second_stats.until) == (1, 2)
+    target = db.get_db_session()
+    assert _merge(target, second).heart_rates == 24
+    assert _merge(target, first).heart_rates == 24
+    assert _contents(target) == _contents(source)
+
+
+def test_sport_details_newest_sync_wins_in_any_order():
+    source = db.get_db_session()
+    db.full_sync(source, _data("ring-1", DAY, 60, 100), timestamp=DAY)
+    old, stats = _changeset(source)
+    db.full_sync(source, _data("ring-1", DAY, 60, 150), timestamp=DAY + timedelta(hours=1))
+    new, _ = _changeset(source, since=stats.until)
+    target = db.get_db_session()
+
+    _merge(target, new)
+    _merge(target, old)
+
+    assert list(db.get_sport_detail_columns(target, "ring-1", DAY, DAY + timedelta(days=1)).steps) == [150]
+
+
+def test_merged_syncs_keep_provenance_across_hops():
+    site = db.get_db_session()
+    db.full_sync(site, _data("ring-1", DAY, 60, 100))
+    changeset, _ = _changeset(site, "site-a")
+    hub = db.get_db_session()
+    _merge(hub, changeset)
+    central = db.get_db_session()
+
+    _merge(central, _changeset(hub, "hub")[0])
+    _merge(central, changeset)
+
+    syncs = central.scalars(select(db.Sync)).all()
+    assert [(s.source, s.source_sync_id) for s in syncs] == [("site-a", 1)]
+
+
+def test_own_syncs_coming_back():
+    site = db.get_db_session()
+    db.full_sync(site, _data("ring-1", DAY, 60, 100))
+    hub = db.get_db_session()
+    _merge(hub, _changeset(site, "site-a")[0])
+
+    stats = _merge(site, _changeset(hub, "hub")[0], local_source="site-a")
+
+    assert stats == changesets.MergeStats()
+
+
+def test_not_a_changeset():
+    with pytest.raises(ValueError, match="Not a changeset"):
+        _merge(db.get_db_session(), b"")
+
+
+async def test_changeset_commands(tmp_path: Path):
+    with db.get_db_session(tmp_path / "site.sqlite") as session:
+        db.full_sync(session, _data("ring-1", DAY, 60, 100))
+    cursor = tmp_path / "cursor"
+    out = tmp_path / f"first{changesets.CHANGESET_SUFFIX}"
+
+    result = await CliRunner().invoke(
+        util,
+        ["changeset-export", "--db", str(tmp_path / "site.sqlite"), "--out", str(out), "--cursor", str(cursor)],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert cursor.read_text() == "1\n"
+    result = await CliRunner().invoke(
+        util, ["changeset-merge", str(out), str(out), "--db", str(tmp_path / "central.sqlite")]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Merged 1 new syncs, 24 heart rates" in result.output
+    assert "Merged 0 new syncs, 0 heart rates" in result.output
+
+
+async def test_changeset_commands_round_trip(tmp_path: Path):
+    site = tmp_path / "site.sqlite"
+    with db.get_db_session(site) as session:
+        db.full_sync(session, _data("ring-1", DAY, 60, 100))
+        before = _contents(session)
+    out = tmp_path / f"site{changesets.CHANGESET_SUFFIX}"
+
+    result = await CliRunner().invoke(util, ["changeset-export", "--db", str(site), "--out", str(out)])
+    assert result.exit_code == 0, result.output
+    result = await CliRunner().invoke(util, ["changeset-merge", str(out), "--db", str(site)])
+
+    assert result.exit_code == 0, result.output
+    assert f"{out}: {changesets.MergeStats().summary()}" in result.output
+    with db.get_db_session(site) as session:
+        assert _contents(session) == before
+        assert session.scalars(select(func.count(db.Sync.sync_id))).one() == 1
@@ -2,7 +2,8 @@ from unittest.mock import patch, Mock
 
 from asyncclick.testing import CliRunner
 
-from colmi_r02_client.cli import cli_client
+from colmi_r02_client.cli import cli_client, util
+from colmi_r02_client.steps import SportDetail
 
 
 async def test_no_address_and_no_name():
@@ -76,3 +77,32 @@ async def test_just_name_not_found(discover_mock, _client_mock):
     )
     assert result.exit_code == 2
     assert "Error: No device found with given name" in result.output
+
+
+@patch("colmi_r02_client.cli.BleakScanner.discover", autospec=True)
+async def test_util_profile(discover_mock, tmp_path, monkeypatch):
+    discover_mock.return_value = []
+    monkeypatch.chdir(tmp_path)
+
+    runner = CliRunner()
+    result = await runner.invoke(util, ["--profile", "--profile-memory", "scan"])
+
+    assert result.exit_code == 0
+    assert "Profile written to" in result.output
+    assert len(list((tmp_path / "captures").glob("profile_scan_*.pstats"))) == 1
+    assert len(list((tmp_path / "captures").glob("profile_scan_*_allocations.txt"))) == 1
+
+
+@patch("colmi_r02_client.cli.Client", autospec=True)
+async def test_get_steps_as_csv(client_mock):
+    client_mock.return_value.get_steps.return_value = [
+        SportDetail(year=2025, month=1, day=1, time_index=4, calories=4200, steps=6969, distance=1234)
+    ]
+
+    result = await CliRunner().invoke(cli_client, ["--address=bar", "get-steps", "--as-csv"])
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        "year,month,day,time_index,calories,steps,distance",
+        "2025,1,1,4,4200,6969,1234",
+    ]
@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 import logging
 from unittest.mock import Mock
 
@@ -8,7 +9,9 @@ import pytest
 
 
 from colmi_r02_client.client import Client
-from colmi_r02_client import battery
+from colmi_r02_client import battery, steps
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.packet import TransferError
 
 MOCK_CHAR = Mock(spec=BleakGATTCharacteristic)
 
@@ -60,3 +63,114 @@ def test_handle_tx_unexpected_packet(caplog):
     client._handle_tx(MOCK_CHAR, packet)
 
     assert "Did not expect this packet:" in caplog.text
+
+
+STEPS_PACKETS = [
+    bytearray(b"C\xf0\x05\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x009"),
+    bytearray(b"C#\x08\x13\x10\x00\x05\xc8\x000\x00\x1b\x00\x00\x00\xa9"),
+    bytearray(b"C#\x08\x13\x14\x01\x05\xb6\x18\xaa\x04i\x03\x00\x00\x83"),
+    bytearray(b"C#\x08\x13\x18\x02\x058\x04\xe1\x00\x95\x00\x00\x00R"),
+    bytearray(b"C#\x08\x13\x1c\x03\x05\x05\x02l\x00H\x00\x00\x00`"),
+    bytearray(b"C#\x08\x13L\x04\x05\xef\x01c\x00D\x00\x00\x00m"),
+]
+
+
+async def test_get_steps_retries_lost_packet():
+    client = Client("unused")
+    responses = [STEPS_PACKETS[:2] + STEPS_PACKETS[3:], STEPS_PACKETS]
+    sent = []
+
+    async def send_packet(packet):
+        sent.append(packet)
+        for p in responses.pop(0):
+            client._handle_tx(MOCK_CHAR, p)
+
+    client.send_packet = send_packet  # type: ignore[method-assign]
+
+    result = await client.get_steps(datetime(2023, 8, 13, tzinfo=timezone.utc), today=datetime(2023, 8, 13))
+
+    assert isinstance(result, list)
+    assert len(result) == 5
+    assert len(sent) == 2
+    assert sent[0] == sent[1]
+
+
+async def test_get_steps_gives_up():
+    client = Client("unused")
+
+    async def send_packet(_packet):
+        for p in STEPS_PACKETS[:2] + STEPS_PACKETS[3:]:
+            client._handle_tx(MOCK_CHAR, p)
+
+    client.send_packet = send_packet  # type: ignore[method-assign]
+
+    with pytest.raises(TransferError, match="Lost 1 packet"):
+        await client.get_steps(datetime(2023, 8, 13, tzinfo=timezone.utc), today=datetime(2023, 8, 13), retries=2)
+
+
+async def test_handle_tx_metrics():
+    client = Client("unused", metrics=Metrics(enabled=True))
+    packet = bytearray(b"\x03@\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00C")
+
+    client._handle_tx(MOCK_CHAR, packet)
+    client._handle_tx(MOCK_CHAR, bytearray(b"}\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00}"))
+    await client._wait_for_response(battery.CMD_BATTERY)
+
+    snapshot = client.metrics.snapshot()
+    assert snapshot["counters"]["packets_received_total"] == [
+        {"labels": {"command": "3"}, "value": 1},
+        {"labels": {"command": "125"}, "value": 1},
+    ]
+    assert snapshot["counters"]["unexpected_packets_total"] == [{"labels": {"command": "125"}, "value": 1}]
+    assert snapshot["histograms"]["parse_seconds"][0]["count"] == 1
+    assert snapshot["histograms"]["request_seconds"][0]["count"] == 1
+
+
+def test_handle_tx_dumps_trace_on_error(tmp_path):
+    client = Client("unused", trace_dir=tmp_path)
+
+    with pytest.raises(AssertionError):
+        client._handle_tx(MOCK_CHAR, bytearray(b"\x03\x00"))
+
+    assert len(list(tmp_path.glob("packet_trace_*_error.txt"))) == 1
+
+
+def test_handle_tx_counts_corrupt_packets():
+    client = Client("unused")
+    packet = bytearray(b"\x03@\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00D")
+
+    client._handle_tx(MOCK_CHAR, packet)
+
+    assert client.trace.corrupt == {battery.CMD_BATTERY: 1}
+
+
+async def test_bus_subscriber():
+    client = Client("unused")
+    seen: list[memoryview] = []
+    client.bus.subscribe(seen.append, battery.CMD_BATTERY)
+    packet = bytearray(b"\x03@\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00C")
+
+    client._handle_tx(MOCK_CHAR, packet)
+
+    assert [bytes(p) for p in seen] == [bytes(packet)]
+    assert seen[0].readonly
+    assert await client.queues[battery.CMD_BATTERY].get() == battery.BatteryInfo(64, False)
+
+
+def test_clients_dont_share_parsers():
+    first = Client("first")
+    second = Client("second")
+
+    for p in STEPS_PACKETS[:3]:
+        first._handle_tx(MOCK_CHAR, p)
+    for p in STEPS_PACKETS[:3]:
+        second._handle_tx(MOCK_CHAR, p)
+    for p in STEPS_PACKETS[3:]:
+        first._handle_tx(MOCK_CHAR, p)
+        second._handle_tx(MOCK_CHAR, p)
+
+    first_details = first.queues[steps.CMD_GET_STEP_SOMEDAY].get_nowait()
+    second_details = second.queues[steps.CMD_GET_STEP_SOMEDAY].get_nowait()
+    assert len(first_details) == 5
+    assert first_details == second_details
+    assert first.decoder.handlers is not second.decoder.handlers
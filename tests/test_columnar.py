@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+from colmi_r02_client.client import FullData
+from colmi_r02_client.columnar import ColumnarFullData
+from colmi_r02_client import hr, steps
+
+MIDNIGHT = int(datetime(2024, 11, 11, tzinfo=timezone.utc).timestamp())
+
+
+def get_full_data() -> FullData:
+    return FullData(
+        address="fake",
+        heart_rates=[
+            hr.NoData(),
+            hr.HeartRateLog(
+                heart_rates=[0, 70] + [0] * 285 + [90],
+                timestamp=datetime(2024, 11, 11, 11, 11, tzinfo=timezone.utc),
+                size=24,
+                index=295,
+                range=5,
+            ),
+        ],
+        sport_details=[
+            [
+                steps.SportDetail(year=2024, month=11, day=11, time_index=0, calories=1, steps=2, distance=3),
+                steps.SportDetail(year=2024, month=11, day=11, time_index=95, calories=4, steps=5, distance=6),
+            ],
+            steps.NoData(),
+        ],
+    )
+
+
+def test_from_full_data():
+    columns = ColumnarFullData.from_full_data(get_full_data())
+
+    assert list(columns.heart_rate_days) == [0, 1]
+    assert list(columns.sport_detail_days) == [1, 0]
+    assert len(columns.heart_rate_timestamps) == len(columns.heart_rate_values) == 288
+    assert list(columns.heart_rate_rows()) == [(MIDNIGHT + 300, 70), (MIDNIGHT + 287 * 300, 90)]
+    assert list(columns.sport_detail_rows()) == [(MIDNIGHT, 1, 2, 3), (MIDNIGHT + 95 * 900, 4, 5, 6)]
+
+
+def test_round_trip():
+    fd = get_full_data()
+
+    result = ColumnarFullData.from_full_data(fd).to_full_data()
+
+    assert result.address == fd.address
+    assert isinstance(result.heart_rates[0], hr.NoData)
+    assert result.heart_rates[1] == fd.heart_rates[1]
+    assert result.sport_details[0] == fd.sport_details[0]
+    assert isinstance(result.sport_details[1], steps.NoData)
+
+
+def test_round_trip_longer_interval():
+    log = hr.HeartRateLog([60] * 48 + [0] * 240, datetime(2024, 11, 11, tzinfo=timezone.utc), 24, 295, 30)
+    fd = FullData(address="fake", heart_rates=[log], sport_details=[])
+
+    columns = ColumnarFullData.from_full_data(fd)
+
+    assert len(columns.heart_rate_values) == 48
+    assert columns.heart_rate_timestamps[-1] == MIDNIGHT + 47 * 30 * 60
+    assert columns.to_full_data().heart_rates == [log]
@@ -1,14 +1,20 @@
-from datetime import datetime, timezone
+from array import array
+from datetime import datetime, timedelta, timezone
 import os
 from pathlib import Path
 from unittest.mock import create_autospec
 
 from hypothesis import given, strategies as st
 import pytest
-from sqlalchemy import text, select, func, Dialect
+from asyncclick.testing import CliRunner
+from sqlalchemy import delete, text, select, func, Dialect
 from sqlalchemy.exc import IntegrityError
 
+from colmi_r02_client.cli import util
 from colmi_r02_client.client import FullData
+from colmi_r02_client.columnar import ColumnarFullData, HeartRateColumns
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.tracing import Tracer
 from colmi_r02_client import hr, steps
 from colmi_r02_client.db import (
     get_db_session,
@@ -20,6 +26,23 @@ from colmi_r02_client.db import (
     Sync,
     get_last_sync,
     DateTimeInUTC,
+    EpochInUTC,
+    SCHEMA_VERSION,
+    migrate_to_epoch,
+    needs_epoch_migration,
+    schema_version,
+    HeartRateHourly,
+    HeartRateDay,
+    HEART_RATE_DAYS,
+    SportDetailDaily,
+    get_daily_sport_details,
+    get_hourly_heart_rates,
+    rebuild_rollups,
+    aggregate_heart_rates,
+    aggregate_sport_details,
+    get_heart_rate_columns,
+    get_sport_detail_columns,
+    iter_heart_rate_columns,
 )
 
 
@@ -56,6 +79,10 @@ def test_get_db_tables_exist():
             "syncs",
             "heart_rates",
             "sport_details",
+            "heart_rate_hourly",
+            "sport_detail_daily",
+            "heart_rate_days",
+            "real_time_blocks",
         }
 
 
@@ -370,3 +397,496 @@ def test_datetime_in_utc_process_tz(ts: datetime):
     assert result is not None
     assert result.tzinfo == timezone.utc
     assert ts.astimezone(timezone.utc) == result
+
+
+def test_epoch_in_utc_process_bind():
+    eiu = EpochInUTC()
+    dialect = create_autospec(Dialect)
+
+    assert eiu.process_bind_param(None, dialect) is None
+    assert eiu.process_bind_param(datetime(2024, 1, 1, 1, tzinfo=timezone(timedelta(hours=1))), dialect) == 1704067200
+    with pytest.raises(ValueError):
+        eiu.process_bind_param(datetime(2024, 1, 1), dialect)
+
+
+def test_epoch_in_utc_process_result():
+    eiu = EpochInUTC()
+    dialect = create_autospec(Dialect)
+
+    assert eiu.process_result_value(None, dialect) is None
+    assert eiu.process_result_value(1704067200, dialect) == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with pytest.raises(ValueError):
+        eiu.process_result_value("2024-01-01 00:00:00.000000", dialect)
+
+
+def test_timestamps_stored_as_integers():
+    session = _synced_session()
+
+    types = session.scalars(text("SELECT DISTINCT typeof(timestamp) FROM heart_rates")).all()
+
+    assert types == ["integer"]
+
+
+def _legacy_db(path: Path) -> None:
+    """A database with timestamps stored as text like versions before the switch to epoch seconds"""
+    with get_db_session(path) as session:
+        session.execute(text("PRAGMA user_version = 0"))
+        session.execute(text("INSERT INTO rings (ring_id, address) VALUES (1, 'fake')"))
+        session.execute(text("INSERT INTO syncs (sync_id, ring_id, timestamp) VALUES (1, 1, '2024-01-02 03:04:05.000000')"))
+        for minute in range(0, 120, 5):
+            session.execute(
+                text(
+                    "INSERT INTO heart_rates (reading, timestamp, ring_id, sync_id) "
+                    f"VALUES (60, '2024-01-01 {minute // 60:02}:{minute % 60:02}:00.000000', 1, 1)"
+                )
+            )
+        session.commit()
+
+
+def test_legacy_db_migrated_on_open(tmp_path: Path):
+    path = tmp_path / "legacy.sqlite"
+    _legacy_db(path)
+
+    with get_db_session(path, migrate=False) as session:
+        assert needs_epoch_migration(session)
+
+    with get_db_session(path) as session:
+        assert not needs_epoch_migration(session)
+        assert schema_version(session) == SCHEMA_VERSION
+        assert get_last_sync(session, "fake") == datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        columns = get_heart_rate_columns(
+            session, "fake", datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 1, 1, 1, tzinfo=timezone.utc)
+        )
+        assert len(columns) == 12
+
+
+def test_schema_v1_db_gets_sync_source(tmp_path: Path):
+    path = tmp_path / "v1.sqlite"
+    with get_db_session(path) as session:
+        session.execute(text("DROP INDEX ix_syncs_source"))
+        session.execute(text("ALTER TABLE syncs DROP COLUMN source"))
+        session.execute(text("ALTER TABLE syncs DROP COLUMN source_sync_id"))
+        session.execute(text("PRAGMA user_version = 1"))
+        session.commit()
+
+    with get_db_session(path) as session:
+        assert schema_version(session) == SCHEMA_VERSION
+        columns = {row[1] for row in session.execute(text("PRAGMA table_info(syncs)"))}
+        assert {"source", "source_sync_id"} <= columns
+
+
+def test_schema_v2_db_gets_rollups(tmp_path: Path):
+    path = tmp_path / "v2.sqlite"
+    hrl = hr.HeartRateLog([60] * 288, datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    details = [
+        steps.SportDetail(year=2025, month=1, day=1, time_index=i, calories=10, steps=i, distance=7) for i in range(96)
+    ]
+    with get_db_session(path) as session:
+        full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[details]))
+        session.execute(text("DELETE FROM heart_rate_hourly"))
+        session.execute(text("DELETE FROM sport_detail_daily"))
+        session.execute(text("PRAGMA user_version = 2"))
+        session.commit()
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with get_db_session(path) as session:
+        assert schema_version(session) == SCHEMA_VERSION
+        day = aggregate_heart_rates(session, "fake", start, start + timedelta(days=1), 86400)
+        assert day.counts.tolist() == [288]
+        steps_day = aggregate_sport_details(session, "fake", start, start + timedelta(days=1))
+        assert steps_day.steps.tolist() == [sum(range(96))]
+
+
+def test_migrate_to_epoch_counts():
+    session = get_db_session()
+    session.execute(text("INSERT INTO rings (ring_id, address) VALUES (1, 'fake')"))
+    session.execute(text("INSERT INTO syncs (ring_id, timestamp) VALUES (1, '2024-01-02 03:04:05.000000')"))
+    session.execute(text("INSERT INTO syncs (ring_id, timestamp) VALUES (1, 1704164645)"))
+
+    assert migrate_to_epoch(session, vacuum=False) == 1
+    assert session.scalars(text("SELECT DISTINCT timestamp FROM syncs")).all() == [1704164645]
+
+
+def test_new_db_has_current_schema_version():
+    with get_db_session() as session:
+        assert schema_version(session) == SCHEMA_VERSION
+        assert not needs_epoch_migration(session)
+
+
+async def test_migrate_db_command(tmp_path: Path):
+    path = tmp_path / "legacy.sqlite"
+    _legacy_db(path)
+
+    result = await CliRunner().invoke(util, ["migrate-db", "--db", str(path)])
+
+    assert result.exit_code == 0, result.output
+    assert "Size:" in result.output
+    assert "Reading all heart rates:" in result.output
+    result = await CliRunner().invoke(util, ["migrate-db", "--db", str(path)])
+    assert "already up to date" in result.output
+
+
+def test_full_sync_columnar():
+    sd = steps.SportDetail(year=2025, month=1, day=1, time_index=1, calories=4200, steps=6969, distance=1234)
+    hrl = hr.HeartRateLog(
+        heart_rates=[80] * 8 + [0] * 280,
+        timestamp=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        size=24,
+        index=295,
+        range=5,
+    )
+    fd = ColumnarFullData.from_full_data(FullData(address="fake", heart_rates=[hrl], sport_details=[[sd]]))
+    with get_db_session() as session:
+        full_sync(session, fd)
+
+        logs = session.scalars(select(HeartRate)).all()
+        sport_details = session.scalars(select(SportDetail)).all()
+
+    assert len(logs) == 8
+    assert logs[7].timestamp == datetime(2025, 1, 1, 0, 35, tzinfo=timezone.utc)
+    assert len(sport_details) == 1
+    assert sport_details[0].timestamp == datetime(2025, 1, 1, 0, 15, tzinfo=timezone.utc)
+
+
+def test_full_sync_updates_sport_details():
+    first = steps.SportDetail(year=2025, month=1, day=1, time_index=0, calories=1, steps=1, distance=1)
+    second = steps.SportDetail(year=2025, month=1, day=1, time_index=0, calories=2, steps=2, distance=2)
+    with get_db_session() as session:
+        full_sync(session, FullData(address="fake", heart_rates=[], sport_details=[[first]]))
+        full_sync(session, FullData(address="fake", heart_rates=[], sport_details=[[second]]))
+
+        sport_details = session.scalars(select(SportDetail)).all()
+
+    assert len(sport_details) == 1
+    assert sport_details[0].steps == 2
+    # the sync that last changed it, so changesets pick up the update
+    assert sport_details[0].sync_id == 2
+
+
+def test_full_sync_heart_rates_per_ring():
+    hrl = hr.HeartRateLog([80] * 288, datetime(2024, 11, 11, tzinfo=timezone.utc), 24, 295, 5)
+    with get_db_session() as session:
+        full_sync(session, FullData(address="foo", heart_rates=[hrl], sport_details=[]))
+        full_sync(session, FullData(address="bar", heart_rates=[hrl], sport_details=[]))
+
+        assert session.scalars(func.count(HeartRate.heart_rate_id)).one() == 576
+
+
+def test_full_sync_metrics():
+    hrl = hr.HeartRateLog([80] * 8 + [0] * 280, datetime(2024, 11, 11, tzinfo=timezone.utc), 24, 295, 5)
+    metrics = Metrics(enabled=True)
+    with get_db_session() as session:
+        full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[]), metrics)
+
+    assert metrics.counters["db_rows_written_total"] == {(("table", "heart_rates"),): 8, (("table", "sport_details"),): 0}
+    assert metrics.histograms["db_sync_seconds"][()].count == 1
+
+
+def test_full_sync_spans():
+    tracer = Tracer(enabled=True)
+    with get_db_session() as session:
+        full_sync(session, FullData(address="fake", heart_rates=[], sport_details=[]), tracer=tracer)
+
+    assert [e["name"] for e in tracer.events] == [
+        "to_columns",
+        "create_sync",
+        "add_heart_rates",
+        "add_sport_details",
+        "update_rollups",
+        "commit",
+        "full_sync",
+    ]
+
+
+def _rollup_rows(session):
+    hourly = [(h.hour, h.min_reading, h.max_reading, h.avg_reading) for h in session.scalars(select(HeartRateHourly))]
+    daily = [(d.day, d.calories, d.steps, d.distance) for d in session.scalars(select(SportDetailDaily))]
+    return hourly, daily
+
+
+def test_full_sync_updates_rollups():
+    hrl = hr.HeartRateLog([60, 70, 80] * 4 + [0] * 12 + [90] * 264, datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    details = [
+        steps.SportDetail(year=2025, month=1, day=1, time_index=i, calories=10, steps=100, distance=70) for i in range(3)
+    ]
+    with get_db_session() as session:
+        full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[details]))
+
+        hourly = get_hourly_heart_rates(
+            session, "fake", datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, 1, tzinfo=timezone.utc)
+        )
+        daily = get_daily_sport_details(
+            session, "fake", datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 2, tzinfo=timezone.utc)
+        )
+
+    # nothing in the second hour, so only the first one is returned
+    assert [(h.hour, h.min_reading, h.max_reading, h.avg_reading, h.readings) for h in hourly] == [
+        (datetime(2025, 1, 1, tzinfo=timezone.utc), 60, 80, 70, 12),
+    ]
+    assert len(daily) == 1
+    assert (daily[0].day, daily[0].calories, daily[0].steps, daily[0].distance) == (
+        datetime(2025, 1, 1, tzinfo=timezone.utc),
+        30,
+        300,
+        210,
+    )
+
+
+def test_full_sync_updates_only_touched_buckets():
+    first = hr.HeartRateLog([60] * 6 + [0] * 282, datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    # the rest of the first hour, synced later
+    second = hr.HeartRateLog([60] * 6 + [120] * 6 + [0] * 276, datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    earlier = hr.HeartRateLog([50] * 288, datetime(2024, 12, 31, tzinfo=timezone.utc), 24, 295, 5)
+    with get_db_session() as session:
+        full_sync(session, FullData(address="fake", heart_rates=[earlier, first], sport_details=[]))
+        full_sync(session, FullData(address="fake", heart_rates=[second], sport_details=[]))
+
+        hourly = session.scalars(select(HeartRateHourly).order_by(HeartRateHourly.hour)).all()
+
+    assert len(hourly) == 25
+    assert (hourly[-1].min_reading, hourly[-1].max_reading, hourly[-1].avg_reading) == (60, 120, 90)
+    assert all(h.avg_reading == 50 for h in hourly[:-1])
+
+
+def test_rollups_match_rebuild():
+    sd = [steps.SportDetail(year=2025, month=1, day=d, time_index=1, calories=10 * d, steps=d, distance=1) for d in (1, 2)]
+    hrl = hr.HeartRateLog([x % 100 + 40 for x in range(288)], datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    with get_db_session() as session:
+        full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[sd[:1]]))
+        full_sync(session, FullData(address="fake", heart_rates=[], sport_details=[sd]))
+        incremental = _rollup_rows(session)
+
+        rebuild_rollups(session)
+
+        assert _rollup_rows(session) == incremental
+        assert len(incremental[0]) == 24
+        assert len(incremental[1]) == 2
+
+
+async def test_rebuild_rollups_command(tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    hrl = hr.HeartRateLog([80] * 288, datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    with get_db_session(db_path) as session:
+        full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[]))
+        session.execute(delete(HeartRateHourly))
+        session.commit()
+
+    result = await CliRunner().invoke(util, ["rebuild-rollups", f"--db={db_path}"])
+
+    assert result.exit_code == 0, result.output
+    with get_db_session(db_path) as session:
+        assert session.scalars(func.count(HeartRateHourly.heart_rate_hourly_id)).one() == 24
+
+
+def _synced_session():
+    hrl = hr.HeartRateLog([0] * 12 + [60, 70, 80] * 4 + [90] * 264, datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    details = [
+        steps.SportDetail(year=2025, month=1, day=1, time_index=i, calories=10, steps=i, distance=7) for i in range(96)
+    ]
+    session = get_db_session()
+    full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[details]))
+    full_sync(session, FullData(address="other", heart_rates=[hrl], sport_details=[]))
+    return session
+
+
+def test_get_heart_rate_columns():
+    session = _synced_session()
+    start = datetime(2025, 1, 1, 1, tzinfo=timezone.utc)
+
+    columns = get_heart_rate_columns(session, "fake", start, datetime(2025, 1, 1, 2, tzinfo=timezone.utc))
+
+    assert list(columns.timestamps) == [int(start.timestamp()) + i * 300 for i in range(12)]
+    assert list(columns.readings) == [60, 70, 80] * 4
+    assert len(get_heart_rate_columns(session, "fake", start, datetime(2026, 1, 1, tzinfo=timezone.utc))) == 276
+    assert len(get_heart_rate_columns(session, "nope", start, datetime(2026, 1, 1, tzinfo=timezone.utc))) == 0
+
+
+def test_iter_heart_rate_columns_chunks():
+    session = _synced_session()
+
+    chunks = list(
+        iter_heart_rate_columns(
+            session, "fake", datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 2, tzinfo=timezone.utc), 100
+        )
+    )
+
+    assert [len(c) for c in chunks] == [100, 100, 76]
+
+
+def test_get_sport_detail_columns():
+    session = _synced_session()
+
+    columns = get_sport_detail_columns(
+        session, "fake", datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, 1, tzinfo=timezone.utc)
+    )
+
+    assert list(columns.steps) == [0, 1, 2, 3]
+    assert list(columns.calories) == [10] * 4
+    assert columns.timestamps[1] - columns.timestamps[0] == 15 * 60
+
+
+def test_aggregate_heart_rates():
+    session = _synced_session()
+
+    buckets = aggregate_heart_rates(
+        session, "fake", datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, 3, tzinfo=timezone.utc)
+    )
+
+    assert list(buckets.starts) == [int(datetime(2025, 1, 1, h, tzinfo=timezone.utc).timestamp()) for h in (1, 2)]
+    assert list(buckets.mins) == [60, 90]
+    assert list(buckets.maxes) == [80, 90]
+    assert list(buckets.averages) == [70.0, 90.0]
+    assert list(buckets.counts) == [12, 12]
+
+
+def test_aggregate_sport_details():
+    session = _synced_session()
+
+    buckets = aggregate_sport_details(
+        session, "fake", datetime(2024, 12, 1, tzinfo=timezone.utc), datetime(2025, 2, 1, tzinfo=timezone.utc)
+    )
+
+    assert list(buckets.starts) == [int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())]
+    assert list(buckets.steps) == [sum(range(96))]
+    assert list(buckets.calories) == [960]
+
+
+def test_column_queries_need_timezones():
+    session = _synced_session()
+
+    with pytest.raises(ValueError, match="timezone"):
+        get_heart_rate_columns(session, "fake", datetime(2025, 1, 1), datetime(2025, 1, 2))
+
+
+def test_columns_to_numpy():
+    numpy = pytest.importorskip("numpy")
+    session = _synced_session()
+
+    arrays = get_heart_rate_columns(
+        session, "fake", datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 2, tzinfo=timezone.utc)
+    ).to_numpy()
+
+    assert arrays["readings"].dtype == numpy.uint8
+    assert arrays["timestamps"].dtype == numpy.int64
+    assert len(arrays["readings"]) == 276
+
+
+def test_columns_to_numpy_without_numpy(monkeypatch):
+    def no_numpy(name):
+        raise ImportError(name)
+
+    monkeypatch.setattr("importlib.import_module", no_numpy)
+
+    with pytest.raises(ImportError, match="pip install numpy"):
+        HeartRateColumns().to_numpy()
+
+
+def test_aggregate_rollups_match_raw_rows():
+    session = _synced_session()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2025, 1, 2, tzinfo=timezone.utc)
+    unaligned = start - timedelta(seconds=1)
+
+    for bucket in (3600, 7200, 86400):
+        assert aggregate_heart_rates(session, "fake", start, end, bucket) == aggregate_heart_rates(
+            session, "fake", unaligned, end, bucket
+        )
+    assert aggregate_sport_details(session, "fake", start, end) == aggregate_sport_details(session, "fake", unaligned, end)
+
+
+def _days_and_rows_sessions():
+    hrls = [
+        hr.HeartRateLog(
+            array("B", [0] * 12 + [60, 70, 80] * 4 + [90 + i] * 264),
+            datetime(2025, 1, 1 + i, tzinfo=timezone.utc),
+            24,
+            295,
+            5,
+        )
+        for i in range(3)
+    ]
+    rows = get_db_session()
+    full_sync(rows, FullData(address="fake", heart_rates=hrls, sport_details=[]))
+    days = get_db_session()
+    full_sync(days, FullData(address="fake", heart_rates=hrls, sport_details=[]), heart_rate_storage=HEART_RATE_DAYS)
+    return rows, days
+
+
+def test_full_sync_heart_rate_days():
+    _, session = _days_and_rows_sessions()
+
+    assert session.scalars(func.count(HeartRate.heart_rate_id)).one() == 0
+    day = session.scalars(select(HeartRateDay).order_by(HeartRateDay.day)).first()
+    assert day is not None
+    assert day.day == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert day.interval == 300
+    assert len(day.readings) < 288
+
+
+def test_heart_rate_days_match_rows():
+    rows, days = _days_and_rows_sessions()
+    start = datetime(2025, 1, 1, 0, 30, tzinfo=timezone.utc)
+    end = datetime(2025, 1, 3, 12, 7, tzinfo=timezone.utc)
+
+    assert get_heart_rate_columns(days, "fake", start, end) == get_heart_rate_columns(rows, "fake", start, end)
+    for bucket_seconds in (600, 3600, 86400):
+        assert aggregate_heart_rates(days, "fake", start, end, bucket_seconds) == aggregate_heart_rates(
+            rows, "fake", start, end, bucket_seconds
+        )
+    whole = datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 4, tzinfo=timezone.utc)
+    assert aggregate_heart_rates(days, "fake", *whole) == aggregate_heart_rates(rows, "fake", *whole)
+
+
+def test_heart_rate_days_chunks():
+    _, session = _days_and_rows_sessions()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    chunks = list(iter_heart_rate_columns(session, "fake", start, start + timedelta(days=3), chunk_size=100))
+
+    assert [len(c) for c in chunks] == [100] * 8 + [28]
+
+
+def test_heart_rate_days_mixed_with_rows():
+    hrl = hr.HeartRateLog(array("B", [60] * 288), datetime(2025, 1, 1, tzinfo=timezone.utc), 24, 295, 5)
+    other = hr.HeartRateLog(array("B", [70] * 288), datetime(2025, 1, 2, tzinfo=timezone.utc), 24, 295, 5)
+    session = get_db_session()
+    full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[]))
+    full_sync(session, FullData(address="fake", heart_rates=[other], sport_details=[]), heart_rate_storage=HEART_RATE_DAYS)
+
+    columns = get_heart_rate_columns(
+        session, "fake", datetime(2025, 1, 1, 23, tzinfo=timezone.utc), datetime(2025, 1, 2, 1, tzinfo=timezone.utc)
+    )
+
+    assert list(columns.readings) == [60] * 12 + [70] * 12
+    assert list(columns.timestamps) == sorted(columns.timestamps)
+
+
+@pytest.mark.parametrize("first_storage", ["rows", HEART_RATE_DAYS])
+def test_heart_rate_storage_modes_dont_overlap(first_storage):
+    day = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    hrl = hr.HeartRateLog(array("B", [60] * 288), day, 24, 295, 5)
+    other_storage = "rows" if first_storage == HEART_RATE_DAYS else HEART_RATE_DAYS
+    session = get_db_session()
+    full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[]), heart_rate_storage=first_storage)
+    full_sync(session, FullData(address="fake", heart_rates=[hrl], sport_details=[]), heart_rate_storage=other_storage)
+
+    assert len(get_heart_rate_columns(session, "fake", day, day + timedelta(days=1))) == 288
+    assert aggregate_heart_rates(session, "fake", day, day + timedelta(days=1), 86400).counts.tolist() == [288]
+    assert aggregate_heart_rates(session, "fake", day, day + timedelta(hours=23), 3600).counts.tolist() == [12] * 23
+    # whichever storage came first holds every reading
+    assert session.scalars(func.count(HeartRate.heart_rate_id)).one() == 0
+
+
+def test_heart_rate_days_merge_partial_day(caplog):
+    day = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    morning = hr.HeartRateLog(array("B", [60] * 100 + [0] * 188), day, 24, 295, 5)
+    evening = hr.HeartRateLog(array("B", [61] + [60] * 199 + [0] * 88), day, 24, 295, 5)
+    session = get_db_session()
+    full_sync(session, FullData(address="fake", heart_rates=[morning], sport_details=[]), heart_rate_storage=HEART_RATE_DAYS)
+    full_sync(session, FullData(address="fake", heart_rates=[evening], sport_details=[]), heart_rate_storage=HEART_RATE_DAYS)
+
+    columns = get_heart_rate_columns(session, "fake", day, day + timedelta(days=1))
+
+    assert list(columns.readings) == [60] * 200
+    assert session.scalars(func.count(HeartRateDay.heart_rate_day_id)).one() == 1
+    assert "Inconsistent data detected" in caplog.text
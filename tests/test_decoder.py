@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from freezegun import freeze_time
+from hypothesis import given, strategies as st
+import pytest
+
+from colmi_r02_client import battery, hr, steps
+from colmi_r02_client.decoder import CAPTURE_SEPARATOR, Message, PacketDecoder, adecode, decode, read_capture
+
+CAPTURE = Path("tests/captures/heart_rate_log_1730412850.bin")
+
+BATTERY_PACKET = b"\x03@\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00C"
+STEPS_PACKETS = (
+    b"C\xf0\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x005C$\x10\x15\\\x00\x01y\x00\x15\x00\x10\x00\x00\x00\x87"
+)
+
+
+def chunked(data: bytes, size: int) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def test_feed_single_packet():
+    decoder = PacketDecoder()
+
+    result = decoder.feed(BATTERY_PACKET)
+
+    assert result == [Message(battery.CMD_BATTERY, battery.BatteryInfo(64, False))]
+    assert decoder.pending == 0
+
+
+def test_feed_multi_packet_message():
+    decoder = PacketDecoder()
+
+    result = decoder.feed(STEPS_PACKETS + BATTERY_PACKET)
+
+    assert [m.command for m in result] == [steps.CMD_GET_STEP_SOMEDAY, battery.CMD_BATTERY]
+    assert result[0].value[0].steps == 21
+
+
+@given(st.integers(min_value=1, max_value=64))
+def test_decode_any_chunk_size(size: int):
+    result = list(decode(chunked(STEPS_PACKETS + BATTERY_PACKET, size)))
+
+    assert [m.command for m in result] == [steps.CMD_GET_STEP_SOMEDAY, battery.CMD_BATTERY]
+
+
+def test_feed_partial_packet():
+    decoder = PacketDecoder()
+
+    assert decoder.feed(BATTERY_PACKET[:5]) == []
+    assert decoder.pending == 5
+    assert len(decoder.feed(BATTERY_PACKET[5:])) == 1
+    assert decoder.pending == 0
+
+
+def test_unexpected_packet(caplog):
+    decoder = PacketDecoder()
+
+    assert decoder.feed(b"}" + bytes(14) + b"}") == []
+    assert "Did not expect this packet:" in caplog.text
+
+
+def test_bad_separator():
+    decoder = PacketDecoder(separator=CAPTURE_SEPARATOR)
+
+    with pytest.raises(ValueError, match="Expected separator"):
+        decoder.feed(BATTERY_PACKET + b"x")
+
+
+@freeze_time("2024-10-31 18:14:10-04:00")
+def test_read_capture():
+    result = list(read_capture(CAPTURE, chunk_size=10))
+
+    assert len(result) == 1
+    assert result[0].command == hr.CMD_READ_HEART_RATE
+    assert isinstance(result[0].value, hr.HeartRateLog)
+    assert result[0].value.heart_rates[6] == 104
+
+
+async def test_adecode():
+    async def chunks():
+        for chunk in chunked(BATTERY_PACKET * 3, 7):
+            yield chunk
+
+    result = [m async for m in adecode(chunks())]
+
+    assert len(result) == 3
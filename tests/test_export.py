@@ -0,0 +1,116 @@
+from array import array
+import csv
+from datetime import datetime, timezone
+import io
+import json
+from pathlib import Path
+
+from asyncclick.testing import CliRunner
+import pytest
+
+from colmi_r02_client import db, export, hr, steps
+from colmi_r02_client.cli import util
+from colmi_r02_client.client import FullData
+
+DAY = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _session(path: Path | None = None):
+    hrl = hr.HeartRateLog(array("B", [60] * 12 + [0] * 276), DAY, 24, 295, 5)
+    details = [
+        steps.SportDetail(year=2025, month=1, day=1, time_index=i, calories=10, steps=i, distance=7) for i in range(4)
+    ]
+    session = db.get_db_session(path)
+    db.full_sync(session, FullData("ring-a", heart_rates=[hrl], sport_details=[details]), timestamp=DAY, comment="first")
+    db.full_sync(session, FullData("ring-b", heart_rates=[hrl], sport_details=[]), heart_rate_storage=db.HEART_RATE_DAYS)
+    return session
+
+
+def test_export_csv():
+    out = io.BytesIO()
+
+    rows = export.export_table(_session(), "heart_rates", "csv", out, chunk_size=5)
+
+    assert rows == 24
+    lines = list(csv.DictReader(io.StringIO(out.getvalue().decode())))
+    assert len(lines) == 24
+    assert lines[0] == {"address": "ring-a", "timestamp": "2025-01-01T00:00:00+00:00", "reading": "60"}
+    assert lines[-1]["address"] == "ring-b"
+
+
+def test_export_ndjson_sport_details():
+    out = io.BytesIO()
+
+    rows = export.export_table(_session(), "sport_details", "ndjson", out)
+
+    lines = [json.loads(line) for line in out.getvalue().decode().splitlines()]
+    assert rows == len(lines) == 4
+    assert lines[1] == {
+        "address": "ring-a",
+        "timestamp": "2025-01-01T00:15:00+00:00",
+        "calories": 10,
+        "steps": 1,
+        "distance": 7,
+    }
+
+
+def test_export_syncs():
+    out = io.BytesIO()
+
+    export.export_table(_session(), "syncs", "ndjson", out, addresses=["ring-a"])
+
+    (line,) = out.getvalue().decode().splitlines()
+    assert json.loads(line) == {
+        "address": "ring-a",
+        "sync_id": 1,
+        "timestamp": "2025-01-01T00:00:00+00:00",
+        "comment": "first",
+    }
+
+
+def test_export_range():
+    out = io.BytesIO()
+
+    rows = export.export_table(_session(), "heart_rates", "csv", out, start=datetime(2025, 1, 1, 0, 30, tzinfo=timezone.utc))
+
+    assert rows == 12
+
+
+def test_export_empty():
+    out = io.BytesIO()
+
+    assert export.export_table(db.get_db_session(), "heart_rates", "csv", out) == 0
+    assert out.getvalue() == b""
+
+
+@pytest.mark.parametrize("table", export.TABLES)
+def test_columnar_round_trip(table):
+    session = _session()
+    out = io.BytesIO()
+
+    rows = export.export_table(session, table, "columnar", out, chunk_size=5)
+
+    out.seek(0)
+    blocks = list(export.read_columnar(out))
+    assert sum(len(next(iter(b.columns.values()))) for b in blocks) == rows
+    assert {b.table for b in blocks} == {table}
+    expected = list(export.iter_columns(session, table, chunk_size=5))
+    assert [(b.address, {k: list(v) for k, v in b.columns.items()}) for b in blocks] == [
+        (address, {k: list(v) for k, v in columns.items()}) for address, columns in expected
+    ]
+
+
+def test_read_columnar_not_columnar():
+    with pytest.raises(ValueError, match="Not a columnar export"):
+        list(export.read_columnar(io.BytesIO(b"address,timestamp\n")))
+
+
+async def test_export_command(tmp_path: Path):
+    _session(tmp_path / "ring_data.sqlite").close()
+    out_dir = tmp_path / "export"
+
+    result = await CliRunner().invoke(util, ["export", "--db", str(tmp_path), "--out", str(out_dir), "--format", "ndjson"])
+
+    assert result.exit_code == 0, result.output
+    assert "Wrote 24 rows" in result.output
+    assert sorted(p.name for p in out_dir.iterdir()) == ["heart_rates.ndjson", "sport_details.ndjson", "syncs.ndjson"]
@@ -3,10 +3,12 @@ from datetime import datetime, timezone
 from freezegun import freeze_time
 
 from colmi_r02_client.hr import (
+    CMD_READ_HEART_RATE,
     HeartRateLogParser,
     HeartRateLog,
     NoData,
 )
+from colmi_r02_client.packet import IncompleteTransfer, make_packet
 
 HEART_RATE_PACKETS = [
     bytearray(b"\x15\x00\x18\x05\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x002"),
@@ -148,6 +150,87 @@ def test_with_times():
     assert hr_with_ts[-1][1] == datetime(2024, 1, 1, 23, 55)
 
 
+def test_with_times_other_interval():
+    h = HeartRateLog([60] * 288, datetime(2024, 1, 1, 5, tzinfo=timezone.utc), 0, 0, 30)
+
+    hr_with_ts = h.heart_rates_with_times()
+
+    assert len(hr_with_ts) == 48
+    assert hr_with_ts[1][1] == datetime(2024, 1, 1, 0, 30, tzinfo=timezone.utc)
+    assert hr_with_ts[-1][1] == datetime(2024, 1, 1, 23, 30, tzinfo=timezone.utc)
+
+
+def test_heart_rate_log_is_array():
+    h = HeartRateLog([60] * 288, datetime(2024, 1, 1, 5, tzinfo=timezone.utc), 0, 0, 5)
+
+    assert h.heart_rates.itemsize == 1
+    assert len(h.heart_rates) == 288
+
+
+def test_epoch_timestamps():
+    h = HeartRateLog([60] * 288, datetime(2024, 1, 1, 5, tzinfo=timezone.utc), 0, 0, 5)
+
+    epochs = h.epoch_timestamps()
+
+    assert len(epochs) == 288
+    assert epochs[0] == int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+    assert epochs[-1] == int(datetime(2024, 1, 1, 23, 55, tzinfo=timezone.utc).timestamp())
+    assert [datetime.fromtimestamp(e, timezone.utc) for e in epochs] == [t for _, t in h.heart_rates_with_times()]
+
+
+def test_readings_skips_zeros():
+    h = HeartRateLog([0, 70, 0, 80] + [0] * 284, datetime(2024, 1, 1, tzinfo=timezone.utc), 0, 0, 5)
+    midnight = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    assert list(h.readings()) == [(midnight + 300, 70), (midnight + 900, 80)]
+
+
+def test_zero_interval_falls_back_to_default(caplog):
+    parser = HeartRateLogParser()
+    header = make_packet(CMD_READ_HEART_RATE, bytearray([0, 24, 0]))
+
+    results = [parser.parse(p) for p in [header, *HEART_RATE_PACKETS[1:]]]
+
+    log = results[-1]
+    assert isinstance(log, HeartRateLog)
+    assert log.range == 5
+    assert "Invalid heart rate log interval 0" in caplog.text
+    assert len(log.epoch_timestamps()) == 288
+    assert len(log.heart_rates_with_times()) == 288
+
+
+def test_parse_missing_packet():
+    parser = HeartRateLogParser()
+    results = [parser.parse(p) for p in HEART_RATE_PACKETS[:2] + HEART_RATE_PACKETS[3:]]
+
+    assert results[2] == IncompleteTransfer(CMD_READ_HEART_RATE, 1)
+    assert all(r is None for r in results[:2] + results[3:])
+
+
+def test_parse_after_missing_packet():
+    parser = HeartRateLogParser()
+    for p in HEART_RATE_PACKETS[:2] + HEART_RATE_PACKETS[3:10]:
+        parser.parse(p)
+
+    for p in HEART_RATE_PACKETS[:-1]:
+        assert parser.parse(p) is None
+    assert isinstance(parser.parse(HEART_RATE_PACKETS[-1]), HeartRateLog)
+
+
+def test_parse_missing_header():
+    parser = HeartRateLogParser()
+
+    assert parser.parse(HEART_RATE_PACKETS[1]) == IncompleteTransfer(CMD_READ_HEART_RATE, 1)
+
+
+def test_missing_slots_have_no_negative_readings():
+    parser = HeartRateLogParser()
+    parser._raw_heart_rates = [-1] * 288
+    parser.timestamp = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    assert min(parser._make_log().heart_rates) == 0
+
+
 @freeze_time("2024-10-31 18:14:10-04:00")
 def test_parse_doesnt_drop_data():
     """
@@ -159,7 +242,7 @@ def test_parse_doesnt_drop_data():
         while data := f.read(17):
             r = parser.parse(bytearray(data.strip()))
     assert isinstance(r, HeartRateLog)
-    assert r.heart_rates == [
+    assert r.heart_rates.tolist() == [
         0,
         0,
         0,
@@ -0,0 +1,137 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from asyncclick.testing import CliRunner
+from sqlalchemy import func, select
+
+from colmi_r02_client import db, hr, importer, synthetic
+from colmi_r02_client.cli import util
+from colmi_r02_client.decoder import CAPTURE_SEPARATOR
+from colmi_r02_client.importer import decode_capture, find_captures, import_captures
+from colmi_r02_client.simulator import heart_rate_log_packets
+
+END = datetime(2024, 6, 30, 12, 0, tzinfo=timezone.utc)
+ADDRESS = "70:CB:0D:D0:34:1C"
+
+
+def _write_captures(tmp_path, count=3, days=5):
+    data = synthetic.generate(seed=7, years=days / 365, end=END)[0]
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"colmi_response_capture_{1719700000 + i}.bin"
+        synthetic.write_capture(path, data)
+        paths.append(path)
+    return paths, data
+
+
+def _count(session, table):
+    return session.scalars(select(func.count()).select_from(table)).one()
+
+
+def test_find_captures_sorted_by_recorded_time(tmp_path):
+    newer = tmp_path / "colmi_response_capture_2000000000.bin"
+    older = tmp_path / "colmi_response_capture_1000000000.bin"
+    newer.touch()
+    older.touch()
+    (tmp_path / "colmi_response_capture_1000000000.bin.times").touch()
+
+    assert find_captures([tmp_path]) == [older, newer]
+
+
+def test_decode_capture(tmp_path):
+    (path,), data = _write_captures(tmp_path, count=1)
+
+    decoded = decode_capture(path)
+
+    assert decoded.heart_rates == [x for x in data.heart_rates if isinstance(x, hr.HeartRateLog)]
+    assert decoded.sport_details == [x for x in data.sport_details if isinstance(x, list)]
+    assert decoded.recorded_at == datetime.fromtimestamp(1719700000, timezone.utc)
+
+
+def test_import_captures_deduplicates(tmp_path):
+    paths, data = _write_captures(tmp_path)
+    session = db.get_db_session()
+
+    stats = import_captures(session, ADDRESS, paths, jobs=1, batch_size=2)
+
+    expected = db.full_sync(db.get_db_session(), data)
+    assert stats.captures == 3
+    assert _count(session, db.HeartRate) + _count(session, db.SportDetail) == expected
+    assert _count(session, db.Sync) == 2
+
+    again = import_captures(session, ADDRESS, paths, jobs=1)
+    assert _count(session, db.HeartRate) + _count(session, db.SportDetail) == expected
+    assert again.rows < expected
+
+
+def test_import_captures_keeps_most_complete_day(tmp_path):
+    full = synthetic.generate(seed=1, years=1 / 365, end=END, partial_last_day=False)[0].heart_rates[0]
+    assert isinstance(full, hr.HeartRateLog)
+    partial = hr.HeartRateLog(
+        heart_rates=full.heart_rates[:100] + array("B", bytes(188)), timestamp=full.timestamp, size=24, index=295, range=5
+    )
+    # the partial log is from a newer capture, but has fewer readings
+    for i, log in enumerate([full, partial]):
+        with (tmp_path / f"colmi_response_capture_{1719700000 + i}.bin").open("wb") as f:
+            for p in heart_rate_log_packets(log):
+                f.write(p + CAPTURE_SEPARATOR)
+    session = db.get_db_session()
+
+    import_captures(session, ADDRESS, [tmp_path], jobs=1)
+
+    assert _count(session, db.HeartRate) == len(list(full.readings()))
+
+
+def test_import_captures_process_pool(tmp_path):
+    paths, _ = _write_captures(tmp_path)
+    session = db.get_db_session()
+
+    stats = import_captures(session, ADDRESS, paths, jobs=2)
+
+    assert stats.captures == 3
+    assert stats.rows > 0
+
+
+def test_import_captures_bounds_work_in_flight(tmp_path, monkeypatch):
+    in_flight = []
+    futures: list = []
+
+    class CountingPool(ThreadPoolExecutor):
+        def submit(self, fn, /, *args, **kwargs):
+            in_flight.append(sum(1 for f in futures if not f.done()) + 1)
+            future = super().submit(fn, *args, **kwargs)
+            futures.append(future)
+            return future
+
+    monkeypatch.setattr(importer, "ProcessPoolExecutor", CountingPool)
+    paths, _ = _write_captures(tmp_path, count=9, days=1)
+    session = db.get_db_session()
+
+    stats = import_captures(session, ADDRESS, paths, jobs=2, batch_size=2)
+
+    assert stats.captures == 9
+    assert len(in_flight) == 9
+    assert max(in_flight) <= 4
+
+
+def test_import_doesnt_move_last_sync(tmp_path):
+    paths, _ = _write_captures(tmp_path, count=1)
+    session = db.get_db_session()
+
+    import_captures(session, ADDRESS, paths, jobs=1)
+
+    assert db.get_last_sync(session, ADDRESS) == datetime.fromtimestamp(1719700000, timezone.utc)
+
+
+async def test_import_captures_command(tmp_path):
+    _write_captures(tmp_path, count=2)
+    db_path = tmp_path / "db.sqlite"
+
+    runner = CliRunner()
+    result = await runner.invoke(
+        util, ["import-captures", str(tmp_path), f"--address={ADDRESS}", f"--db={db_path}", "--jobs=1"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Imported 2 captures" in result.output
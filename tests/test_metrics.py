@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+from colmi_r02_client.metrics import Metrics
+
+
+def test_disabled_records_nothing():
+    metrics = Metrics()
+
+    metrics.inc("foo")
+    metrics.set("bar", 1)
+    metrics.observe("baz", 1)
+    with metrics.time("qux"):
+        pass
+
+    assert metrics.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def test_counter_labels():
+    metrics = Metrics(enabled=True)
+
+    metrics.inc("packets", command=3)
+    metrics.inc("packets", command=3)
+    metrics.inc("packets", command=21)
+
+    assert metrics.snapshot()["counters"]["packets"] == [
+        {"labels": {"command": "3"}, "value": 2},
+        {"labels": {"command": "21"}, "value": 1},
+    ]
+
+
+def test_histogram():
+    metrics = Metrics(enabled=True)
+
+    metrics.observe("latency", 0.001)
+    metrics.observe("latency", 10)
+
+    (h,) = metrics.snapshot()["histograms"]["latency"]
+    assert h["count"] == 2
+    assert h["sum"] == 10.001
+    assert h["counts"][h["buckets"].index(0.001)] == 1
+    assert h["counts"][-1] == 1
+
+
+def test_to_prometheus():
+    metrics = Metrics(enabled=True)
+    metrics.inc("packets_received_total", command=3)
+    metrics.set("queue_depth", 2, command=3)
+    metrics.observe("parse_seconds", 0.00005, command=3)
+
+    text = metrics.to_prometheus()
+
+    assert "# TYPE colmi_packets_received_total counter" in text
+    assert 'colmi_packets_received_total{command="3"} 1' in text
+    assert 'colmi_queue_depth{command="3"} 2' in text
+    assert 'colmi_parse_seconds_bucket{command="3",le="0.0001"} 1' in text
+    assert 'colmi_parse_seconds_bucket{command="3",le="+Inf"} 1' in text
+    assert 'colmi_parse_seconds_count{command="3"} 1' in text
+
+
+def test_write_json(tmp_path: Path):
+    metrics = Metrics(enabled=True)
+    metrics.inc("foo")
+    path = tmp_path / "metrics.json"
+
+    metrics.write(path)
+
+    assert json.loads(path.read_text())["counters"]["foo"] == [{"labels": {}, "value": 1}]
@@ -0,0 +1,68 @@
+from array import array
+
+import pytest
+
+from colmi_r02_client import packed
+
+
+def test_mask_of():
+    assert packed.mask_of([0, 60, 0, 0, 0, 0, 0, 0, 70]) == bytes([0b10, 0b1])
+
+
+def test_encode_raw():
+    readings = [0, 60, 70]
+
+    blob, mask, encoding = packed.encode(readings, compress_readings=False)
+
+    assert encoding == packed.ENCODING_RAW
+    assert blob == bytes(readings)
+    assert packed.decode(blob, mask, encoding) == array("B", readings)
+
+
+def test_encode_compresses_a_day():
+    readings = [0] * 20 + [60 + i % 7 for i in range(200)] + [0] * 30 + [250, 40] * 19
+
+    blob, mask, encoding = packed.encode(readings)
+
+    assert encoding == packed.ENCODING_DELTA_ZLIB
+    assert len(blob) < len(readings)
+    assert packed.decode(blob, mask, encoding) == array("B", readings)
+
+
+def test_encode_keeps_raw_when_compression_is_bigger():
+    blob, mask, encoding = packed.encode([60, 70])
+
+    assert encoding == packed.ENCODING_RAW
+    assert packed.decode(blob, mask, encoding) == array("B", [60, 70])
+
+
+def test_decode_unknown_encoding():
+    with pytest.raises(ValueError, match="Unknown heart rate encoding"):
+        packed.decode(b"", b"", 99)
+
+
+def test_to_columns():
+    blob, mask, encoding = packed.encode([0, 60, 70, 0, 80, 90] * 48)
+
+    timestamps, readings = packed.to_columns(1000, 300, blob, mask, encoding, start=1000 + 301, end=1000 + 1800)
+
+    assert list(timestamps) == [1600, 2200, 2500]
+    assert list(readings) == [70, 80, 90]
+
+
+def test_to_columns_outside_day():
+    blob, mask, encoding = packed.encode([60] * 288)
+
+    timestamps, readings = packed.to_columns(0, 300, blob, mask, encoding, start=86400, end=90000)
+
+    assert len(timestamps) == len(readings) == 0
+
+
+def test_series_round_trip():
+    offsets = [0, 1000, 2001, 2001, 400_000]
+    readings = [60, 61, 59, 255, 1]
+
+    decoded_offsets, decoded_readings = packed.decode_series(packed.encode_series(offsets, readings), len(offsets))
+
+    assert list(decoded_offsets) == offsets
+    assert list(decoded_readings) == readings
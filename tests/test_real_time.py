@@ -42,3 +42,9 @@ def test_parse_real_time_reading_fail():
     result = real_time.parse_real_time_reading(input)
 
     assert result == expected
+
+
+def test_reading_is_slotted():
+    reading = real_time.Reading(real_time.RealTimeReading.HEART_RATE, 78)
+
+    assert not hasattr(reading, "__dict__")
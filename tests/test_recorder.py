@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+from itertools import count
+from pathlib import Path
+from typing import cast
+
+from bleak import BleakClient
+from sqlalchemy import func, select
+
+from colmi_r02_client import db
+from colmi_r02_client.client import Client
+from colmi_r02_client.real_time import RealTimeReading
+from colmi_r02_client.recorder import RealTimeRecorder
+from colmi_r02_client.simulator import SimulatedRing
+from colmi_r02_client.writer import DatabaseWriter
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+END = datetime(2025, 1, 2, tzinfo=timezone.utc)
+
+
+def _client(readings: dict[RealTimeReading, list[int]]) -> tuple[Client, SimulatedRing]:
+    ring = SimulatedRing(real_time_readings=readings)
+    return Client("ring-1", bleak_client=cast(BleakClient, ring)), ring
+
+
+def _clock(step: float = 1.0):
+    ticks = count()
+    return lambda: START.timestamp() + next(ticks) * step
+
+
+async def _record(tmp_path: Path, client: Client, duration: float = 0.3, **kwargs):
+    async with DatabaseWriter(tmp_path / "db.sqlite") as writer:
+        recorder = RealTimeRecorder(client, writer, max_wait=0.02, reconnect_delay=0.01, **kwargs)
+        stats = await recorder.run(duration)
+    return db.get_db_session(tmp_path / "db.sqlite"), stats
+
+
+async def test_records_blocks_by_count(tmp_path: Path):
+    client, _ = _client({RealTimeReading.HEART_RATE: [60, 61, 0, 62, 63, 64, 65, 66, 67, 68, 69]})
+
+    session, stats = await _record(tmp_path, client, block_readings=4, clock=_clock())
+
+    columns = db.get_real_time_columns(session, "ring-1", RealTimeReading.HEART_RATE, START, END)
+    assert list(columns.readings) == [60, 61, 62, 63, 64, 65, 66, 67, 68, 69]
+    assert stats.readings == 10
+    assert stats.blocks == 3
+    assert session.scalars(select(func.count(db.RealTimeBlock.real_time_block_id))).one() == 3
+
+
+async def test_records_blocks_by_time(tmp_path: Path):
+    client, _ = _client({RealTimeReading.HEART_RATE: list(range(60, 70))})
+
+    session, _ = await _record(tmp_path, client, block_seconds=3, clock=_clock())
+
+    blocks = session.scalars(select(db.RealTimeBlock).order_by(db.RealTimeBlock.start)).all()
+    assert [b.count for b in blocks] == [3, 3, 3, 1]
+    assert all((b.end - b.start).total_seconds() < 3 for b in blocks)
+    columns = db.get_real_time_columns(session, "ring-1", RealTimeReading.HEART_RATE, START, END)
+    assert list(columns.timestamps) == [int(START.timestamp() * 1000) + i * 1000 for i in range(10)]
+
+
+async def test_reconnects_when_the_ring_goes_quiet(tmp_path: Path):
+    client, ring = _client({RealTimeReading.HEART_RATE: [60, 61]})
+
+    async def more_later() -> None:
+        await asyncio.sleep(0.1)
+        ring.real_time_readings[RealTimeReading.HEART_RATE] = [70, 71]
+
+    _, (session, stats) = await asyncio.gather(more_later(), _record(tmp_path, client, duration=0.4))
+
+    assert stats.reconnects >= 1
+    columns = db.get_real_time_columns(session, "ring-1", RealTimeReading.HEART_RATE, START, datetime.now(timezone.utc))
+    assert list(columns.readings) == [60, 61, 70, 71]
+
+
+async def test_spo2_spot_readings(tmp_path: Path):
+    client, ring = _client({RealTimeReading.HEART_RATE: [60, 61, 62, 63], RealTimeReading.SPO2: [0, 97, 98]})
+
+    session, _ = await _record(tmp_path, client, spo2_every=2, clock=_clock())
+
+    spo2 = db.get_real_time_columns(session, "ring-1", RealTimeReading.SPO2, START, END)
+    heart_rates = db.get_real_time_columns(session, "ring-1", RealTimeReading.HEART_RATE, START, END)
+    assert spo2.readings[0] == 97
+    assert list(heart_rates.readings) == [60, 61, 62, 63]
+    assert ring.written[-1][0] == 106  # stopped when done
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+import struct
+from typing import cast
+
+from asyncclick.testing import CliRunner
+from bleak import BleakClient
+from sqlalchemy import select
+
+from colmi_r02_client import db, hr, real_time, steps, synthetic
+from colmi_r02_client.cli import cli_client, util
+from colmi_r02_client.client import Client
+from colmi_r02_client.decoder import capture_times_path, read_capture_times
+from colmi_r02_client.packet import make_packet
+from colmi_r02_client.replay import ReplayRing, split_responses
+
+# get_steps asks for a number of days back from today, which has to fit in a byte
+# and the parser finishes today's heart rate log a packet early, so end yesterday
+END = datetime.now(timezone.utc).replace(hour=18, minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+
+def _capture(tmp_path, days=3, seed=0):
+    data = synthetic.generate(seed=seed, years=days / 365, end=END)[0]
+    path = tmp_path / "capture.bin"
+    synthetic.write_capture(path, data)
+    return path, data
+
+
+def _comparable(values):
+    return [None if isinstance(v, hr.NoData | steps.NoData) else v for v in values]
+
+
+def test_split_responses():
+    data = synthetic.generate(seed=1, years=2 / 365, end=END)[0]
+    packets = list(synthetic.packets(data))
+    readings = [make_packet(real_time.CMD_START_REAL_TIME, bytearray([1, 0, 70 + i])) for i in range(3)]
+
+    responses = split_responses(packets + readings + [make_packet(real_time.CMD_STOP_REAL_TIME)])
+
+    assert [r.command for r in responses] == [21, 67, 21, 67, 105, 106]
+    assert sum(len(r.packets) for r in responses) == len(packets) + 4
+    assert len(responses[-2].packets) == 3
+
+
+def test_split_responses_delays():
+    p = make_packet(real_time.CMD_START_REAL_TIME, bytearray([1, 0, 70]))
+    responses = split_responses([p, p, make_packet(3, bytearray([50, 0]))], [10.0, 10.5, 100.0])
+
+    assert responses[0].delays == [0.0, 0.5]
+    assert responses[1].delays == [2.0]
+
+
+async def test_replay_full_data(tmp_path):
+    path, data = _capture(tmp_path)
+    client = Client("replay", bleak_client=cast(BleakClient, ReplayRing.from_capture(path)))
+
+    async with client:
+        result = await client.get_full_data(END - timedelta(days=2), END)
+
+    assert _comparable(result.heart_rates) == _comparable(data.heart_rates)
+    assert _comparable(result.sport_details) == _comparable(data.sport_details)
+
+
+async def test_replay_real_time():
+    packets = [make_packet(real_time.CMD_START_REAL_TIME, bytearray([1, 0, 60 + i])) for i in range(8)]
+    ring = ReplayRing(split_responses(packets))
+    client = Client("replay", bleak_client=cast(BleakClient, ring))
+
+    async with client:
+        assert await client.get_realtime_reading(real_time.RealTimeReading.HEART_RATE) == [60, 61, 62, 63, 64, 65]
+
+
+async def test_replay_original_timing(tmp_path):
+    path, data = _capture(tmp_path, days=1)
+    count = path.stat().st_size // 17
+    capture_times_path(path).write_bytes(struct.pack(f"<{count}d", *(1000 + i * 0.001 for i in range(count))))
+    ring = ReplayRing.from_capture(path, original_timing=True)
+    assert ring.original_timing
+
+    client = Client("replay", bleak_client=cast(BleakClient, ring))
+    async with client:
+        log = await client.get_heart_rate_log(END)
+
+    assert _comparable([log]) == _comparable(data.heart_rates)
+
+
+def test_original_timing_without_times(tmp_path):
+    path, _ = _capture(tmp_path, days=1)
+
+    assert not ReplayRing.from_capture(path, original_timing=True).original_timing
+
+
+def test_client_records_times(tmp_path):
+    record_to = tmp_path / "capture.bin"
+    client = Client("foo", record_to=record_to)
+
+    client._handle_tx(None, make_packet(3, bytearray([50, 0])))  # type: ignore[arg-type]
+    client._handle_tx(None, make_packet(3, bytearray([51, 0])))  # type: ignore[arg-type]
+
+    times = read_capture_times(record_to)
+    assert times is not None
+    assert len(times) == 2
+    assert times[0] <= times[1]
+
+
+async def test_replay_command(tmp_path):
+    path, _ = _capture(tmp_path, days=3)
+    db_path = tmp_path / "db.sqlite"
+
+    runner = CliRunner()
+    result = await runner.invoke(
+        util, ["replay", str(path), "--address=70:CB:0D:D0:00:00", f"--db={db_path}", f"--end={END:%Y-%m-%d}"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Replayed 3 days" in result.output
+    with db.get_db_session(db_path) as session:
+        assert session.scalars(select(db.Ring.address)).all() == ["70:CB:0D:D0:00:00"]
+
+
+async def test_replay_needs_address(tmp_path):
+    path, _ = _capture(tmp_path, days=1)
+
+    result = await CliRunner().invoke(cli_client, [f"--replay={path}", "info"])
+
+    assert result.exit_code == 2
+    assert "Error: You must pass either the address option(preferred) or the name option, but not both" in result.output
@@ -0,0 +1,121 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import sqlite3
+
+from asyncclick.testing import CliRunner
+import pytest
+from sqlalchemy import func, select, text
+
+from colmi_r02_client import db, hr, retention, steps
+from colmi_r02_client.cli import util
+from colmi_r02_client.client import FullData
+
+NOW = datetime(2025, 1, 10, 12, tzinfo=timezone.utc)
+FIRST_DAY = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _data(days: int = 10) -> FullData:
+    dates = [FIRST_DAY + timedelta(days=i) for i in range(days)]
+    return FullData(
+        "fake",
+        heart_rates=[hr.HeartRateLog(array("B", [60 + i] * 288), d, 24, 295, 5) for i, d in enumerate(dates)],
+        sport_details=[
+            [steps.SportDetail(d.year, d.month, d.day, time_index=t, calories=10, steps=100, distance=70) for t in range(8)]
+            for d in dates
+        ],
+    )
+
+
+def _session(path: Path | None = None, storage: str = db.HEART_RATE_ROWS):
+    session = db.get_db_session(path)
+    db.full_sync(session, _data(), heart_rate_storage=storage)
+    return session
+
+
+def test_policy_cutoff():
+    policy = retention.RetentionPolicy(raw_days=3)
+
+    assert policy.cutoff(NOW) == int(datetime(2025, 1, 7, tzinfo=timezone.utc).timestamp())
+
+
+def test_policy_invalid():
+    with pytest.raises(AssertionError):
+        retention.RetentionPolicy(raw_days=0)
+
+
+@pytest.mark.parametrize("storage", db.HEART_RATE_STORAGE)
+def test_apply_retention(storage):
+    session = _session(storage=storage)
+    whole = (FIRST_DAY, FIRST_DAY + timedelta(days=10))
+    hourly_before = db.aggregate_heart_rates(session, "fake", *whole)
+    daily_before = db.aggregate_sport_details(session, "fake", *whole)
+
+    stats = retention.apply_retention(session, retention.RetentionPolicy(raw_days=3, batch_size=100), NOW)
+
+    assert stats.heart_rates + stats.heart_rate_days * 288 == 6 * 288
+    assert stats.sport_details == 6 * 8
+    columns = db.get_heart_rate_columns(session, "fake", *whole)
+    assert min(columns.timestamps) == int(datetime(2025, 1, 7, tzinfo=timezone.utc).timestamp())
+    assert db.aggregate_heart_rates(session, "fake", *whole) == hourly_before
+    assert db.aggregate_sport_details(session, "fake", *whole) == daily_before
+
+
+def test_apply_retention_rolls_up_first():
+    session = _session()
+    session.execute(text("DELETE FROM heart_rate_hourly"))
+    session.commit()
+
+    retention.apply_retention(session, retention.RetentionPolicy(raw_days=3), NOW)
+
+    # only the pruned days, the rest can still be rebuilt from raw readings
+    assert session.scalars(select(func.count(db.HeartRateHourly.heart_rate_hourly_id))).one() == 6 * 24
+
+
+def test_rebuild_rollups_keeps_pruned_history():
+    session = _session()
+    retention.apply_retention(session, retention.RetentionPolicy(raw_days=3), NOW)
+
+    db.rebuild_rollups(session)
+
+    assert session.scalars(select(func.count(db.HeartRateHourly.heart_rate_hourly_id))).one() == 10 * 24
+    assert session.scalars(select(func.count(db.SportDetailDaily.sport_detail_daily_id))).one() == 10
+
+
+def test_maintain_frees_pages(tmp_path: Path):
+    path = tmp_path / "ring_data.sqlite"
+    session = _session(path)
+    assert session.connection().exec_driver_sql("PRAGMA auto_vacuum").scalar_one() == db.AUTO_VACUUM_INCREMENTAL
+    size_before = path.stat().st_size
+
+    stats = retention.maintain(session, retention.RetentionPolicy(raw_days=1), NOW)
+
+    assert stats.pages_freed > 0
+    assert session.connection().exec_driver_sql("PRAGMA freelist_count").scalar_one() == 0
+    assert session.connection().exec_driver_sql("SELECT count(*) FROM sqlite_stat1").scalar_one() > 0
+    session.close()
+    assert path.stat().st_size < size_before
+
+
+def test_maintain_turns_on_incremental_vacuum(tmp_path: Path):
+    path = tmp_path / "ring_data.sqlite"
+    _session(path).close()
+    with sqlite3.connect(path) as connection:
+        connection.execute("PRAGMA auto_vacuum = NONE")
+        connection.execute("VACUUM")
+        assert connection.execute("PRAGMA auto_vacuum").fetchone() == (0,)
+    session = db.get_db_session(path)
+
+    retention.maintain(session, retention.RetentionPolicy(raw_days=1), NOW)
+
+    assert session.connection().exec_driver_sql("PRAGMA auto_vacuum").scalar_one() == db.AUTO_VACUUM_INCREMENTAL
+
+
+async def test_maintain_command(tmp_path: Path):
+    _session(tmp_path / "ring_data.sqlite").close()
+
+    result = await CliRunner().invoke(util, ["maintain", "--db", str(tmp_path), "--raw-days", "1"])
+
+    assert result.exit_code == 0, result.output
+    assert "Deleted" in result.output
+    assert "Size:" in result.output
@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+from asyncclick.testing import CliRunner
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from colmi_r02_client import db, shards, synthetic
+from colmi_r02_client.cli import util
+
+END = datetime(2024, 12, 31, 18, 30, tzinfo=timezone.utc)
+START = datetime(2024, 12, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(name="shard_dir", scope="module")
+def get_shard_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    tmp_path = tmp_path_factory.mktemp("shards")
+    for data in synthetic.generate(seed=1, rings=12, years=30 / 365, end=END):
+        with db.get_db_session(tmp_path, address=data.address) as session:
+            db.full_sync(session, data)
+    return tmp_path
+
+
+def test_shard_path():
+    assert db.shard_path(Path("shards"), "70:CB:0D:D0:00:0A") == Path("shards/ring_70cb0dd0000a.sqlite")
+
+
+def test_get_db_session_routes_to_shard(shard_dir: Path):
+    assert len(shards.list_shards(shard_dir)) == 12
+    with db.get_db_session(shard_dir, address="70:CB:0D:D0:00:00") as session:
+        assert db.get_last_sync(session, "70:CB:0D:D0:00:00") is not None
+        assert db.get_last_sync(session, "70:CB:0D:D0:00:01") is None
+
+
+def test_get_db_session_shards_need_address(tmp_path: Path):
+    with pytest.raises(ValueError, match="an address is needed"):
+        db.get_db_session(tmp_path)
+
+
+def test_fan_out(shard_dir: Path):
+    results = shards.fan_out(
+        shard_dir, lambda session, address: len(db.get_heart_rate_columns(session, address, START, END))
+    )
+
+    assert len(results) == 12
+    assert all(count > 0 for count in results.values())
+
+
+def test_fleet_query_matches_fan_out(shard_dir: Path):
+    sql = (
+        "SELECT address, sum(steps) FROM fleet_sport_detail_daily WHERE day >= ? AND day < ? "
+        "GROUP BY address ORDER BY address"
+    )
+
+    rows = list(shards.fleet_query(shard_dir, sql, (int(START.timestamp()), int(END.timestamp())), group_size=5))
+
+    expected = shards.fan_out(
+        shard_dir, lambda session, address: sum(db.aggregate_sport_details(session, address, START, END).steps)
+    )
+    assert dict(rows) == {address: steps for address, steps in expected.items() if steps}
+
+
+def test_attached_views(shard_dir: Path):
+    with shards.attached(shards.list_shards(shard_dir)[:2]) as session:
+        addresses = session.connection().exec_driver_sql("SELECT DISTINCT address FROM fleet_syncs").scalars().all()
+
+    assert sorted(addresses) == ["70:CB:0D:D0:00:00", "70:CB:0D:D0:00:01"]
+
+
+def test_attached_limit(shard_dir: Path):
+    with pytest.raises(AssertionError), shards.attached([shard_dir / "x.sqlite"] * (shards.ATTACH_LIMIT + 1)):
+        pass
+
+
+async def test_fleet_summary_command(shard_dir: Path):
+    result = await CliRunner().invoke(
+        util, ["fleet-summary", "--shards", str(shard_dir), "--start", "2024-12-01", "--end", "2024-12-31"]
+    )
+
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0] == "address,heart_rate_readings,average_heart_rate,steps"
+    assert len([line for line in lines if line.startswith("70:CB")]) == 12
+
+
+def test_fan_out_doesnt_write(shard_dir: Path):
+    before = {path: path.stat().st_mtime_ns for path in shards.list_shards(shard_dir)}
+
+    shards.fan_out(shard_dir, lambda session, address: db.get_last_sync(session, address))
+
+    assert {path: path.stat().st_mtime_ns for path in shards.list_shards(shard_dir)} == before
+
+
+def test_read_only_session(shard_dir: Path):
+    with shards.read_only(shards.list_shards(shard_dir)[0]) as session:
+        assert db.get_last_sync(session, "70:CB:0D:D0:00:00") is not None
+        with pytest.raises(OperationalError, match="readonly"):
+            session.connection().exec_driver_sql("DELETE FROM syncs")
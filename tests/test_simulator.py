@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from typing import cast
+
+from bleak import BleakClient
+
+from colmi_r02_client.client import Client
+from colmi_r02_client.decoder import new_command_handlers
+from colmi_r02_client import hr, steps
+from colmi_r02_client.simulator import FakeBleakClient, SimulatedRing, heart_rate_log_packets, sport_detail_packets
+
+DAY = datetime(2024, 3, 2, tzinfo=timezone.utc)
+
+LOG = hr.HeartRateLog(
+    heart_rates=[60 + i % 50 for i in range(288)],
+    timestamp=DAY,
+    size=24,
+    index=295,
+    range=5,
+)
+
+DETAILS = [
+    steps.SportDetail(year=2024, month=3, day=2, time_index=i, calories=i * 10, steps=i * 2, distance=i * 3)
+    for i in range(4)
+]
+
+
+def _parse(command: int, packets):
+    parser = new_command_handlers()[command]
+    results = [parser(p) for p in packets]
+    return results[-1]
+
+
+def test_heart_rate_log_packets_round_trip():
+    assert _parse(hr.CMD_READ_HEART_RATE, heart_rate_log_packets(LOG)) == LOG
+
+
+def test_heart_rate_log_packets_no_data():
+    assert isinstance(_parse(hr.CMD_READ_HEART_RATE, heart_rate_log_packets(hr.NoData())), hr.NoData)
+
+
+def test_sport_detail_packets_round_trip():
+    assert _parse(steps.CMD_GET_STEP_SOMEDAY, sport_detail_packets(DETAILS)) == DETAILS
+
+
+def test_sport_detail_packets_old_calorie_protocol():
+    assert _parse(steps.CMD_GET_STEP_SOMEDAY, sport_detail_packets(DETAILS, new_calorie_protocol=False)) == DETAILS
+
+
+async def test_client_against_simulated_ring():
+    ring = SimulatedRing(heart_rates={DAY.date(): LOG}, sport_details={DAY.date(): DETAILS}, today=DAY.date())
+    client = Client("simulated", bleak_client=cast(BleakClient, ring))
+    await client.connect()
+
+    assert await client.get_heart_rate_log(DAY) == LOG
+    assert await client.get_steps(DAY, today=DAY) == DETAILS
+    assert isinstance(await client.get_steps(DAY, today=datetime(2024, 3, 3, tzinfo=timezone.utc)), steps.NoData)
+    assert (await client.get_battery()).battery_level == 100
+
+
+async def test_fake_client_answers_nothing_by_default():
+    fake = FakeBleakClient()
+    notified = []
+    await fake.start_notify("uuid", lambda _, packet: notified.append(packet))
+
+    await fake.write_gatt_char(None, bytearray(16))
+
+    assert fake.written == [bytearray(16)]
+    assert notified == []
@@ -1,6 +1,11 @@
+import dataclasses
 from datetime import datetime, timezone
 
-from colmi_r02_client.steps import SportDetailParser, SportDetail, NoData
+from hypothesis import given
+import hypothesis.strategies as st
+
+from colmi_r02_client.packet import IncompleteTransfer
+from colmi_r02_client.steps import CMD_GET_STEP_SOMEDAY, SportDetailParser, SportDetail, NoData
 
 
 def test_parse_simple():
@@ -14,15 +19,18 @@ def test_parse_simple():
     assert r == [SportDetail(year=2024, month=10, day=15, time_index=92, calories=1210, steps=21, distance=16)]
 
 
+MULTI_PACKETS = [
+    bytearray(b"C\xf0\x05\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x009"),
+    bytearray(b"C#\x08\x13\x10\x00\x05\xc8\x000\x00\x1b\x00\x00\x00\xa9"),
+    bytearray(b"C#\x08\x13\x14\x01\x05\xb6\x18\xaa\x04i\x03\x00\x00\x83"),
+    bytearray(b"C#\x08\x13\x18\x02\x058\x04\xe1\x00\x95\x00\x00\x00R"),
+    bytearray(b"C#\x08\x13\x1c\x03\x05\x05\x02l\x00H\x00\x00\x00`"),
+    bytearray(b"C#\x08\x13L\x04\x05\xef\x01c\x00D\x00\x00\x00m"),
+]
+
+
 def test_parse_multi():
-    packets = [
-        bytearray(b"C\xf0\x05\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x009"),
-        bytearray(b"C#\x08\x13\x10\x00\x05\xc8\x000\x00\x1b\x00\x00\x00\xa9"),
-        bytearray(b"C#\x08\x13\x14\x01\x05\xb6\x18\xaa\x04i\x03\x00\x00\x83"),
-        bytearray(b"C#\x08\x13\x18\x02\x058\x04\xe1\x00\x95\x00\x00\x00R"),
-        bytearray(b"C#\x08\x13\x1c\x03\x05\x05\x02l\x00H\x00\x00\x00`"),
-        bytearray(b"C#\x08\x13L\x04\x05\xef\x01c\x00D\x00\x00\x00m"),
-    ]
+    packets = MULTI_PACKETS
     expected = [
         SportDetail(
             year=2023,
@@ -116,3 +124,44 @@ def test_timestamp_one_more():
     )
     ts = datetime(2025, 1, 1, 23, 45, tzinfo=timezone.utc)
     assert sd.timestamp == ts
+
+
+def test_sport_detail_is_slotted():
+    sd = SportDetail(year=2025, month=1, day=1, time_index=1, calories=0, distance=0, steps=0)
+
+    assert not hasattr(sd, "__dict__")
+    assert sd.timestamp == datetime(2025, 1, 1, 0, 15, tzinfo=timezone.utc)
+    assert "timestamp" not in {f.name for f in dataclasses.fields(sd)}
+
+
+@given(st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2099, 12, 31)), st.integers(0, 95))
+def test_epoch_matches_timestamp(day, time_index):
+    sd = SportDetail(year=day.year, month=day.month, day=day.day, time_index=time_index, calories=0, distance=0, steps=0)
+
+    assert sd.epoch == int(sd.timestamp.timestamp())
+
+
+def test_parse_missing_packet():
+    sdp = SportDetailParser()
+    results = [sdp.parse(p) for p in MULTI_PACKETS[:2] + MULTI_PACKETS[3:]]
+
+    assert results[2] == IncompleteTransfer(CMD_GET_STEP_SOMEDAY, 1)
+    assert results[3] is None
+
+
+def test_parse_after_missing_packet():
+    sdp = SportDetailParser()
+    for p in MULTI_PACKETS[:2] + MULTI_PACKETS[3:5]:
+        sdp.parse(p)
+
+    for p in MULTI_PACKETS[:-1]:
+        assert sdp.parse(p) is None
+    result = sdp.parse(MULTI_PACKETS[-1])
+    assert isinstance(result, list)
+    assert len(result) == 5
+
+
+def test_parse_missing_header():
+    sdp = SportDetailParser()
+
+    assert sdp.parse(MULTI_PACKETS[1]) == IncompleteTransfer(CMD_GET_STEP_SOMEDAY, 1)
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+from asyncclick.testing import CliRunner
+
+from colmi_r02_client import hr, steps, synthetic
+from colmi_r02_client.cli import util
+from colmi_r02_client.decoder import read_capture
+
+END = datetime(2024, 6, 30, 12, 0, tzinfo=timezone.utc)
+
+
+def _comparable(values):
+    """NoData doesn't implement equality"""
+    return [None if isinstance(v, hr.NoData | steps.NoData) else v for v in values]
+
+
+def _comparable_fleet(fleet):
+    return [(d.address, _comparable(d.heart_rates), _comparable(d.sport_details)) for d in fleet]
+
+
+def test_generate_is_deterministic():
+    first = _comparable_fleet(synthetic.generate(seed=3, rings=2, years=0.1, end=END))
+    assert first == _comparable_fleet(synthetic.generate(seed=3, rings=2, years=0.1, end=END))
+    assert first != _comparable_fleet(synthetic.generate(seed=4, rings=2, years=0.1, end=END))
+
+
+def test_generate_shape():
+    fleet = synthetic.generate(seed=1, rings=3, years=1, end=END)
+
+    assert len(fleet) == 3
+    assert len({data.address for data in fleet}) == 3
+    for data in fleet:
+        assert len(data.heart_rates) == 365
+        assert len(data.sport_details) == 365
+        assert data.heart_rates[-1].timestamp.date() == END.date()  # type: ignore[union-attr]
+        assert any(isinstance(log, hr.NoData) for log in data.heart_rates)
+
+
+def test_generate_plausible_values():
+    data = synthetic.generate(seed=2, years=0.2, end=END)[0]
+
+    for log in data.heart_rates:
+        if isinstance(log, hr.HeartRateLog):
+            assert all(r == 0 or 35 <= r <= 200 for r in log.heart_rates)
+    for details in data.sport_details:
+        if not isinstance(details, steps.NoData):
+            assert all(d.calories % 10 == 0 and d.steps > 0 for d in details)
+            assert all(28 <= d.time_index < 92 for d in details)
+
+
+def test_partial_last_day():
+    data = synthetic.generate(seed=0, years=0.1, end=END)[0]
+    log = data.heart_rates[-1]
+    assert isinstance(log, hr.HeartRateLog)
+
+    assert not any(log.heart_rates[12 * 12 :])
+    assert all(d.time_index < 48 for d in data.sport_details[-1])  # type: ignore[union-attr]
+
+    full = synthetic.generate(seed=0, years=0.1, end=END, partial_last_day=False)[0]
+    assert any(full.heart_rates[-1].heart_rates[12 * 12 :])  # type: ignore[union-attr]
+
+
+def test_capture_round_trip(tmp_path):
+    data = synthetic.generate(seed=5, years=0.05, end=END)[0]
+    path = tmp_path / "capture.bin"
+
+    for new_calorie_protocol in (True, False):
+        count = synthetic.write_capture(path, data, new_calorie_protocol)
+        assert path.stat().st_size == count * 17
+
+        messages = [m.value for m in read_capture(path)]
+        assert _comparable(messages[0::2]) == _comparable(data.heart_rates)
+        assert _comparable(messages[1::2]) == _comparable(data.sport_details)
+
+
+async def test_synthesize_command(tmp_path):
+    runner = CliRunner()
+    result = await runner.invoke(util, ["synthesize", f"--out={tmp_path}", "--rings=2", "--years=0.01"])
+
+    assert result.exit_code == 0, result.output
+    assert len(list(tmp_path.glob("colmi_response_capture_*.bin"))) == 2
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from colmi_r02_client.packet import make_packet
+from colmi_r02_client.trace import PacketTrace
+
+
+def test_record_good_packet():
+    trace = PacketTrace(capacity=4)
+    packet = make_packet(3)
+
+    assert trace.record(packet)
+    assert trace.packets()[0][1] == packet
+    assert trace.corrupt == {}
+
+
+def test_record_bad_checksum():
+    trace = PacketTrace(capacity=4)
+    packet = make_packet(3)
+    packet[-1] += 1
+
+    assert not trace.record(packet)
+    assert trace.corrupt == {3: 1}
+
+
+def test_record_short_packet():
+    trace = PacketTrace(capacity=4)
+
+    assert not trace.record(bytearray(b"\x03\x01"))
+    assert trace.packets()[0][1] == b"\x03\x01"
+
+
+def test_wraps_around():
+    trace = PacketTrace(capacity=4)
+    packets = [make_packet(i) for i in range(10)]
+    for p in packets:
+        trace.record(p)
+
+    assert len(trace) == 4
+    assert trace.recorded == 10
+    assert [p for _, p in trace.packets()] == packets[-4:]
+
+
+def test_dump(tmp_path: Path):
+    trace = PacketTrace(capacity=4)
+    trace.record(make_packet(3))
+
+    path = trace.dump(tmp_path, "timeout_3")
+
+    lines = path.read_text().splitlines()
+    assert "timeout_3" in lines[0]
+    assert lines[1].endswith(make_packet(3).hex())
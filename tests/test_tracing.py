@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from colmi_r02_client.tracing import Tracer
+
+
+def test_disabled_records_nothing():
+    tracer = Tracer()
+
+    with tracer.span("foo"):
+        pass
+
+    assert tracer.events == []
+
+
+def test_nested_spans():
+    tracer = Tracer(enabled=True)
+
+    with tracer.span("outer", day="2024-01-01"), tracer.span("inner"):
+        pass
+
+    inner, outer = tracer.events
+    assert inner["name"] == "inner"
+    assert outer["name"] == "outer"
+    assert outer["ph"] == "X"
+    assert outer["args"] == {"day": "2024-01-01"}
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_write(tmp_path: Path):
+    tracer = Tracer(enabled=True)
+    with tracer.span("foo"):
+        pass
+    path = tmp_path / "trace.json"
+
+    tracer.write(path)
+
+    assert [e["name"] for e in json.loads(path.read_text())["traceEvents"]] == ["foo"]
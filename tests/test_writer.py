@@ -0,0 +1,123 @@
+import asyncio
+from array import array
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import func, select
+
+from colmi_r02_client import db, hr, steps
+from colmi_r02_client.client import FullData
+from colmi_r02_client.metrics import Metrics
+from colmi_r02_client.writer import DatabaseWriter, WriterBusy
+
+DAY = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _data(address: str, day: int) -> FullData:
+    start = DAY + timedelta(days=day)
+    return FullData(
+        address,
+        heart_rates=[hr.HeartRateLog(array("B", [60] * 12 + [0] * 276), start, 24, 295, 5)],
+        sport_details=[[steps.SportDetail(start.year, start.month, start.day, 0, calories=10, steps=100, distance=7)]],
+    )
+
+
+async def test_concurrent_producers(tmp_path: Path):
+    metrics = Metrics(enabled=True)
+
+    async with DatabaseWriter(tmp_path / "db.sqlite", metrics=metrics) as writer:
+        rows = await asyncio.gather(*(writer.write(_data(f"ring-{r}", d)) for r in range(4) for d in range(10)))
+
+    assert rows == [13] * 40
+    assert writer.stats.written == 40
+    assert writer.stats.rows == 13 * 40
+    assert writer.stats.transactions < 40
+    session = db.get_db_session(tmp_path / "db.sqlite")
+    assert session.scalars(select(func.count(db.Sync.sync_id))).one() == 40
+    assert session.scalars(select(func.count(db.HeartRate.heart_rate_id))).one() == 12 * 40
+    assert metrics.counters["db_writer_transactions_total"][()] == writer.stats.transactions
+
+
+async def test_submit_waits_for_room(tmp_path: Path):
+    async with DatabaseWriter(tmp_path / "db.sqlite", max_queued=2) as writer:
+        done = [await writer.submit(_data("ring-1", d)) for d in range(6)]
+        await asyncio.gather(*done)
+
+    assert writer.stats.waits > 0
+    assert writer.stats.max_queued == 2
+    assert writer.stats.written == 6
+
+
+async def test_submit_nowait_reports_backpressure(tmp_path: Path):
+    async with DatabaseWriter(tmp_path / "db.sqlite", max_queued=1) as writer:
+        done = writer.submit_nowait(_data("ring-1", 0))
+        with pytest.raises(WriterBusy):
+            writer.submit_nowait(_data("ring-1", 1))
+        await done
+
+    assert writer.stats.rejected == 1
+    assert writer.stats.written == 1
+
+
+async def test_failed_sync_only_fails_itself(tmp_path: Path, monkeypatch):
+    full_sync = db.full_sync
+
+    def failing(session: Any, data: FullData, *args: Any, comment: str | None = None, **kwargs: Any) -> int:
+        if comment == "bad":
+            raise ValueError("bad data")
+        return full_sync(session, data, *args, comment=comment, **kwargs)
+
+    monkeypatch.setattr(db, "full_sync", failing)
+
+    async with DatabaseWriter(tmp_path / "db.sqlite") as writer:
+        good = await writer.submit(_data("ring-1", 0))
+        bad = await writer.submit(_data("ring-1", 1), comment="bad")
+        also_good = await writer.submit(_data("ring-1", 2))
+        assert await good == 13
+        with pytest.raises(ValueError, match="bad data"):
+            await bad
+        assert await also_good == 13
+
+    assert writer.stats.failed == 1
+    session = db.get_db_session(tmp_path / "db.sqlite")
+    assert session.scalars(select(func.count(db.Sync.sync_id))).one() == 2
+
+
+async def test_close_writes_everything_queued(tmp_path: Path):
+    writer = DatabaseWriter(tmp_path / "db.sqlite")
+    writer.start()
+    for d in range(5):
+        await writer.submit(_data("ring-1", d))
+
+    await writer.close()
+
+    session = db.get_db_session(tmp_path / "db.sqlite")
+    assert session.scalars(select(func.count(db.Sync.sync_id))).one() == 5
+
+
+async def test_failed_batch_keeps_writer_running(tmp_path: Path, monkeypatch):
+    create_or_find_ring = db.create_or_find_ring
+
+    def failing(session: Any, address: str) -> db.Ring:
+        if address == "bad":
+            raise OSError("disk full")
+        return create_or_find_ring(session, address)
+
+    monkeypatch.setattr(db, "create_or_find_ring", failing)
+
+    async with DatabaseWriter(tmp_path / "db.sqlite") as writer:
+        with pytest.raises(OSError, match="disk full"):
+            await writer.write(_data("bad", 0))
+        assert await writer.write(_data("ring-1", 0)) == 13
+
+    assert writer.stats.failed == 1
+    assert writer.stats.written == 1
+
+
+async def test_in_memory_database_used_on_writer_thread():
+    async with DatabaseWriter(None) as writer:
+        assert await writer.write(_data("ring-1", 0)) == 13
+        # the same day again, only the sport detail is replaced, so the writer thread sees the first write
+        assert await writer.write(_data("ring-1", 0)) == 1